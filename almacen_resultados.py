@@ -0,0 +1,409 @@
+import importlib.util
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Almacén de resultados en disco para conjuntos muy grandes. Las filas de métricas no se
+# acumulan en memoria: se juntan en fragmentos (CSV, Parquet o npz) que se escriben a
+# medida que se completan, y después de cada fragmento se actualiza un punto de control
+# (estado.json) con la cantidad de imágenes ya guardadas. Si la ejecución se corta, la
+# siguiente retoma desde ahí. Un fragmento se escribe al juntar `filas_por_fragmento`
+# filas o, si llegan despacio, al pasar `segundos_por_fragmento` desde el anterior: un
+# corte abrupto pierde como mucho ese tiempo de trabajo.
+#
+# Además se llevan agregados en línea por técnica y métrica, sin guardar los valores:
+# media y varianza (Welford), mínimo, máximo y percentiles (estimador P² de Jain y
+# Chlamtac, cinco marcadores por percentil). Se guardan en el punto de control, de modo
+# que se pueden consultar mientras la ejecución sigue: python almacen_resultados.py <carpeta>
+
+FORMATOS = ("csv", "parquet", "npz")
+FILAS_POR_FRAGMENTO = 10000
+SEGUNDOS_POR_FRAGMENTO = 60
+PERCENTILES = (0.5, 0.9, 0.99)
+METRICAS = ('AMBE', 'PSNR', 'Contraste', 'Entropia', 'SSIM', 'EPI')
+ARCHIVO_ESTADO = "estado.json"
+
+
+class CuantilP2:
+    """
+    Estimación en línea de un percentil con el algoritmo P² (memoria constante).
+
+    Args:
+        p (float): Percentil entre 0 y 1.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.alturas = []
+        self.posiciones = [1, 2, 3, 4, 5]
+        self.deseadas = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.incrementos = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def agregar(self, valor):
+        q, n = self.alturas, self.posiciones
+        if len(q) < 5:
+            q.append(valor)
+            q.sort()
+            return
+
+        if valor < q[0]:
+            q[0] = valor
+            k = 0
+        elif valor >= q[4]:
+            q[4] = valor
+            k = 3
+        else:
+            k = next(i for i in range(1, 5) if valor < q[i]) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.deseadas[i] += self.incrementos[i]
+
+        # Ajustamos los marcadores centrales que se alejaron de su posición deseada
+        for i in range(1, 4):
+            d = self.deseadas[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolica = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolica < q[i + 1]:
+                    q[i] = parabolica
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def valor(self):
+        if not self.alturas:
+            return np.nan
+        if len(self.alturas) < 5:
+            return float(np.percentile(self.alturas, self.p * 100))
+        return self.alturas[2]
+
+    def estado(self):
+        return {"p": self.p, "alturas": self.alturas, "posiciones": self.posiciones, "deseadas": self.deseadas}
+
+    @classmethod
+    def desde_estado(cls, estado):
+        cuantil = cls(estado["p"])
+        cuantil.alturas = list(estado["alturas"])
+        cuantil.posiciones = list(estado["posiciones"])
+        cuantil.deseadas = list(estado["deseadas"])
+        return cuantil
+
+
+class EstadisticaEnLinea:
+    """
+    Cantidad, media y varianza (Welford), mínimo, máximo y percentiles de una serie de
+    valores que se recibe de a uno. Los NaN e infinitos se cuentan aparte y no entran en
+    las estadísticas (por ejemplo, el PSNR de imágenes idénticas).
+    """
+
+    def __init__(self, percentiles=PERCENTILES):
+        self.cantidad = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.no_finitos = 0
+        self.cuantiles = [CuantilP2(p) for p in percentiles]
+
+    def agregar(self, valor):
+        valor = float(valor)
+        if not math.isfinite(valor):
+            self.no_finitos += 1
+            return
+        self.cantidad += 1
+        delta = valor - self.media
+        self.media += delta / self.cantidad
+        self.m2 += delta * (valor - self.media)
+        self.minimo = min(self.minimo, valor)
+        self.maximo = max(self.maximo, valor)
+        for cuantil in self.cuantiles:
+            cuantil.agregar(valor)
+
+    @property
+    def varianza(self):
+        return self.m2 / (self.cantidad - 1) if self.cantidad > 1 else np.nan
+
+    def resumen(self):
+        vacia = self.cantidad == 0
+        resumen = {
+            "cantidad": self.cantidad,
+            "media": np.nan if vacia else self.media,
+            "desvio": math.sqrt(self.varianza) if self.cantidad > 1 else np.nan,
+            "minimo": np.nan if vacia else self.minimo,
+            "maximo": np.nan if vacia else self.maximo,
+        }
+        for cuantil in self.cuantiles:
+            resumen[f"p{cuantil.p * 100:g}"] = cuantil.valor()
+        return resumen
+
+    def estado(self):
+        return {
+            "cantidad": self.cantidad, "media": self.media, "m2": self.m2,
+            "minimo": self.minimo if self.cantidad else None, "maximo": self.maximo if self.cantidad else None,
+            "no_finitos": self.no_finitos, "cuantiles": [cuantil.estado() for cuantil in self.cuantiles],
+        }
+
+    @classmethod
+    def desde_estado(cls, estado):
+        estadistica = cls(percentiles=())
+        estadistica.cantidad = estado["cantidad"]
+        estadistica.media = estado["media"]
+        estadistica.m2 = estado["m2"]
+        estadistica.minimo = estado["minimo"] if estado["minimo"] is not None else math.inf
+        estadistica.maximo = estado["maximo"] if estado["maximo"] is not None else -math.inf
+        estadistica.no_finitos = estado["no_finitos"]
+        estadistica.cuantiles = [CuantilP2.desde_estado(cuantil) for cuantil in estado["cuantiles"]]
+        return estadistica
+
+
+class AgregadosEnLinea:
+    """
+    Una `EstadisticaEnLinea` por técnica y métrica, alimentada con las filas de métricas.
+    """
+
+    def __init__(self, metricas=METRICAS):
+        self.metricas = tuple(metricas)
+        self.estadisticas = {}
+
+    def agregar(self, filas):
+        for fila in filas:
+            for metrica in self.metricas:
+                clave = (fila["Técnica"], metrica)
+                if clave not in self.estadisticas:
+                    self.estadisticas[clave] = EstadisticaEnLinea()
+                self.estadisticas[clave].agregar(fila[metrica])
+
+    def tabla(self):
+        """
+        Returns:
+            pandas.DataFrame: Una fila por (técnica, métrica) con sus estadísticas.
+        """
+        if not self.estadisticas:
+            return pd.DataFrame()
+        indice = pd.MultiIndex.from_tuples(list(self.estadisticas), names=["Técnica", "Métrica"])
+        return pd.DataFrame([estadistica.resumen() for estadistica in self.estadisticas.values()], index=indice)
+
+    def estado(self):
+        return [{"tecnica": tecnica, "metrica": metrica, **estadistica.estado()}
+                for (tecnica, metrica), estadistica in self.estadisticas.items()]
+
+    @classmethod
+    def desde_estado(cls, estado, metricas=METRICAS):
+        agregados = cls(metricas)
+        for entrada in estado:
+            agregados.estadisticas[(entrada["tecnica"], entrada["metrica"])] = EstadisticaEnLinea.desde_estado(entrada)
+        return agregados
+
+
+def _escribir_atomico(ruta, escribir):
+    # Escribimos en un temporal de la misma carpeta y lo renombramos: el archivo final
+    # nunca queda a medio escribir
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    os.close(descriptor)
+    try:
+        escribir(temporal)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _escribir_fragmento(df, ruta, formato):
+    if formato == "csv":
+        df.to_csv(ruta, index=False)
+    elif formato == "parquet":
+        df.to_parquet(ruta, index=False)
+    else:
+        columnas = {columna: (df[columna].to_numpy(dtype=str) if df[columna].dtype == object
+                              or pd.api.types.is_string_dtype(df[columna]) else df[columna].to_numpy())
+                    for columna in df.columns}
+        with open(ruta, 'wb') as archivo:
+            np.savez(archivo, **columnas)
+
+
+def _leer_fragmento(ruta, formato):
+    if formato == "csv":
+        # round_trip: cada float se lee exactamente como se escribió
+        return pd.read_csv(ruta, float_precision="round_trip")
+    if formato == "parquet":
+        return pd.read_parquet(ruta)
+    with np.load(ruta) as datos:
+        return pd.DataFrame({columna: datos[columna] for columna in datos.files})
+
+
+class AlmacenResultados:
+    """
+    Guarda las filas de métricas en fragmentos en disco, con punto de control para retomar.
+
+    Args:
+        directorio (str): Carpeta de los fragmentos y de estado.json. Si ya tiene un
+            punto de control, se retoma (el formato debe ser el mismo).
+        formato (str): "csv", "parquet" (requiere pyarrow o fastparquet) o "npz".
+        filas_por_fragmento (int): Filas que se juntan antes de escribir un fragmento.
+        segundos_por_fragmento (float): Tiempo máximo entre fragmentos (las filas pendientes
+            se escriben aunque no lleguen a `filas_por_fragmento`). None: solo por cantidad.
+
+    Las filas se agregan imagen por imagen con `agregar`; un fragmento nunca corta las
+    filas de una imagen, así que el punto de control siempre cuenta imágenes completas.
+    """
+
+    def __init__(self, directorio, formato="csv", filas_por_fragmento=FILAS_POR_FRAGMENTO,
+                 segundos_por_fragmento=SEGUNDOS_POR_FRAGMENTO):
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS)}.")
+        if formato == "parquet" and not any(importlib.util.find_spec(motor) for motor in ("pyarrow", "fastparquet")):
+            raise ImportError("Para guardar en Parquet hace falta instalar pyarrow o fastparquet.")
+        self.directorio = directorio
+        self.formato = formato
+        self.filas_por_fragmento = filas_por_fragmento
+        self.segundos_por_fragmento = segundos_por_fragmento
+        self._ultimo_guardado = time.monotonic()
+        os.makedirs(directorio, exist_ok=True)
+
+        self.fragmentos = []
+        self.imagenes = 0
+        self.ultima_imagen = None
+        self.agregados = AgregadosEnLinea()
+        self._pendientes = []
+        self._imagenes_pendientes = 0
+        self._ultima_pendiente = None
+
+        estado = leer_estado(directorio)
+        if estado is not None:
+            if estado["formato"] != formato:
+                raise ValueError(f"La carpeta {directorio} tiene resultados en formato {estado['formato']}, no {formato}.")
+            self.fragmentos = estado["fragmentos"]
+            self.imagenes = estado["imagenes"]
+            self.ultima_imagen = estado["ultima_imagen"]
+            self.agregados = AgregadosEnLinea.desde_estado(estado["agregados"])
+        # Un fragmento escrito sin llegar a actualizar el punto de control es de una
+        # ejecución que se cortó: sus imágenes se vuelven a procesar. Los temporales son de
+        # escrituras que no llegaron a terminar
+        for nombre in os.listdir(directorio):
+            if (nombre.startswith("fragmento_") and nombre not in self.fragmentos) or nombre.endswith(".tmp"):
+                os.remove(os.path.join(directorio, nombre))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def reanudar(self, nombres_imagenes):
+        """
+        Cantidad de imágenes de `nombres_imagenes` que ya están guardadas y se pueden saltear.
+        Verifica que el punto de control corresponda a la misma lista de imágenes.
+        """
+        if self.imagenes == 0:
+            return 0
+        if self.imagenes > len(nombres_imagenes) or nombres_imagenes[self.imagenes - 1] != self.ultima_imagen:
+            raise ValueError(f"El punto de control de {self.directorio} no corresponde a esta lista de imágenes "
+                             f"(última guardada: {self.ultima_imagen}).")
+        return self.imagenes
+
+    def agregar(self, nombre_imagen, filas):
+        """
+        Agregamos las filas de una imagen (una lista vacía si no se pudo procesar, para que
+        igual cuente como hecha).
+        """
+        # Las métricas se guardan como float de Python: el valor escrito en el fragmento es
+        # exactamente el que entra en los agregados (la entropía llega como float32)
+        filas = [{**fila, **{metrica: float(fila[metrica]) for metrica in METRICAS if metrica in fila}}
+                 for fila in filas]
+        self._pendientes.extend(filas)
+        self._imagenes_pendientes += 1
+        self._ultima_pendiente = nombre_imagen
+        self.agregados.agregar(filas)
+        vencido = (self.segundos_por_fragmento is not None
+                   and time.monotonic() - self._ultimo_guardado >= self.segundos_por_fragmento)
+        if len(self._pendientes) >= self.filas_por_fragmento or vencido:
+            self.guardar()
+
+    def guardar(self):
+        """
+        Escribimos las filas pendientes como un fragmento y actualizamos el punto de control.
+        """
+        self._ultimo_guardado = time.monotonic()
+        if self._imagenes_pendientes == 0:
+            return
+        if self._pendientes:
+            nombre = f"fragmento_{len(self.fragmentos):06d}.{self.formato}"
+            df = pd.DataFrame(self._pendientes)
+            _escribir_atomico(os.path.join(self.directorio, nombre),
+                              lambda ruta: _escribir_fragmento(df, ruta, self.formato))
+            self.fragmentos.append(nombre)
+        self.imagenes += self._imagenes_pendientes
+        self.ultima_imagen = self._ultima_pendiente
+        self._pendientes = []
+        self._imagenes_pendientes = 0
+
+        estado = {
+            "formato": self.formato,
+            "fragmentos": self.fragmentos,
+            "imagenes": self.imagenes,
+            "ultima_imagen": self.ultima_imagen,
+            "agregados": self.agregados.estado(),
+        }
+
+        def _escribir_estado(ruta):
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                json.dump(estado, archivo)
+        _escribir_atomico(os.path.join(self.directorio, ARCHIVO_ESTADO), _escribir_estado)
+
+    def cerrar(self):
+        self.guardar()
+
+
+def leer_estado(directorio):
+    """Punto de control de una carpeta de resultados, o None si no tiene."""
+    try:
+        with open(os.path.join(directorio, ARCHIVO_ESTADO), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def iterar_fragmentos(directorio):
+    """Generamos los fragmentos guardados (DataFrames), en orden, de a uno."""
+    estado = leer_estado(directorio)
+    if estado is None:
+        return
+    for nombre in estado["fragmentos"]:
+        yield _leer_fragmento(os.path.join(directorio, nombre), estado["formato"])
+
+
+def leer_resultados(directorio):
+    """Todas las filas guardadas en un único DataFrame (solo para resultados que entran en memoria)."""
+    fragmentos = list(iterar_fragmentos(directorio))
+    return pd.concat(fragmentos, ignore_index=True) if fragmentos else pd.DataFrame()
+
+
+def leer_agregados(directorio):
+    """Agregados del último punto de control (se puede llamar mientras la ejecución sigue)."""
+    estado = leer_estado(directorio)
+    if estado is None:
+        return pd.DataFrame()
+    return AgregadosEnLinea.desde_estado(estado["agregados"]).tabla()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python almacen_resultados.py <carpeta_resultados>")
+        sys.exit(2)
+    estado_actual = leer_estado(sys.argv[1])
+    if estado_actual is None:
+        print(f"No hay resultados en {sys.argv[1]}.")
+        sys.exit(1)
+    print(f"Imágenes guardadas: {estado_actual['imagenes']} (última: {estado_actual['ultima_imagen']})")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(leer_agregados(sys.argv[1]))
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Buffers reutilizables para el procesamiento por lotes. En una ejecución larga cada
+# imagen pedía arrays nuevos del tamaño de la imagen (gris, pila, índices del histograma,
+# resultado de CLAHE); con la arena cada worker los pide una vez por forma y los vuelve
+# a usar en las imágenes siguientes, así en régimen no hay asignaciones grandes y la
+# memoria del proceso no sube y baja con cada bloque.
+#
+# Un buffer se identifica por un nombre, la forma sin el primer eje y el tipo: el primer
+# eje (la cantidad de imágenes de la pila) se toma del buffer más grande pedido hasta
+# ahora, y se devuelve una vista con las filas pedidas. Lo que devuelve la arena se
+# sobrescribe en el siguiente pedido con la misma clave, por lo que los resultados que
+# deban conservarse se copian.
+#
+# Los buffers empiezan en una dirección múltiplo de 64 bytes. Además de favorecer las
+# instrucciones SIMD, hace que las reducciones de OpenCV en float32 (cv2.norm, cv2.mean),
+# cuyo orden de suma depende de la alineación, den lo mismo en cualquier proceso.
+
+LIMITE_BYTES = 1 << 30
+ALINEACION = 64
+
+
+def _vacio_alineado(forma, dtype):
+    # np.empty no garantiza más que 16 bytes de alineación: reservamos de más y cortamos
+    nbytes = int(np.prod(forma, dtype=np.int64)) * dtype.itemsize
+    crudo = np.empty(nbytes + ALINEACION, dtype=np.uint8)
+    inicio = -crudo.ctypes.data % ALINEACION
+    return crudo[inicio:inicio + nbytes].view(dtype).reshape(forma)
+
+
+class ArenaBuffers:
+    """
+    Buffers reutilizables por nombre, forma y tipo.
+
+    Args:
+        limite_bytes (int): Memoria máxima retenida. Si se supera, se sueltan primero los
+            buffers usados hace más tiempo (el pedido actual siempre se entrega).
+    """
+
+    def __init__(self, limite_bytes=LIMITE_BYTES):
+        self.limite_bytes = limite_bytes
+        self._buffers = OrderedDict()
+        self.asignaciones = 0
+
+    def obtener(self, nombre, forma, dtype=np.uint8):
+        """
+        Buffer sin inicializar de forma `forma`. El contenido es el que haya dejado el uso anterior.
+        """
+        forma = tuple(forma)
+        dtype = np.dtype(dtype)
+        clave = (nombre, forma[1:], dtype)
+        buffer = self._buffers.get(clave)
+        if buffer is None or len(buffer) < forma[0]:
+            self._buffers.pop(clave, None)
+            buffer = _vacio_alineado(forma, dtype)
+            self.asignaciones += 1
+        self._buffers[clave] = buffer
+        self._buffers.move_to_end(clave)
+        self._recortar()
+        return buffer[:forma[0]]
+
+    def _recortar(self):
+        while len(self._buffers) > 1 and self.bytes > self.limite_bytes:
+            self._buffers.popitem(last=False)
+
+    @property
+    def bytes(self):
+        """Memoria retenida por la arena."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def liberar(self):
+        self._buffers.clear()
+
+
+_arena = None
+
+
+def arena_del_proceso():
+    """Arena propia de este proceso (cada worker tiene la suya)."""
+    global _arena
+    if _arena is None:
+        _arena = ArenaBuffers()
+    return _arena
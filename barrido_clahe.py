@@ -0,0 +1,152 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import cv2
+import pandas as pd
+
+from arena_buffers import arena_del_proceso
+from cargador_imagenes import cargar_imagen
+from contexto_imagen import obtener_contexto
+from clahe_mosaicos import geometria_mosaicos, calcular_histogramas_mosaicos, limite_recorte
+from funciones_metrica import METRICAS_ESTRUCTURALES, calcular_metricas_fusionadas, preparar_referencia
+
+# Barrido de parámetros de CLAHE (clip_limit x tile_grid_size) sobre un conjunto de imágenes.
+#
+# Para cada imagen la conversión a gris se hace una sola vez, y para cada grilla los
+# histogramas de los mosaicos también. Con esos histogramas se sabe, sin recorrer los
+# píxeles, qué clip_limit dan exactamente la misma imagen: OpenCV recorta en un límite
+# entero (varios clip_limit cercanos caen en el mismo), y un límite que ningún mosaico
+# alcanza equivale a no recortar. Solo las combinaciones distintas aplican CLAHE (el
+# nativo de OpenCV, con un único objeto por grilla) y calculan las métricas, con una
+# sola pasada sobre el par de imágenes.
+
+METRICAS = ('AMBE', 'PSNR', 'Contraste', 'Entropia') + METRICAS_ESTRUCTURALES
+
+logger = logging.getLogger(__name__)
+
+
+def barrer_imagen(imagen, clip_limits, tile_grid_sizes):
+    """
+    Evaluamos todas las combinaciones de parámetros de CLAHE sobre una imagen.
+
+    Args:
+        imagen (numpy.ndarray | ContextoImagen): Imagen BGR o en gris, o su contexto.
+        clip_limits (list): Valores de clip_limit.
+        tile_grid_sizes (list): Grillas (x, y).
+
+    Returns:
+        list: Una fila por combinación, con "clip_limit", "grilla" y las métricas.
+    """
+    contexto = obtener_contexto(imagen)
+    gris = contexto.gris
+    alto, ancho = gris.shape
+    arena = arena_del_proceso()
+    salida = arena.obtener("clahe", gris.shape)
+    # La original se prepara para SSIM y EPI una vez para todas las combinaciones
+    referencia = preparar_referencia(gris, arena=arena)
+    filas = []
+    for grilla in tile_grid_sizes:
+        grilla = tuple(grilla)
+        alto_mosaico, ancho_mosaico, _, _ = geometria_mosaicos(alto, ancho, grilla)
+        maximo = int(calcular_histogramas_mosaicos(gris, grilla).max())
+        clahe = cv2.createCLAHE(tileGridSize=grilla)
+        metricas_por_limite = {}
+        for clip_limit in clip_limits:
+            limite = limite_recorte(clip_limit, alto_mosaico * ancho_mosaico)
+            if limite is not None and limite >= maximo:
+                limite = None
+            if limite not in metricas_por_limite:
+                clahe.setClipLimit(clip_limit)
+                metricas_por_limite[limite] = calcular_metricas_fusionadas(contexto, clahe.apply(gris, dst=salida),
+                                                                           referencia=referencia, arena=arena)
+            filas.append({"clip_limit": clip_limit, "grilla": f"{grilla[0]}x{grilla[1]}",
+                          **metricas_por_limite[limite]})
+    return filas
+
+
+def _barrer_archivo(ruta_completa, clip_limits, tile_grid_sizes):
+    # Se decodifica en color y se pasa a gris con ContextoImagen, igual que en main_proyecto:
+    # el gris que decodifica libjpeg directamente no es idéntico y cambiaría las métricas.
+    # Si la imagen no se puede cargar se devuelve el motivo.
+    cargada = cargar_imagen(ruta_completa)
+    if cargada.imagen is None:
+        return cargada.error
+    nombre_imagen = os.path.basename(ruta_completa)
+    return [{"Imagen": nombre_imagen, **fila} for fila in barrer_imagen(cargada.imagen, clip_limits, tile_grid_sizes)]
+
+
+def _inicializar_worker():
+    cv2.setNumThreads(1)
+
+
+def barrer_dataset(rutas, clip_limits, tile_grid_sizes, workers=None):
+    """
+    Barrido de parámetros sobre un conjunto de imágenes, repartido entre procesos.
+
+    Returns:
+        pandas.DataFrame: Una fila por imagen y combinación de parámetros.
+    """
+    workers = workers or os.cpu_count() or 1
+    tarea = partial(_barrer_archivo, clip_limits=list(clip_limits), tile_grid_sizes=[tuple(g) for g in tile_grid_sizes])
+    filas = []
+    if workers == 1:
+        resultados = map(tarea, rutas)
+        ejecutor = None
+    else:
+        ejecutor = ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker)
+        resultados = ejecutor.map(tarea, rutas)
+    try:
+        for ruta_completa, filas_imagen in zip(rutas, resultados):
+            if isinstance(filas_imagen, str):
+                logger.warning("No se pudo cargar %s (%s). Saltando...", os.path.basename(ruta_completa), filas_imagen)
+                continue
+            filas.extend(filas_imagen)
+    finally:
+        if ejecutor is not None:
+            ejecutor.shutdown()
+    return pd.DataFrame(filas)
+
+
+def superficies(df):
+    """
+    Superficies de métricas: para cada métrica, la media sobre las imágenes de cada
+    combinación (filas: clip_limit, columnas: grilla).
+
+    Returns:
+        dict: métrica -> pandas.DataFrame
+    """
+    return {metrica: df.pivot_table(index="clip_limit", columns="grilla", values=metrica, aggfunc="mean")
+            for metrica in METRICAS}
+
+
+def _grilla(valor):
+    try:
+        x, y = (int(parte) for parte in valor.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("la grilla debe tener la forma XxY, por ejemplo 8x8")
+    return x, y
+
+
+if __name__ == "__main__":
+    from main_proyecto import RUTA_BASE_DATOS, listar_imagenes
+
+    parser = argparse.ArgumentParser(description="Barrido de clip_limit y grilla de CLAHE sobre un conjunto de imágenes.")
+    parser.add_argument("--ruta", default=RUTA_BASE_DATOS, help="Carpeta con las imágenes.")
+    parser.add_argument("--cantidad", type=int, default=None, help="Cantidad de imágenes (por defecto, todas).")
+    parser.add_argument("--clips", type=float, nargs="+", default=[0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0])
+    parser.add_argument("--grillas", type=_grilla, nargs="+", default=[(4, 4), (8, 8), (16, 16)])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--salida", default=None, help="Archivo CSV con todas las filas del barrido.")
+    args = parser.parse_args()
+    logging.basicConfig()
+
+    nombres = listar_imagenes(args.ruta)[:args.cantidad]
+    df = barrer_dataset([os.path.join(args.ruta, nombre) for nombre in nombres], args.clips, args.grillas, args.workers)
+    if args.salida:
+        df.to_csv(args.salida, index=False)
+    for metrica, superficie in superficies(df).items():
+        print(f"\n--- {metrica} (media sobre {df['Imagen'].nunique()} imágenes) ---")
+        print(superficie)
@@ -0,0 +1,326 @@
+import argparse
+import contextlib
+import ctypes
+import inspect
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import funciones_mejora
+import funciones_metrica
+
+# Banco de pruebas de rendimiento: mide cada `aplicar_*` de funciones_mejora.py y cada
+# `calcular_*` de funciones_metrica.py sobre imágenes sintéticas de distintos tamaños y
+# patrones de intensidad (y opcionalmente sobre imágenes reales de BSDS).
+# Los resultados se guardan en JSON y el comando `comparar` marca las regresiones.
+#
+# Uso:
+#   python benchmark.py ejecutar --salida base.json
+#   python benchmark.py ejecutar --salida nuevo.json --tamanos 512x512 1080p
+#   python benchmark.py comparar base.json nuevo.json --umbral 0.10
+
+TAMANOS = {
+    "64x64": (64, 64),
+    "256x256": (256, 256),
+    "512x512": (512, 512),
+    "1080p": (1080, 1920),
+    "4K": (2160, 3840),
+    "8K": (4320, 7680),
+}
+PATRONES = ("uniforme", "bajo_contraste", "bimodal")
+IMAGENES_POR_LOTE = 8
+
+# Nombre de parámetro -> dato del caso de prueba que se le pasa
+ARGUMENTOS = {
+    "imagen_bgr": "bgr",
+    "imagen_gris": "gris",
+    "imagen_original_gris": "gris",
+    "imagen_mejorada_gris": "mejorada",
+    "lut": "lut",
+    "hist_original": "hist",
+    "pila": "pila",
+    "hists": "hists",
+    "hists_originales": "hists",
+    "luts": "luts",
+    "referencia": "referencia",
+    "mejoradas": "mejoradas",
+}
+
+
+def generar_imagen(alto, ancho, patron, semilla=0):
+    """
+    Generamos una imagen BGR sintética con el patrón de intensidades pedido.
+    """
+    generador = np.random.default_rng(semilla)
+    if patron == "uniforme":
+        imagen = generador.integers(0, 256, (alto, ancho, 3), dtype=np.uint8)
+    elif patron == "bajo_contraste":
+        imagen = generador.integers(110, 146, (alto, ancho, 3), dtype=np.uint8)
+    elif patron == "bimodal":
+        modo = generador.random((alto, ancho, 1)) < 0.5
+        valores = np.where(modo, generador.normal(60, 15, (alto, ancho, 3)), generador.normal(190, 20, (alto, ancho, 3)))
+        imagen = np.clip(valores, 0, 255).astype(np.uint8)
+    else:
+        raise ValueError(f"Patrón desconocido: {patron}")
+    return imagen
+
+
+class CasoPrueba:
+    """
+    Datos de entrada que pueden necesitar las funciones medidas, calculados una vez.
+    """
+
+    def __init__(self, nombre, imagenes_bgr):
+        self.nombre = nombre
+        self.bgr = imagenes_bgr[0]
+        self.gris = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        self.hist = cv2.calcHist([self.gris], [0], None, [256], [0, 256]).flatten()
+        self.lut = funciones_mejora.calcular_lut_he(self.gris)
+        self.mejorada = cv2.LUT(self.gris, self.lut)
+        # Para las variantes por lotes, una pila de imágenes del mismo tamaño
+        grises = [cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) for imagen in imagenes_bgr]
+        self.pila = np.stack([gris for gris in grises if gris.shape == self.gris.shape])
+        self.hists = funciones_mejora.calcular_histogramas_lote(self.pila)
+        self.luts = funciones_mejora.calcular_luts_he_lote(self.hists)
+        self.referencia = funciones_metrica.preparar_referencia(self.gris)
+        self.mejoradas = {"HE": self.luts}
+
+    def megapixeles(self, por_lote):
+        pixeles = self.pila.size if por_lote else self.gris.size
+        return pixeles / 1e6
+
+
+def casos_sinteticos(tamanos, patrones):
+    for nombre_tamano in tamanos:
+        alto, ancho = TAMANOS[nombre_tamano]
+        for patron in patrones:
+            imagenes = [generar_imagen(alto, ancho, patron, semilla) for semilla in range(IMAGENES_POR_LOTE)]
+            yield nombre_tamano, patron, CasoPrueba(f"{patron}_{nombre_tamano}", imagenes)
+
+
+def casos_bsds(ruta, cantidad):
+    nombres = sorted(f for f in os.listdir(ruta) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')))
+    imagenes = [cv2.imread(os.path.join(ruta, nombre)) for nombre in nombres[:cantidad]]
+    imagenes = [imagen for imagen in imagenes if imagen is not None]
+    # Agrupamos por forma para que las variantes por lotes reciban pilas válidas
+    por_forma = {}
+    for imagen in imagenes:
+        por_forma.setdefault(imagen.shape, []).append(imagen)
+    for forma, grupo in por_forma.items():
+        nombre_tamano = f"{forma[0]}x{forma[1]}"
+        yield nombre_tamano, "bsds", CasoPrueba(f"bsds_{nombre_tamano}", grupo)
+
+
+def funciones_medidas(filtro=None):
+    """
+    Funciones públicas `aplicar_*` de funciones_mejora y `calcular_*` de funciones_metrica.
+    """
+    funciones = []
+    for modulo, prefijo in ((funciones_mejora, "aplicar_"), (funciones_metrica, "calcular_")):
+        for nombre, funcion in inspect.getmembers(modulo, inspect.isfunction):
+            if funcion.__module__ != modulo.__name__ or not nombre.startswith(prefijo):
+                continue
+            if filtro and filtro not in nombre:
+                continue
+            funciones.append((modulo.__name__, nombre, funcion))
+    return funciones
+
+
+def _argumentos(funcion, caso):
+    # Completamos los parámetros según su nombre; los opcionales conocidos también se
+    # pasan (por ejemplo, la LUT de calcular_metricas_desde_histograma)
+    argumentos = {}
+    for parametro in inspect.signature(funcion).parameters.values():
+        if parametro.name in ARGUMENTOS:
+            argumentos[parametro.name] = getattr(caso, ARGUMENTOS[parametro.name])
+        elif parametro.default is inspect.Parameter.empty:
+            return None
+    return argumentos
+
+
+def _memoria_residente():
+    # VmRSS (actual) y VmHWM (máximo desde el último reinicio) del proceso, en bytes
+    valores = {}
+    with open("/proc/self/status") as archivo:
+        for linea in archivo:
+            if linea.startswith(("VmRSS:", "VmHWM:")):
+                nombre, cantidad, _ = linea.split()
+                valores[nombre[:-1]] = int(cantidad) * 1024
+    return valores["VmRSS"], valores["VmHWM"]
+
+
+def _pico_residente(funcion, argumentos):
+    # Pico de memoria residente (RSS) de una llamada, incluidas las reservas nativas de
+    # OpenCV y NumPy que tracemalloc no ve. Se usa el máximo de RSS que lleva Linux, que se
+    # puede reiniciar escribiendo 5 en /proc/self/clear_refs. Antes se devuelve al sistema lo
+    # liberado en las repeticiones anteriores (malloc_trim de glibc): si quedara residente en
+    # el heap, la llamada lo reutilizaría sin que crezca el RSS. En otros sistemas no se mide.
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+        with open("/proc/self/clear_refs", "w") as archivo:
+            archivo.write("5")
+        inicial, _ = _memoria_residente()
+    except (AttributeError, OSError):
+        return None
+    funcion(**argumentos)
+    _, pico = _memoria_residente()
+    return max(pico - inicial, 0)
+
+
+def medir(funcion, argumentos, repeticiones_minimas=5, tiempo_minimo=0.2, repeticiones_maximas=1000):
+    """
+    Medimos la latencia de cada llamada (en segundos) y la memoria pico de una llamada:
+    la residente del proceso (RSS, None fuera de Linux) y la del heap de Python que
+    ve tracemalloc, que no incluye los buffers que reservan OpenCV o NumPy por su cuenta.
+
+    Returns:
+        tuple: (latencias, memoria_pico_bytes, memoria_python_pico_bytes)
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        funcion(**argumentos)  # Calentamiento
+        latencias = []
+        inicio_total = time.perf_counter()
+        while (len(latencias) < repeticiones_minimas or time.perf_counter() - inicio_total < tiempo_minimo) \
+                and len(latencias) < repeticiones_maximas:
+            inicio = time.perf_counter()
+            funcion(**argumentos)
+            latencias.append(time.perf_counter() - inicio)
+
+        # La memoria se mide aparte porque tracemalloc agrega costo a cada asignación
+        memoria_pico = _pico_residente(funcion, argumentos)
+        tracemalloc.start()
+        try:
+            funcion(**argumentos)
+            _, memoria_python_pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return np.array(latencias), memoria_pico, memoria_python_pico
+
+
+def ejecutar(tamanos, patrones, ruta_bsds=None, cantidad_bsds=10, filtro=None, tiempo_minimo=0.2):
+    """
+    Ejecutamos el banco de pruebas y devolvemos el diccionario de resultados.
+    """
+    # Los casos se generan de a uno para no tener todas las imágenes grandes en memoria
+    casos = casos_sinteticos(tamanos, patrones)
+    if ruta_bsds:
+        casos = itertools.chain(casos, casos_bsds(ruta_bsds, cantidad_bsds))
+
+    resultados = []
+    for nombre_tamano, patron, caso in casos:
+        for modulo, nombre, funcion in funciones_medidas(filtro):
+            argumentos = _argumentos(funcion, caso)
+            if argumentos is None:
+                continue
+            latencias, memoria_pico, memoria_python_pico = medir(funcion, argumentos, tiempo_minimo=tiempo_minimo)
+            megapixeles = caso.megapixeles(por_lote=nombre.endswith("_lote"))
+            p50 = float(np.percentile(latencias, 50))
+            resultado = {
+                "funcion": nombre,
+                "modulo": modulo,
+                "caso": caso.nombre,
+                "tamano": nombre_tamano,
+                "patron": patron,
+                "megapixeles": megapixeles,
+                "repeticiones": len(latencias),
+                "p50_ms": p50 * 1e3,
+                "p99_ms": float(np.percentile(latencias, 99)) * 1e3,
+                "mp_s": megapixeles / p50 if p50 > 0 else float("inf"),
+                "memoria_pico_mb": memoria_pico / 2 ** 20 if memoria_pico is not None else None,
+                "memoria_python_pico_mb": memoria_python_pico / 2 ** 20,
+            }
+            resultados.append(resultado)
+            pico = resultado["memoria_pico_mb"]
+            print(f"{nombre:40s} {caso.nombre:28s} p50={resultado['p50_ms']:9.3f} ms  "
+                  f"p99={resultado['p99_ms']:9.3f} ms  {resultado['mp_s']:9.1f} MP/s  "
+                  f"pico={pico if pico is not None else float('nan'):8.1f} MB  "
+                  f"python={resultado['memoria_python_pico_mb']:8.1f} MB")
+
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "plataforma": platform.platform(),
+            "procesador": platform.processor(),
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(base, nuevo, umbral=0.10):
+    """
+    Comparamos dos ejecuciones por (función, caso). Una regresión es una latencia p50
+    que empeora más que `umbral` (fracción, 0.10 = 10%).
+
+    Returns:
+        list: Regresiones encontradas, como diccionarios.
+    """
+    previos = {(r["funcion"], r["caso"]): r for r in base["resultados"]}
+    regresiones = []
+    print(f"{'función':40s} {'caso':28s} {'base ms':>10s} {'nuevo ms':>10s} {'cambio':>8s}")
+    for resultado in nuevo["resultados"]:
+        clave = (resultado["funcion"], resultado["caso"])
+        if clave not in previos:
+            continue
+        anterior = previos[clave]
+        cambio = resultado["p50_ms"] / anterior["p50_ms"] - 1 if anterior["p50_ms"] > 0 else 0.0
+        marca = ""
+        if cambio > umbral:
+            marca = "  REGRESIÓN"
+            regresiones.append({"funcion": clave[0], "caso": clave[1], "base_ms": anterior["p50_ms"],
+                                "nuevo_ms": resultado["p50_ms"], "cambio": cambio})
+        print(f"{clave[0]:40s} {clave[1]:28s} {anterior['p50_ms']:10.3f} {resultado['p50_ms']:10.3f} "
+              f"{cambio:+8.1%}{marca}")
+    return regresiones
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento de las técnicas de mejora y las métricas.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_ejecutar = subparsers.add_parser("ejecutar", help="Mide las funciones y guarda los resultados en JSON.")
+    parser_ejecutar.add_argument("--salida", required=True, help="Archivo JSON de resultados.")
+    parser_ejecutar.add_argument("--tamanos", nargs="+", default=list(TAMANOS), choices=list(TAMANOS))
+    parser_ejecutar.add_argument("--patrones", nargs="+", default=list(PATRONES), choices=list(PATRONES))
+    parser_ejecutar.add_argument("--bsds", default=None, help="Carpeta con imágenes de BSDS para medir también con ellas.")
+    parser_ejecutar.add_argument("--cantidad-bsds", type=int, default=10)
+    parser_ejecutar.add_argument("--filtro", default=None, help="Solo mide las funciones cuyo nombre contiene este texto.")
+    parser_ejecutar.add_argument("--tiempo-minimo", type=float, default=0.2,
+                                 help="Segundos mínimos de medición por función y caso.")
+
+    parser_comparar = subparsers.add_parser("comparar", help="Compara dos archivos de resultados.")
+    parser_comparar.add_argument("base")
+    parser_comparar.add_argument("nuevo")
+    parser_comparar.add_argument("--umbral", type=float, default=0.10,
+                                 help="Empeoramiento relativo de la latencia p50 que se considera regresión.")
+    return parser
+
+
+if __name__ == "__main__":
+    args = crear_parser().parse_args()
+    if args.comando == "ejecutar":
+        resultados = ejecutar(args.tamanos, args.patrones, args.bsds, args.cantidad_bsds, args.filtro, args.tiempo_minimo)
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+    else:
+        with open(args.base, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        with open(args.nuevo, encoding="utf-8") as archivo:
+            nuevo = json.load(archivo)
+        regresiones = comparar(base, nuevo, args.umbral)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresiones por encima del {args.umbral:.0%}.")
+            sys.exit(1)
+        print("\nSin regresiones.")
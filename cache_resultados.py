@@ -0,0 +1,195 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Caché en disco de resultados por imagen, direccionada por contenido: la clave combina
+# el hash del archivo de la imagen, el algoritmo, sus parámetros y la versión del código.
+# Si cambia cualquiera de ellos, la clave cambia y el resultado se vuelve a calcular.
+#
+# Cada entrada es un archivo .npz independiente que se escribe de forma atómica
+# (archivo temporal + os.replace), por lo que varios workers pueden leer y escribir a la
+# vez sin bloquearse. El tamaño total se limita desalojando las entradas usadas hace más
+# tiempo (LRU según la fecha de modificación, que se actualiza en cada acierto). Cada
+# proceso solo ve lo que escribió él, así que cada vez que escribe una fracción del límite
+# vuelve a medir la carpeta (con el bloqueo de desalojo tomado): con N workers la carpeta
+# supera el límite como mucho en N veces esa fracción.
+
+TAMANO_MAXIMO = 1 << 30  # 1 GiB
+FRACCION_REVISION = 0.05
+# Además de los algoritmos y las métricas, procesamiento_tecnicas.py arma las filas que se
+# guardan y los parámetros de las claves, cargador_imagenes.py decodifica las imágenes (y su
+# forma de lectura por defecto) y arena_buffers.py fija la alineación de la que dependen las
+# sumas en float32. La interfaz (main_proyecto.py) queda fuera: cambiarla no invalida nada.
+MODULOS_ALGORITMOS = ("contexto_imagen.py", "funciones_mejora.py", "funciones_metrica.py",
+                      "procesamiento_tecnicas.py", "cargador_imagenes.py", "arena_buffers.py")
+
+
+def _calcular_version_codigo():
+    # La versión es el hash del código de los algoritmos y métricas: cualquier cambio
+    # en esos archivos invalida las entradas anteriores sin tener que numerar versiones.
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    resumen = hashlib.sha256()
+    for nombre in MODULOS_ALGORITMOS:
+        with open(os.path.join(directorio, nombre), 'rb') as archivo:
+            resumen.update(archivo.read())
+    return resumen.hexdigest()[:16]
+
+
+VERSION_CODIGO = _calcular_version_codigo()
+
+
+def hash_contenido(contenido):
+    """
+    Hash del contenido (bytes) del archivo de una imagen.
+    """
+    return hashlib.sha256(contenido).hexdigest()
+
+
+class CacheResultados:
+    """
+    Caché persistente de resultados (LUT o imagen mejorada y fila de métricas).
+
+    Args:
+        directorio (str): Carpeta donde se guardan las entradas.
+        tamano_maximo (int): Tamaño máximo en bytes; al superarlo se desalojan las
+            entradas menos usadas recientemente.
+    """
+
+    def __init__(self, directorio, tamano_maximo=TAMANO_MAXIMO):
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo
+        os.makedirs(directorio, exist_ok=True)
+        # Bytes escritos por este proceso desde la última vez que se midió la carpeta
+        # (None: todavía no se midió)
+        self._escritos = None
+
+    def clave(self, hash_imagen, algoritmo, parametros=None):
+        """
+        Clave de una entrada: hash de la imagen + algoritmo + parámetros + versión del código.
+        """
+        descripcion = json.dumps({
+            "imagen": hash_imagen,
+            "algoritmo": algoritmo,
+            "parametros": parametros or {},
+            "version": VERSION_CODIGO,
+        }, sort_keys=True)
+        return hashlib.sha256(descripcion.encode('utf-8')).hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave + '.npz')
+
+    def obtener(self, clave):
+        """
+        Devuelve la entrada guardada o None si no existe.
+
+        Returns:
+            dict: {"metricas": dict, "lut": numpy.ndarray | None, "imagen": numpy.ndarray | None}
+        """
+        ruta = self._ruta(clave)
+        try:
+            with np.load(ruta) as datos:
+                entrada = {
+                    "metricas": json.loads(str(datos["metricas"])),
+                    "lut": datos["lut"] if "lut" in datos else None,
+                    "imagen": datos["imagen"] if "imagen" in datos else None,
+                }
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            # No existe, otro worker la está desalojando o quedó dañada: se recalcula
+            return None
+        try:
+            os.utime(ruta)  # Marcamos el uso reciente para el orden LRU
+        except OSError:
+            pass
+        return entrada
+
+    def guardar(self, clave, metricas, lut=None, imagen=None):
+        """
+        Guardamos una entrada de forma atómica.
+
+        Args:
+            clave (str): Clave obtenida con `clave`.
+            metricas (dict): Fila de métricas de la técnica.
+            lut (numpy.ndarray): LUT de la técnica, si es un mapeo global.
+            imagen (numpy.ndarray): Imagen mejorada, para técnicas espaciales.
+        """
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        arrays = {"metricas": np.array(json.dumps({k: float(v) for k, v in metricas.items()}))}
+        if lut is not None:
+            arrays["lut"] = lut
+        if imagen is not None:
+            arrays["imagen"] = imagen
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                archivo.write(buffer.getvalue())
+            os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+        if self._escritos is not None:
+            self._escritos += len(buffer.getvalue())
+        if self._escritos is None or self._escritos >= self.tamano_maximo * FRACCION_REVISION:
+            self.desalojar()
+
+    def _entradas(self):
+        for raiz, _, archivos in os.walk(self.directorio):
+            for nombre in archivos:
+                if nombre.endswith('.npz'):
+                    ruta = os.path.join(raiz, nombre)
+                    try:
+                        estado = os.stat(ruta)
+                    except FileNotFoundError:
+                        continue
+                    yield ruta, estado.st_size, estado.st_mtime
+
+    def tamano_total(self):
+        """Tamaño ocupado por las entradas, en bytes."""
+        return sum(tamano for _, tamano, _ in self._entradas())
+
+    def desalojar(self):
+        """
+        Medimos la carpeta y, si supera el límite, borramos las entradas menos usadas hasta
+        quedar por debajo del 90%. Solo un proceso mide y desaloja a la vez; si otro ya lo
+        está haciendo, no se espera (se vuelve a intentar en la próxima escritura).
+        """
+        bloqueo = os.path.join(self.directorio, '.desalojo.lock')
+        try:
+            descriptor = os.open(bloqueo, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Un bloqueo de más de un minuto quedó de un proceso que terminó mal
+            try:
+                if time.time() - os.stat(bloqueo).st_mtime > 60:
+                    os.remove(bloqueo)
+            except FileNotFoundError:
+                pass
+            return
+        try:
+            # El tamaño se vuelve a medir con el bloqueo tomado: incluye lo que escribieron
+            # todos los procesos, no solo este
+            entradas = sorted(self._entradas(), key=lambda entrada: entrada[2])
+            total = sum(tamano for _, tamano, _ in entradas)
+            if total > self.tamano_maximo:
+                objetivo = int(self.tamano_maximo * 0.9)
+                for ruta, tamano, _ in entradas:
+                    if total <= objetivo:
+                        break
+                    try:
+                        os.remove(ruta)
+                    except FileNotFoundError:
+                        pass
+                    total -= tamano
+            self._escritos = 0
+        finally:
+            os.close(descriptor)
+            os.remove(bloqueo)
@@ -0,0 +1,142 @@
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from perfilado import etapa
+
+# Carga de imágenes por adelantado. Un pool de hilos lee y decodifica las siguientes
+# imágenes mientras se procesa la actual (la lectura del disco y cv2.imdecode liberan el
+# GIL), y la cantidad de imágenes cargadas por adelantado está acotada para que la
+# memoria no crezca con el tamaño del conjunto. Las imágenes se entregan en el mismo
+# orden que las rutas; un archivo ilegible o dañado se informa y no corta la ejecución.
+
+HILOS = 4
+PREFETCH = 8
+REDUCCIONES = (1, 2, 4, 8)
+LECTURA_POR_DEFECTO = {"gris": False, "reduccion": 1}
+
+_MODOS_COLOR = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+_MODOS_GRIS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+               4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+ImagenCargada = namedtuple("ImagenCargada", ["ruta", "imagen", "contenido", "error"])
+
+
+def modo_lectura(gris=False, reduccion=1):
+    """
+    Bandera de cv2.imdecode para leer en color o directamente en gris, a resolución
+    completa o reducida (1/2, 1/4 o 1/8, útil para vistas previas).
+
+    La lectura directa en gris no es idéntica a leer en color y convertir con
+    cv2.cvtColor (en JPEG, por ejemplo, se toma el canal de luminancia del archivo).
+    """
+    if reduccion not in REDUCCIONES:
+        raise ValueError(f"Reducción no soportada: {reduccion}. Opciones: {', '.join(map(str, REDUCCIONES))}.")
+    return (_MODOS_GRIS if gris else _MODOS_COLOR)[reduccion]
+
+
+def decodificar_imagen(contenido, modo=cv2.IMREAD_COLOR, nombre=None):
+    """
+    Decodificamos el contenido de un archivo de imagen. Devuelve None si está dañado.
+    `nombre` solo se usa para el perfilado.
+    """
+    if not contenido:
+        return None
+    with etapa("decodificacion", nombre):
+        return cv2.imdecode(np.frombuffer(contenido, dtype=np.uint8), modo)
+
+
+def cargar_imagen(ruta, modo=cv2.IMREAD_COLOR, decodificar=True, conservar_contenido=False):
+    """
+    Leemos y decodificamos una imagen sin lanzar excepciones: los problemas quedan en `error`.
+
+    Args:
+        ruta (str): Archivo de la imagen.
+        modo (int): Bandera de lectura (ver `modo_lectura`).
+        decodificar (bool): Si es False solo se leen los bytes del archivo.
+        conservar_contenido (bool): Devolver también los bytes leídos (por ejemplo, para
+            calcular su hash).
+
+    Returns:
+        ImagenCargada: (ruta, imagen, contenido, error).
+    """
+    nombre = os.path.basename(ruta)
+    try:
+        with etapa("lectura", nombre), open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+    except OSError as error:
+        return ImagenCargada(ruta, None, None, f"no se pudo leer ({error.strerror or error})")
+    imagen = None
+    if decodificar:
+        imagen = decodificar_imagen(contenido, modo, nombre)
+        if imagen is None:
+            return ImagenCargada(ruta, None, contenido if conservar_contenido else None,
+                                 "archivo dañado o en un formato no soportado")
+    return ImagenCargada(ruta, imagen, contenido if conservar_contenido else None, None)
+
+
+class CargadorImagenes:
+    """
+    Iterador que carga las imágenes por adelantado con un pool de hilos.
+
+    Args:
+        rutas (list): Archivos a cargar, en el orden en que se entregan.
+        hilos (int): Hilos de lectura y decodificación.
+        prefetch (int): Máximo de imágenes cargadas (o en carga) por delante de la que
+            se está procesando.
+        modo (int): Bandera de lectura (ver `modo_lectura`).
+        decodificar (bool): Si es False solo se leen los bytes.
+        conservar_contenido (bool): Entregar también los bytes de cada archivo.
+
+    Cada elemento es un `ImagenCargada`. Las que fallan tienen `imagen` en None, un mensaje
+    en `error`, y quedan registradas en `errores` como (ruta, mensaje).
+    """
+
+    def __init__(self, rutas, hilos=HILOS, prefetch=PREFETCH, modo=cv2.IMREAD_COLOR,
+                 decodificar=True, conservar_contenido=False):
+        self.rutas = list(rutas)
+        self.hilos = max(1, hilos)
+        self.prefetch = max(1, prefetch)
+        self.modo = modo
+        self.decodificar = decodificar
+        self.conservar_contenido = conservar_contenido
+        self.errores = []
+
+    def __len__(self):
+        return len(self.rutas)
+
+    def __iter__(self):
+        pendientes = deque()
+        with ThreadPoolExecutor(max_workers=self.hilos) as ejecutor:
+            try:
+                for ruta in self.rutas:
+                    pendientes.append(ejecutor.submit(cargar_imagen, ruta, self.modo, self.decodificar,
+                                                      self.conservar_contenido))
+                    if len(pendientes) < self.prefetch:
+                        continue
+                    yield self._entregar(pendientes.popleft().result())
+                while pendientes:
+                    yield self._entregar(pendientes.popleft().result())
+            finally:
+                # Si se deja de iterar antes de terminar, no se cargan las que faltan
+                for pendiente in pendientes:
+                    pendiente.cancel()
+
+    def _entregar(self, cargada):
+        if cargada.error is not None:
+            self.errores.append((cargada.ruta, cargada.error))
+        return cargada
+
+
+def informar_errores(errores):
+    """
+    Mostramos un resumen de los archivos que no se pudieron cargar.
+    """
+    if errores:
+        print(f"\n{len(errores)} imagen(es) no se pudieron cargar:")
+        for ruta, mensaje in errores:
+            print(f"  {os.path.basename(ruta)}: {mensaje}")
@@ -0,0 +1,192 @@
+import cv2
+import numpy as np
+
+from contexto_imagen import NIVELES
+
+# Implementación de CLAHE separada en sus etapas (histogramas por mosaico, recorte,
+# LUT por mosaico e interpolación bilineal), siguiendo el mismo cálculo que
+# cv2.createCLAHE para imágenes de 8 bits. Con las etapas separadas se puede procesar
+# una imagen por franjas o reutilizar los histogramas con varios `clip_limit`.
+
+
+def geometria_mosaicos(alto, ancho, tile_grid_size=(8, 8)):
+    """
+    Calculamos el tamaño de cada mosaico igual que OpenCV: si la imagen no se divide
+    exactamente en la grilla, se extiende por abajo y por la derecha (BORDER_REFLECT_101).
+
+    Args:
+        alto (int): Alto de la imagen.
+        ancho (int): Ancho de la imagen.
+        tile_grid_size (tuple): (mosaicos en x, mosaicos en y), como en cv2.createCLAHE.
+
+    Returns:
+        tuple: (alto_mosaico, ancho_mosaico, relleno_y, relleno_x).
+    """
+    mosaicos_x, mosaicos_y = tile_grid_size
+    if ancho % mosaicos_x == 0 and alto % mosaicos_y == 0:
+        relleno_y, relleno_x = 0, 0
+    else:
+        relleno_y = mosaicos_y - alto % mosaicos_y
+        relleno_x = mosaicos_x - ancho % mosaicos_x
+    return (alto + relleno_y) // mosaicos_y, (ancho + relleno_x) // mosaicos_x, relleno_y, relleno_x
+
+
+def filas_reflejadas(inicio, fin, alto):
+    """
+    Índices de las filas [inicio, fin) de la imagen extendida, llevados a filas reales
+    con el mismo reflejo que BORDER_REFLECT_101. Como en cv2.borderInterpolate, si el
+    relleno es tan alto como la imagen el reflejo se repite (ida y vuelta).
+    """
+    filas = np.arange(inicio, fin)
+    if alto == 1:
+        return np.zeros_like(filas)
+    periodo = 2 * (alto - 1)
+    filas = filas % periodo
+    return np.where(filas < alto, filas, periodo - filas)
+
+
+def acumular_histogramas_mosaicos(hists, franja, fila_inicial, alto_mosaico, ancho_mosaico):
+    """
+    Sumamos a `hists` los histogramas de una franja horizontal de la imagen extendida.
+    La franja puede cortar mosaicos por la mitad; cada parte se suma al mosaico que le
+    corresponde.
+
+    Args:
+        hists (numpy.ndarray): Acumulador (mosaicos_y, mosaicos_x, 256) de int64.
+        franja (numpy.ndarray): Filas de la imagen extendida (ya rellenada a la derecha).
+        fila_inicial (int): Fila (de la imagen extendida) donde empieza la franja.
+        alto_mosaico (int): Alto de cada mosaico.
+        ancho_mosaico (int): Ancho de cada mosaico.
+    """
+    mosaicos_y, mosaicos_x = hists.shape[:2]
+    franja = franja[:, :mosaicos_x * ancho_mosaico]
+    desplazamientos = (np.arange(mosaicos_x, dtype=np.intp) * 256)[None, :, None]
+    fila = 0
+    while fila < franja.shape[0]:
+        mosaico_y = (fila_inicial + fila) // alto_mosaico
+        if mosaico_y >= mosaicos_y:
+            break
+        fin = min(franja.shape[0], (mosaico_y + 1) * alto_mosaico - fila_inicial)
+        parte = franja[fila:fin].reshape(fin - fila, mosaicos_x, ancho_mosaico)
+        cuentas = np.bincount((parte + desplazamientos).ravel(), minlength=mosaicos_x * 256)
+        hists[mosaico_y] += cuentas.reshape(mosaicos_x, 256)
+        fila = fin
+
+
+def calcular_histogramas_mosaicos(imagen_gris, tile_grid_size=(8, 8)):
+    """
+    Calculamos el histograma de cada mosaico de una imagen en gris que entra en memoria.
+
+    Returns:
+        numpy.ndarray: Histogramas de forma (mosaicos_y, mosaicos_x, 256) (int64).
+    """
+    alto, ancho = imagen_gris.shape
+    alto_mosaico, ancho_mosaico, relleno_y, relleno_x = geometria_mosaicos(alto, ancho, tile_grid_size)
+    if relleno_y or relleno_x:
+        imagen_gris = cv2.copyMakeBorder(imagen_gris, 0, relleno_y, 0, relleno_x, cv2.BORDER_REFLECT_101)
+    hists = np.zeros((tile_grid_size[1], tile_grid_size[0], 256), dtype=np.int64)
+    acumular_histogramas_mosaicos(hists, imagen_gris, 0, alto_mosaico, ancho_mosaico)
+    return hists
+
+
+def limite_recorte(clip_limit, area_mosaico):
+    """
+    Límite entero de cuentas por nivel que usa OpenCV para un `clip_limit`, o None si
+    no se recorta (clip_limit <= 0).
+    """
+    if clip_limit <= 0:
+        return None
+    return max(int(clip_limit * area_mosaico / 256), 1)
+
+
+def recortar_histogramas(hists, clip_limit, area_mosaico):
+    """
+    Recortamos los histogramas de los mosaicos en el límite de contraste y repartimos
+    el exceso entre todos los niveles, como hace OpenCV (el resto que no se reparte
+    en partes iguales se suma de a uno, con paso fijo desde el nivel 0).
+
+    Args:
+        hists (numpy.ndarray): Histogramas (..., 256).
+        clip_limit (float): Límite de contraste de CLAHE. Si es 0 no se recorta.
+        area_mosaico (int): Cantidad de píxeles de cada mosaico.
+
+    Returns:
+        numpy.ndarray: Histogramas recortados (int64), de la misma forma.
+    """
+    hists = np.asarray(hists, dtype=np.int64)
+    limite = limite_recorte(clip_limit, area_mosaico)
+    if limite is None:
+        return hists.copy()
+    recortado = np.maximum(hists - limite, 0).sum(axis=-1, keepdims=True)
+    hists = np.minimum(hists, limite)
+
+    reparto = recortado // 256
+    resto = recortado - reparto * 256
+    paso = np.maximum(256 // np.maximum(resto, 1), 1)
+    extra = (NIVELES % paso == 0) & (NIVELES // paso < resto)
+    return hists + reparto + extra
+
+
+def calcular_luts_mosaicos(hists, clip_limit, area_mosaico):
+    """
+    Calculamos la LUT de cada mosaico a partir de sus histogramas (sin recortar).
+
+    Returns:
+        numpy.ndarray: LUT de forma (..., 256) (uint8).
+    """
+    recortados = recortar_histogramas(hists, clip_limit, area_mosaico)
+    escala = np.float32(255.0) / np.float32(area_mosaico)
+    cdf = np.cumsum(recortados, axis=-1).astype(np.float32)
+    return np.clip(np.rint(cdf * escala), 0, 255).astype(np.uint8)
+
+
+def interpolar_mosaicos(franja_gris, luts, alto_mosaico, ancho_mosaico, fila_inicial=0, salida=None):
+    """
+    Aplicamos las LUT de los mosaicos a una franja de filas de la imagen original,
+    interpolando bilinealmente entre los cuatro mosaicos vecinos de cada píxel.
+    Solo se necesitan los píxeles de la propia franja, no una vecindad.
+
+    Args:
+        franja_gris (numpy.ndarray): Filas de la imagen en gris (uint8).
+        luts (numpy.ndarray): LUT de los mosaicos (mosaicos_y, mosaicos_x, 256).
+        alto_mosaico (int): Alto de cada mosaico.
+        ancho_mosaico (int): Ancho de cada mosaico.
+        fila_inicial (int): Fila de la imagen donde empieza la franja.
+        salida (numpy.ndarray): Array opcional donde escribir el resultado.
+
+    Returns:
+        numpy.ndarray: Franja mejorada (uint8).
+    """
+    mosaicos_y, mosaicos_x = luts.shape[:2]
+    alto, ancho = franja_gris.shape
+    luts = luts.astype(np.float32)
+
+    # Mismos pesos en float32 que OpenCV
+    def _pesos(posiciones, tamano, cantidad):
+        continuo = posiciones.astype(np.float32) * (np.float32(1.0) / np.float32(tamano)) - np.float32(0.5)
+        primero = np.floor(continuo).astype(np.intp)
+        peso = (continuo - primero).astype(np.float32)
+        segundo = np.minimum(primero + 1, cantidad - 1)
+        return np.maximum(primero, 0), segundo, np.float32(1.0) - peso, peso
+
+    y1, y2, ya1, ya = _pesos(np.arange(fila_inicial, fila_inicial + alto), alto_mosaico, mosaicos_y)
+    x1, x2, xa1, xa = _pesos(np.arange(ancho), ancho_mosaico, mosaicos_x)
+    y1, y2, ya1, ya = y1[:, None], y2[:, None], ya1[:, None], ya[:, None]
+
+    resultado = ((luts[y1, x1, franja_gris] * xa1 + luts[y1, x2, franja_gris] * xa) * ya1 +
+                 (luts[y2, x1, franja_gris] * xa1 + luts[y2, x2, franja_gris] * xa) * ya)
+    if salida is None:
+        salida = np.empty((alto, ancho), dtype=np.uint8)
+    np.copyto(salida, np.clip(np.rint(resultado), 0, 255), casting='unsafe')
+    return salida
+
+
+def aplicar_clahe_mosaicos(imagen_gris, clip_limit=2.0, tile_grid_size=(8, 8)):
+    """
+    CLAHE por etapas sobre una imagen en memoria. Da el mismo resultado que `aplicar_clahe`.
+    """
+    alto, ancho = imagen_gris.shape
+    alto_mosaico, ancho_mosaico, _, _ = geometria_mosaicos(alto, ancho, tile_grid_size)
+    hists = calcular_histogramas_mosaicos(imagen_gris, tile_grid_size)
+    luts = calcular_luts_mosaicos(hists, clip_limit, alto_mosaico * ancho_mosaico)
+    return interpolar_mosaicos(imagen_gris, luts, alto_mosaico, ancho_mosaico)
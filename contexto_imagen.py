@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+from functools import cached_property
+
+NIVELES = np.arange(256)
+
+
+class ContextoImagen:
+    """
+    Guarda los datos derivados de una imagen que comparten todas las técnicas de mejora
+    y las métricas: la imagen decodificada, su versión en escala de grises, el histograma
+    de 256 niveles, su CDF y el brillo medio.
+
+    Cada dato se calcula una sola vez, la primera vez que se usa, y luego se reutiliza.
+    Así la conversión a gris y el histograma no se repiten en cada función.
+    """
+
+    def __init__(self, imagen):
+        """
+        Args:
+            imagen (numpy.ndarray): Imagen BGR (3 canales) o en escala de grises (1 canal).
+        """
+        self.imagen = imagen
+        self.forma = imagen.shape[:2] if imagen is not None else None
+
+    @classmethod
+    def desde_histograma(cls, hist, forma):
+        """
+        Crea un contexto sin píxeles en memoria, a partir de un histograma ya acumulado
+        (por ejemplo, recorriendo una imagen enorme por franjas). Alcanza para calcular
+        las LUT y las métricas del dominio del histograma.
+
+        Args:
+            hist (numpy.ndarray): Cuentas de los 256 niveles.
+            forma (tuple): (alto, ancho) de la imagen.
+        """
+        contexto = cls(None)
+        contexto.forma = tuple(forma[:2])
+        # Se guarda en float32 como cv2.calcHist, para que las LUT salgan idénticas
+        hist = np.asarray(hist).ravel()
+        contexto.__dict__["hist"] = hist.astype(np.float32)
+        # La media se toma de las cuentas exactas: en imágenes enormes un nivel puede
+        # superar los 2^24 píxeles que float32 representa sin error
+        if contexto.total > 0:
+            contexto.__dict__["media"] = np.dot(NIVELES, hist.astype(np.float64)) / contexto.total
+        return contexto
+
+    @property
+    def es_color(self):
+        return self.imagen is not None and self.imagen.ndim == 3
+
+    @cached_property
+    def gris(self):
+        """Imagen en escala de grises (uint8)."""
+        if self.imagen is None:
+            raise ValueError("El contexto se creó desde un histograma y no tiene los píxeles de la imagen.")
+        if self.es_color:
+            return cv2.cvtColor(self.imagen, cv2.COLOR_BGR2GRAY)
+        return self.imagen
+
+    @cached_property
+    def hist(self):
+        """Histograma de 256 niveles de la imagen en gris (float32, como cv2.calcHist)."""
+        return cv2.calcHist([self.gris], [0], None, [256], [0, 256]).flatten()
+
+    @cached_property
+    def cdf(self):
+        """Distribución acumulada (sin normalizar) del histograma."""
+        return np.cumsum(self.hist)
+
+    @property
+    def total(self):
+        """Cantidad de píxeles de la imagen."""
+        return int(np.prod(self.forma))
+
+    @cached_property
+    def media(self):
+        """
+        Brillo medio de la imagen en gris, calculado desde el histograma.
+        Se devuelve como np.float64, igual que np.mean, para que las operaciones con
+        arrays float32 se sigan haciendo en doble precisión.
+        """
+        if self.total == 0:
+            return np.float64(0.0)
+        return np.dot(NIVELES, self.hist.astype(np.float64)) / self.total
+
+
+def obtener_contexto(imagen):
+    """
+    Devuelve el contexto de la imagen. Si ya es un ContextoImagen se devuelve tal cual,
+    de modo que las funciones aceptan indistintamente un array o un contexto.
+    """
+    if isinstance(imagen, ContextoImagen):
+        return imagen
+    return ContextoImagen(imagen)
+
+
+def histograma_de(imagen_o_hist):
+    """
+    Histograma de 256 niveles de una imagen en gris; si ya es un histograma, se devuelve tal cual.
+    """
+    if imagen_o_hist.ndim == 1:
+        return imagen_o_hist
+    return cv2.calcHist([imagen_o_hist], [0], None, [256], [0, 256]).ravel()
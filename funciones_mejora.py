@@ -1,117 +1,395 @@
+import logging
+
 import cv2
 import numpy as np
 
-def aplicar_ecualizacion_histograma(imagen_bgr):
+from contexto_imagen import obtener_contexto, NIVELES
+
+# Los mensajes de las técnicas se emiten con logging (nivel DEBUG): no aparecen salvo
+# que se pida ese nivel, por ejemplo con --log-nivel DEBUG en main_proyecto.py.
+logger = logging.getLogger(__name__)
+
+def aplicar_ecualizacion_histograma(imagen_bgr, salida=None):
     """
     Aplicamos la ecualización de histograma estándar (HE) a la imagen.
     Si la imagen ya está en escala de grises, se usa directamente.
     Si no, se convierte a escala de grises antes de aplicar la ecualización.
+    También acepta un ContextoImagen, en cuyo caso se reutiliza su imagen en gris.
+    Con `salida` (uint8 del tamaño de la imagen) el resultado se escribe ahí.
     """
+    contexto = obtener_contexto(imagen_bgr)
     # Verificamos si la imagen tiene 3 canales (color) o 1 (escala de grises)
-    # Se usa el nombre de variable original 'imagen_bgr' para la entrada,
-    # pero el código ahora maneja ambos casos.
-    if len(imagen_bgr.shape) == 3:
-        # Si es a color, la convertimos a escala de grises
-        imagen_gris = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2GRAY)
-        print("La imagen fue convertida a escala de grises.")
+    if contexto.es_color:
+        logger.debug("La imagen fue convertida a escala de grises.")
     else:
-        # Si ya está en escala de grises, la usamos directamente
-        imagen_gris = imagen_bgr
-        print("La imagen ya está en escala de grises, no se requiere conversión.")
+        logger.debug("La imagen ya está en escala de grises, no se requiere conversión.")
+    imagen_gris = contexto.gris
 
-    imagen_ecualizada = cv2.equalizeHist(imagen_gris)
+    imagen_ecualizada = cv2.equalizeHist(imagen_gris, dst=salida)
     return imagen_ecualizada
 
-def aplicar_clahe(imagen_bgr, clip_limit=2.0, tile_grid_size=(8, 8)):
+def calcular_lut_he(imagen_bgr):
+    """
+    Calculamos el plan de transformación de HE como una LUT de 256 entradas (uint8),
+    con la misma fórmula que usa cv2.equalizeHist, de modo que
+    `aplicar_lut(imagen, calcular_lut_he(imagen))` da el mismo resultado.
+    """
+    contexto = obtener_contexto(imagen_bgr)
+    hist = contexto.hist.astype(np.int64)
+    total = contexto.total
+    lut = np.zeros(256, dtype=np.uint8)
+    if total == 0:
+        return lut
+
+    # El primer nivel presente se lleva a 0 y el resto se escala por la CDF sin ese nivel
+    primer_nivel = np.flatnonzero(hist)[0]
+    if hist[primer_nivel] == total:
+        lut[:] = primer_nivel
+        return lut
+    escala = np.float32(255.0) / np.float32(total - hist[primer_nivel])
+    cdf = np.cumsum(hist) - hist[primer_nivel]
+    lut[primer_nivel:] = np.clip(np.rint(cdf[primer_nivel:].astype(np.float32) * escala), 0, 255)
+    return lut
+
+def aplicar_clahe(imagen_bgr, clip_limit=2.0, tile_grid_size=(8, 8), salida=None):
     """
     Aplicamos la ecualización de histograma adaptativa (CLAHE) a la imagen.
+    Acepta una imagen BGR o un ContextoImagen. Con `salida` el resultado se escribe ahí.
     """
-    imagen_gris = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2GRAY)
+    imagen_gris = obtener_contexto(imagen_bgr).gris
     clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
-    imagen_clahe = clahe.apply(imagen_gris)
+    imagen_clahe = clahe.apply(imagen_gris, dst=salida)
     return imagen_clahe
 
-def aplicar_dsihe(imagen_bgr):
+def aplicar_lut(imagen_bgr, lut, salida=None):
     """
-    Aplicamos la técnica de Ecualización de Histograma Sub-imagen Dinámica (DSIHE).
+    Aplicamos una tabla de transformación (LUT) de 256 entradas a la imagen en gris
+    en una sola pasada con cv2.LUT.
+    Acepta una imagen BGR, una imagen en gris o un ContextoImagen.
+    Con `salida` (uint8 del tamaño de la imagen) el resultado se escribe ahí, sin
+    reservar memoria nueva; se devuelve el mismo array.
+    """
+    return cv2.LUT(obtener_contexto(imagen_bgr).gris, lut, dst=salida)
+
+def calcular_lut_dsihe(imagen_bgr):
     """
-    print("Algoritmo DSIHE aplicado.")
-    imagen_gris = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2GRAY)
-    
-    # Calculamos el histograma de la imagen
-    hist = cv2.calcHist([imagen_gris], [0], None, [256], [0, 256])
+    Calculamos el plan de transformación de DSIHE: una LUT de 256 entradas (uint8) que
+    se obtiene trabajando solo sobre el histograma de 256 niveles, sin recorrer los píxeles.
+    La LUT puede inspeccionarse, reutilizarse o aplicarse con `aplicar_lut`.
+    """
+    contexto = obtener_contexto(imagen_bgr)
 
-    # Encontramos el valor medio de los píxeles de la imagen
-    media_intensidad = np.mean(imagen_gris)
+    # Tomamos el histograma y el valor medio de los píxeles ya calculados en el contexto
+    hist = contexto.hist
+    media_intensidad = contexto.media
+    corte = int(media_intensidad)
 
-    # Dividimos el histograma en dos partes
-    hist_izq = hist[0:int(media_intensidad) + 1]
-    hist_der = hist[int(media_intensidad) + 1:256]
+    # Dividimos el histograma en dos partes: niveles <= media y niveles > media
+    hist_izq = hist[0:corte + 1]
+    hist_der = hist[corte + 1:256]
 
     # Calculamos las probabilidades acumuladas (CDF) para cada sub-histograma
     cdf_izq = np.cumsum(hist_izq)
     cdf_der = np.cumsum(hist_der)
 
-    cdf_izq_max = cdf_izq.max()
-    cdf_der_max = cdf_der.max()
+    # El máximo de una CDF es su último valor (el sub-histograma derecho puede estar vacío)
+    cdf_izq_max = cdf_izq[-1] if cdf_izq.size else 0
+    cdf_der_max = cdf_der[-1] if cdf_der.size else 0
     cdf_izq_norm = cdf_izq / cdf_izq_max if cdf_izq_max > 0 else np.zeros_like(cdf_izq)
     cdf_der_norm = cdf_der / cdf_der_max if cdf_der_max > 0 else np.zeros_like(cdf_der)
 
-    # Calculamos las transformaciones de píxeles
+    # Calculamos las transformaciones de cada mitad del rango de niveles
     transform_izq = np.round(media_intensidad * cdf_izq_norm).astype('uint8')
     transform_der = np.round(255 - media_intensidad + (media_intensidad * cdf_der_norm)).astype('uint8')
-    transform_der += int(media_intensidad)
+    transform_der += corte
 
-    # Aplicamos las transformaciones a los píxeles de la imagen
-    imagen_dsihe = np.zeros_like(imagen_gris)
-    imagen_dsihe[imagen_gris <= media_intensidad] = transform_izq[imagen_gris[imagen_gris <= media_intensidad]]
-    imagen_dsihe[imagen_gris > media_intensidad] = transform_der[imagen_gris[imagen_gris > media_intensidad] - int(media_intensidad) - 1]
+    # Como ambas mitades cubren niveles consecutivos, la LUT es su concatenación
+    return np.concatenate([transform_izq, transform_der])
 
-    return imagen_dsihe
+def aplicar_dsihe(imagen_bgr, salida=None):
+    """
+    Aplicamos la técnica de Ecualización de Histograma Sub-imagen Dinámica (DSIHE).
+    Acepta una imagen BGR o un ContextoImagen. Con `salida` el resultado se escribe ahí.
+    """
+    logger.debug("Algoritmo DSIHE aplicado.")
+    contexto = obtener_contexto(imagen_bgr)
+    return aplicar_lut(contexto, calcular_lut_dsihe(contexto), salida)
 
-def aplicar_bbhe(imagen_bgr):
+def calcular_lut_bbhe(imagen_bgr):
     """
-    Aplica la técnica de Ecualización de Histograma por Separación de Brillo (BBHE).
+    Calculamos el plan de transformación de BBHE: una LUT de 256 entradas (uint8) que
+    se obtiene separando el histograma por el brillo medio, sin máscaras ni copias de la imagen.
+    La LUT puede inspeccionarse, reutilizarse o aplicarse con `aplicar_lut`.
     """
-    print("Algoritmo BBHE aplicado.")
-    imagen_gris = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2GRAY)
-    
-    # Calculamos la media de los píxeles de la imagen
-    media_intensidad = np.mean(imagen_gris)
-    
-    # Separamos la imagen en píxeles oscuros y brillantes
-    p_oscuro = imagen_gris < media_intensidad
-    p_brillante = imagen_gris >= media_intensidad
-
-    # Creamos las sub-imágenes
-    imagen_oscura = np.copy(imagen_gris)
-    imagen_oscura[p_brillante] = 0
-    imagen_brillante = np.copy(imagen_gris)
-    imagen_brillante[p_oscuro] = 0
-    
-    # Aplicamos ecualización a los sub-histogramas
-    hist_oscuro, _ = np.histogram(imagen_oscura[p_oscuro], 256, [0, 256])
+    contexto = obtener_contexto(imagen_bgr)
+
+    # Tomamos la media de los píxeles de la imagen desde el contexto
+    media_intensidad = contexto.media
+    corte = int(media_intensidad)
+
+    # Separamos los niveles en oscuros y brillantes
+    n_oscuro = NIVELES < media_intensidad
+    n_brillante = ~n_oscuro
+    hist = contexto.hist.astype(np.int64)
+
+    # Sub-histograma oscuro
+    hist_oscuro = np.where(n_oscuro, hist, 0)
     cdf_oscuro = hist_oscuro.cumsum()
     # Agregamos una comprobación para evitar la división por cero
-    cdf_oscuro_max = cdf_oscuro.max()
+    cdf_oscuro_max = cdf_oscuro[-1]
     cdf_oscuro_norm = cdf_oscuro / cdf_oscuro_max if cdf_oscuro_max > 0 else np.zeros_like(cdf_oscuro)
     transform_oscuro = np.round(media_intensidad * cdf_oscuro_norm).astype('uint8')
-    
-    # Sub-imagen brillante
-    hist_brillante, _ = np.histogram(imagen_brillante[p_brillante], 256, [0, 256])
+
+    # Sub-histograma brillante
+    hist_brillante = np.where(n_brillante, hist, 0)
     cdf_brillante = hist_brillante.cumsum()
     # Agregamos una comprobación para evitar la división por cero
-    cdf_brillante_max = cdf_brillante.max()
+    cdf_brillante_max = cdf_brillante[-1]
     cdf_brillante_norm = cdf_brillante / cdf_brillante_max if cdf_brillante_max > 0 else np.zeros_like(cdf_brillante)
     transform_brillante = np.round((255 - media_intensidad) * cdf_brillante_norm).astype('uint8')
-    transform_brillante += int(media_intensidad)
-    
-    # Combinamos los resultados
-    imagen_bbhe = np.zeros_like(imagen_gris)
-    
-    # Corregimos la asignación de píxeles
-    imagen_bbhe[p_oscuro] = transform_oscuro[imagen_gris[p_oscuro]]
-    imagen_bbhe[p_brillante] = transform_brillante[imagen_gris[p_brillante] - int(media_intensidad)]
-    
-    return imagen_bbhe
+    transform_brillante += corte
+
+    # Combinamos las dos transformaciones en una sola LUT: los niveles brillantes
+    # se indexan desplazados por la parte entera de la media
+    lut = np.empty(256, dtype=np.uint8)
+    lut[n_oscuro] = transform_oscuro[n_oscuro]
+    lut[n_brillante] = transform_brillante[NIVELES[n_brillante] - corte]
+    return lut
 
+def aplicar_bbhe(imagen_bgr, salida=None):
+    """
+    Aplica la técnica de Ecualización de Histograma por Separación de Brillo (BBHE).
+    Acepta una imagen BGR o un ContextoImagen. Con `salida` el resultado se escribe ahí.
+    """
+    logger.debug("Algoritmo BBHE aplicado.")
+    contexto = obtener_contexto(imagen_bgr)
+    return aplicar_lut(contexto, calcular_lut_bbhe(contexto), salida)
+
+# --- Versiones recursivas: RMSHE (separación por la media) y RSIHE (por la mediana) ---
+# Con profundidad r el rango de niveles se divide en hasta 2^r partes y cada una se ecualiza
+# dentro de su propio rango. Todo se calcula sobre el histograma (256 niveles), así que
+# el resultado es una única LUT y la imagen se recorre una sola vez, sea cual sea r.
+# Con r = 1 son BBHE y DSIHE en su forma estándar, que asigna a cada mitad su propio
+# rango de niveles (sin los desplazamientos de `calcular_lut_bbhe`/`calcular_lut_dsihe`).
+
+def _rangos_recursivos(hist, profundidad, criterio):
+    """
+    Dividimos recursivamente el rango [0, 255] en `profundidad` niveles de separación.
+
+    Args:
+        hist (numpy.ndarray): Histograma de 256 niveles (int64).
+        profundidad (int): Niveles de recursión r (hasta 2^r rangos).
+        criterio (str): "media" (RMSHE) o "mediana" (RSIHE).
+
+    Returns:
+        tuple: (inicios, fines) de cada rango, inclusivos y ordenados. Un rango sin
+        píxeles, o que no se puede separar, no se divide más.
+    """
+    acumulado = np.concatenate([[0], np.cumsum(hist)])  # acumulado[i]: píxeles con nivel < i
+    acumulado_niveles = np.concatenate([[0], np.cumsum(hist * NIVELES)])
+    inicios, fines = np.array([0]), np.array([255])
+    for _ in range(profundidad):
+        cuentas = acumulado[fines + 1] - acumulado[inicios]
+        if criterio == "media":
+            sumas = acumulado_niveles[fines + 1] - acumulado_niveles[inicios]
+            cortes = sumas // np.maximum(cuentas, 1)
+        else:
+            # Primer nivel donde el rango acumula al menos la mitad de sus píxeles
+            cortes = np.searchsorted(acumulado[1:], acumulado[inicios] + (cuentas + 1) // 2)
+        # El corte es el último nivel de la parte inferior
+        separables = (cuentas > 0) & (cortes >= inicios) & (cortes < fines)
+        inicios = np.sort(np.concatenate([inicios, cortes[separables] + 1]))
+        fines = np.sort(np.concatenate([fines, cortes[separables]]))
+    return inicios, fines
+
+
+def _lut_por_rangos(hist, inicios, fines):
+    # Ecualización de cada rango dentro de sí mismo: [inicio, fin] -> inicio + (fin - inicio) * CDF del rango
+    lut = NIVELES.astype(np.float64)
+    acumulado = np.concatenate([[0], np.cumsum(hist)])
+    rango = np.repeat(np.arange(len(inicios)), fines - inicios + 1)
+    inicio, fin = inicios[rango], fines[rango]
+    cuentas = acumulado[fin + 1] - acumulado[inicio]
+    con_pixeles = cuentas > 0
+    escalado = (fin - inicio) * (acumulado[NIVELES + 1] - acumulado[inicio])
+    lut[con_pixeles] = inicio[con_pixeles] + escalado[con_pixeles] / cuentas[con_pixeles]
+    return np.clip(np.rint(lut), 0, 255).astype(np.uint8)
+
+
+def calcular_lut_rmshe(imagen_bgr, profundidad=2):
+    """
+    Calculamos la LUT de RMSHE (Recursive Mean-Separate HE): el histograma se separa por
+    la media de cada parte, recursivamente, y cada una de las hasta 2^profundidad partes
+    se ecualiza en su propio rango. Conserva mejor el brillo que HE y BBHE.
+    Acepta una imagen BGR o un ContextoImagen.
+    """
+    contexto = obtener_contexto(imagen_bgr)
+    hist = contexto.hist.astype(np.int64)
+    inicios, fines = _rangos_recursivos(hist, profundidad, "media")
+    return _lut_por_rangos(hist, inicios, fines)
+
+def aplicar_rmshe(imagen_bgr, profundidad=2, salida=None):
+    """
+    Aplicamos RMSHE con la profundidad indicada. Acepta una imagen BGR o un ContextoImagen.
+    Con `salida` el resultado se escribe ahí.
+    """
+    logger.debug("Algoritmo RMSHE aplicado.")
+    contexto = obtener_contexto(imagen_bgr)
+    return aplicar_lut(contexto, calcular_lut_rmshe(contexto, profundidad), salida)
+
+def calcular_lut_rsihe(imagen_bgr, profundidad=2):
+    """
+    Calculamos la LUT de RSIHE (Recursive Sub-Image HE): como RMSHE pero separando por la
+    mediana, de modo que cada parte tiene la misma cantidad de píxeles (la generalización
+    de DSIHE). Acepta una imagen BGR o un ContextoImagen.
+    """
+    contexto = obtener_contexto(imagen_bgr)
+    hist = contexto.hist.astype(np.int64)
+    inicios, fines = _rangos_recursivos(hist, profundidad, "mediana")
+    return _lut_por_rangos(hist, inicios, fines)
+
+def aplicar_rsihe(imagen_bgr, profundidad=2, salida=None):
+    """
+    Aplicamos RSIHE con la profundidad indicada. Acepta una imagen BGR o un ContextoImagen.
+    Con `salida` el resultado se escribe ahí.
+    """
+    logger.debug("Algoritmo RSIHE aplicado.")
+    contexto = obtener_contexto(imagen_bgr)
+    return aplicar_lut(contexto, calcular_lut_rsihe(contexto, profundidad), salida)
+
+# Técnicas que son un mapeo global de intensidades: nombre -> función que calcula su LUT
+PLANES = {
+    "HE": calcular_lut_he,
+    "DSIHE": calcular_lut_dsihe,
+    "BBHE": calcular_lut_bbhe,
+    "RMSHE": calcular_lut_rmshe,
+    "RSIHE": calcular_lut_rsihe,
+}
+
+# --- Modo por lotes: N imágenes del mismo tamaño apiladas en un array (N, H, W) ---
+
+def calcular_histogramas_lote(pila, bloque=64, trabajo=None):
+    """
+    Calculamos los histogramas de 256 niveles de una pila (N, H, W) de imágenes en gris
+    con un solo np.bincount por bloque: a cada imagen se le suma un desplazamiento de
+    256 * índice para que sus niveles caigan en su propia fila.
+
+    Args:
+        pila (numpy.ndarray): Imágenes en gris (uint8) de forma (N, H, W).
+        bloque (int): Cantidad de imágenes por bincount; limita la memoria temporal de índices.
+        trabajo (numpy.ndarray): Buffer np.intp de al menos (min(N, bloque), H * W) para
+            los índices. Sin él se reserva uno nuevo en cada bloque.
+
+    Returns:
+        numpy.ndarray: Histogramas de forma (N, 256) (int64).
+    """
+    n = pila.shape[0]
+    planos = pila.reshape(n, -1)
+    hists = np.empty((n, 256), dtype=np.int64)
+    for inicio in range(0, n, bloque):
+        parte = planos[inicio:inicio + bloque]
+        desplazamientos = (np.arange(len(parte), dtype=np.intp) * 256)[:, None]
+        indices = np.add(parte, desplazamientos, out=None if trabajo is None else trabajo[:len(parte)])
+        hists[inicio:inicio + len(parte)] = np.bincount(indices.ravel(), minlength=len(parte) * 256).reshape(-1, 256)
+    return hists
+
+def _medias_lote(hists):
+    # Igual que ContextoImagen.media: la suma de niveles es entera, por lo que es exacta
+    total = hists.sum(axis=1)
+    return np.sum(hists.astype(np.float64) * NIVELES, axis=1) / np.maximum(total, 1)
+
+def calcular_luts_he_lote(hists):
+    """
+    Versión por lotes de `calcular_lut_he`: una LUT de HE por fila de `hists` (N, 256).
+    """
+    hists = np.asarray(hists, dtype=np.int64)
+    total = hists.sum(axis=1)
+    filas = np.arange(len(hists))
+
+    primer_nivel = np.argmax(hists > 0, axis=1)
+    cuenta_primero = hists[filas, primer_nivel]
+    # Las filas constantes se resuelven al final; se evita dividir por cero
+    escala = np.float32(255.0) / np.maximum(total - cuenta_primero, 1).astype(np.float32)
+    cdf = np.cumsum(hists, axis=1) - cuenta_primero[:, None]
+    luts = np.clip(np.rint(cdf.astype(np.float32) * escala[:, None]), 0, 255).astype(np.uint8)
+    luts[NIVELES[None, :] < primer_nivel[:, None]] = 0
+
+    # Imágenes de un solo nivel (o vacías): la LUT es constante
+    constantes = cuenta_primero == total
+    luts[constantes] = np.where(total[constantes] > 0, primer_nivel[constantes], 0)[:, None]
+    return luts
+
+def calcular_luts_dsihe_lote(hists):
+    """
+    Versión por lotes de `calcular_lut_dsihe`: una LUT de DSIHE por fila de `hists` (N, 256).
+    Cada sub-histograma se acumula con ceros fuera de su mitad, lo que da las mismas
+    CDF (en float32) que acumular el trozo por separado.
+    """
+    hists = np.asarray(hists)
+    media_intensidad = _medias_lote(hists)[:, None]
+    corte = media_intensidad.astype(np.int64)
+    hist = hists.astype(np.float32)
+    izquierda = NIVELES[None, :] <= corte
+
+    cdf_izq = np.cumsum(np.where(izquierda, hist, 0), axis=1)
+    cdf_der = np.cumsum(np.where(izquierda, 0, hist), axis=1)
+    cdf_izq_max = np.take_along_axis(cdf_izq, corte, axis=1)
+    cdf_der_max = cdf_der[:, -1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cdf_izq_norm = np.where(cdf_izq_max > 0, cdf_izq / cdf_izq_max, 0).astype(np.float32)
+        cdf_der_norm = np.where(cdf_der_max > 0, cdf_der / cdf_der_max, 0).astype(np.float32)
+
+    transform_izq = np.round(media_intensidad * cdf_izq_norm).astype('uint8')
+    transform_der = np.round(255 - media_intensidad + (media_intensidad * cdf_der_norm)).astype('uint8')
+    # Misma suma módulo 256 que `transform_der += corte` sobre uint8
+    transform_der = ((transform_der.astype(np.int64) + corte) % 256).astype(np.uint8)
+    return np.where(izquierda, transform_izq, transform_der)
+
+def calcular_luts_bbhe_lote(hists):
+    """
+    Versión por lotes de `calcular_lut_bbhe`: una LUT de BBHE por fila de `hists` (N, 256).
+    """
+    hists = np.asarray(hists, dtype=np.int64)
+    media_intensidad = _medias_lote(hists)[:, None]
+    corte = media_intensidad.astype(np.int64)
+    n_oscuro = NIVELES[None, :] < media_intensidad
+
+    cdf_oscuro = np.cumsum(np.where(n_oscuro, hists, 0), axis=1)
+    cdf_brillante = np.cumsum(np.where(n_oscuro, 0, hists), axis=1)
+    cdf_oscuro_max = cdf_oscuro[:, -1:]
+    cdf_brillante_max = cdf_brillante[:, -1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cdf_oscuro_norm = np.where(cdf_oscuro_max > 0, cdf_oscuro / cdf_oscuro_max, 0)
+        cdf_brillante_norm = np.where(cdf_brillante_max > 0, cdf_brillante / cdf_brillante_max, 0)
+
+    transform_oscuro = np.round(media_intensidad * cdf_oscuro_norm).astype('uint8')
+    transform_brillante = np.round((255 - media_intensidad) * cdf_brillante_norm).astype('uint8')
+    transform_brillante = (transform_brillante + corte).astype(np.uint8)
+
+    # Los niveles brillantes se indexan desplazados por la parte entera de la media
+    indices_brillantes = np.clip(NIVELES[None, :] - corte, 0, 255)
+    brillante = np.take_along_axis(transform_brillante, indices_brillantes, axis=1)
+    return np.where(n_oscuro, transform_oscuro, brillante)
+
+def aplicar_luts_lote(pila, luts, salida=None):
+    """
+    Aplicamos a cada imagen de la pila (N, H, W) su LUT (N, 256). Cada imagen pasa por
+    cv2.LUT, que escribe directamente en el resultado sin índices temporales del tamaño
+    de la pila. Con `salida` (uint8, forma de la pila) el resultado se escribe ahí.
+    """
+    resultado = np.empty_like(pila) if salida is None else salida
+    for indice, imagen_gris in enumerate(pila):
+        cv2.LUT(imagen_gris, np.ascontiguousarray(luts[indice]), dst=resultado[indice])
+    return resultado
+
+def aplicar_clahe_lote(pila, clip_limit=2.0, tile_grid_size=(8, 8), salida=None):
+    """
+    Aplicamos CLAHE a cada imagen de la pila (N, H, W) reutilizando el mismo objeto CLAHE.
+    Al ser una técnica espacial no admite una LUT por imagen.
+    Con `salida` (uint8, forma de la pila) el resultado se escribe ahí.
+    """
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+    resultado = np.empty_like(pila) if salida is None else salida
+    for indice, imagen_gris in enumerate(pila):
+        clahe.apply(imagen_gris, dst=resultado[indice])
+    return resultado
@@ -1,7 +1,19 @@
+from collections import namedtuple
+
 import numpy as np
 import cv2
 import scipy.stats
-import matplotlib.pyplot as plt # Importado para gráficos
+
+from arena_buffers import ArenaBuffers
+from contexto_imagen import ContextoImagen, NIVELES, histograma_de
+
+def _como_gris(imagen):
+    """
+    Devuelve la imagen en gris, tanto si se recibe un array como un ContextoImagen.
+    """
+    if isinstance(imagen, ContextoImagen):
+        return imagen.gris
+    return imagen
 
 def calcular_ambe(imagen_original_gris, imagen_mejorada_gris):
     """
@@ -11,17 +23,18 @@ def calcular_ambe(imagen_original_gris, imagen_mejorada_gris):
     no ha alterado drásticamente el brillo general.
 
     Args:
-        imagen_original_gris (numpy.ndarray): Imagen original en escala de grises.
-        imagen_mejorada_gris (numpy.ndarray): Imagen mejorada en escala de grises.
+        imagen_original_gris (numpy.ndarray | ContextoImagen): Imagen original en escala de grises.
+        imagen_mejorada_gris (numpy.ndarray | ContextoImagen): Imagen mejorada en escala de grises.
 
     Returns:
         float: El valor de AMBE.
     """
-    if imagen_original_gris.shape != imagen_mejorada_gris.shape:
+    if _como_gris(imagen_original_gris).shape != _como_gris(imagen_mejorada_gris).shape:
         raise ValueError("Las imágenes deben tener las mismas dimensiones para calcular AMBE.")
     
-    brillo_original = np.mean(imagen_original_gris)
-    brillo_mejorado = np.mean(imagen_mejorada_gris)
+    # Si se recibe un contexto, su brillo medio ya está calculado desde el histograma
+    brillo_original = imagen_original_gris.media if isinstance(imagen_original_gris, ContextoImagen) else np.mean(imagen_original_gris)
+    brillo_mejorado = imagen_mejorada_gris.media if isinstance(imagen_mejorada_gris, ContextoImagen) else np.mean(imagen_mejorada_gris)
     ambe = abs(brillo_mejorado - brillo_original)
     return ambe
 
@@ -32,12 +45,14 @@ def calcular_psnr(imagen_original_gris, imagen_mejorada_gris):
     Un PSNR más alto generalmente indica una mejor calidad de reconstrucción.
 
     Args:
-        imagen_original_gris (numpy.ndarray): Imagen original en escala de grises.
-        imagen_mejorada_gris (numpy.ndarray): Imagen mejorada en escala de grises.
+        imagen_original_gris (numpy.ndarray | ContextoImagen): Imagen original en escala de grises.
+        imagen_mejorada_gris (numpy.ndarray | ContextoImagen): Imagen mejorada en escala de grises.
 
     Returns:
         float: El valor de PSNR. Retorna np.inf si las imágenes son idénticas.
     """
+    imagen_original_gris = _como_gris(imagen_original_gris)
+    imagen_mejorada_gris = _como_gris(imagen_mejorada_gris)
     if imagen_original_gris.shape != imagen_mejorada_gris.shape:
         raise ValueError("Las imágenes deben tener las mismas dimensiones para calcular PSNR.")
     
@@ -46,19 +61,31 @@ def calcular_psnr(imagen_original_gris, imagen_mejorada_gris):
     psnr = cv2.PSNR(imagen_original_gris, imagen_mejorada_gris)
     return psnr
 
-def calcular_contraste(imagen_gris):
+def calcular_contraste(imagen_gris, trabajo=None):
     """
     Calcula el contraste de una imagen en escala de grises como su desviación estándar.
     Un valor más alto indica un mayor contraste.
 
     Args:
-        imagen_gris (numpy.ndarray): Imagen en escala de grises.
+        imagen_gris (numpy.ndarray | ContextoImagen): Imagen en escala de grises.
+            Con un contexto, la desviación se obtiene de su histograma sin recorrer los píxeles.
+        trabajo (numpy.ndarray): Buffer float64 del tamaño de la imagen para las
+            diferencias con la media. Sin él, np.std reserva uno nuevo en cada llamada.
 
     Returns:
         float: El valor de contraste (desviación estándar).
     """
+    if isinstance(imagen_gris, ContextoImagen):
+        if imagen_gris.total == 0:
+            return 0.0
+        return _contraste_desde_histograma(imagen_gris.hist, imagen_gris.total, imagen_gris.media)
     if imagen_gris.size == 0: # Evitar error si la imagen está vacía
         return 0.0
+    if trabajo is not None:
+        # Mismos pasos que np.std, pero sobre el buffer recibido
+        diferencias = np.subtract(imagen_gris, np.mean(imagen_gris), out=trabajo.reshape(imagen_gris.shape))
+        np.multiply(diferencias, diferencias, out=diferencias)
+        return np.sqrt(np.sum(diferencias) / imagen_gris.size)
     contraste = np.std(imagen_gris)
     return contraste
 
@@ -69,46 +96,397 @@ def calcular_entropia(imagen_gris):
     Una imagen con más detalles y una distribución de píxeles más variada tendrá una entropía más alta.
 
     Args:
-        imagen_gris (numpy.ndarray): Imagen en escala de grises.
+        imagen_gris (numpy.ndarray | ContextoImagen): Imagen en escala de grises.
+            Con un contexto, se reutiliza su histograma.
 
     Returns:
         float: El valor de entropía.
     """
-    if imagen_gris.size == 0: # Evitar error si la imagen está vacía
+    if _como_gris(imagen_gris).size == 0: # Evitar error si la imagen está vacía
         return 0.0
         
-    # Calcular el histograma de la imagen (frecuencia de cada nivel de gris)
-    # cv2.calcHist devuelve un array de 256x1, lo aplanamos.
-    hist = cv2.calcHist([imagen_gris], [0], None, [256], [0, 256]).flatten()
+    if isinstance(imagen_gris, ContextoImagen):
+        hist = imagen_gris.hist
+    else:
+        # Calcular el histograma de la imagen (frecuencia de cada nivel de gris)
+        # cv2.calcHist devuelve un array de 256x1, lo aplanamos.
+        hist = cv2.calcHist([imagen_gris], [0], None, [256], [0, 256]).flatten()
 
     # Normalizar el histograma para obtener las probabilidades de cada nivel de gris
     # Suma total de píxeles para evitar división por cero si la imagen es vacía
-    total_pixels = imagen_gris.size
+    total_pixels = _como_gris(imagen_gris).size
     if total_pixels == 0:
         return 0.0
-    
-    hist_normalized = hist / total_pixels
+
+    return _entropia_desde_histograma(hist, total_pixels)
+
+# --- Métricas calculadas en el dominio del histograma ---
+# Estas funciones aceptan un histograma (256,) o una pila de histogramas (N, 256) y
+# reducen siempre sobre el último eje, de modo que el modo por lotes da exactamente
+# los mismos valores que el cálculo imagen por imagen.
+
+def _por_fila(valor):
+    # Agrega un eje al final para operar fila a fila contra los 256 niveles
+    return np.expand_dims(np.asarray(valor), -1)
+
+def _media_desde_histograma(hist, total):
+    return np.sum(hist.astype(np.float64) * NIVELES, axis=-1) / total
+
+def _contraste_desde_histograma(hist, total, media):
+    varianza = np.sum(hist.astype(np.float64) * (NIVELES - _por_fila(media)) ** 2, axis=-1) / total
+    return np.sqrt(varianza)
+
+def _entropia_desde_histograma(hist, total):
+    # Normalizar el histograma para obtener las probabilidades de cada nivel de gris.
+    # Se trabaja en float32, igual que con el histograma de cv2.calcHist.
+    hist_normalized = hist.astype(np.float32) / _por_fila(total).astype(np.float32)
 
     # Calcular la entropía (usando la fórmula de Shannon)
     # Ignorar los bins con probabilidad cero para evitar log2(0)
     # np.log2(p + 1e-8) se usa para evitar log de cero, añadiendo un pequeño valor
-    entropia = -np.sum(hist_normalized * np.log2(hist_normalized + 1e-8))
+    entropia = -np.sum(hist_normalized * np.log2(hist_normalized + 1e-8), axis=-1)
     return entropia
 
+def _psnr_desde_mse(mse):
+    # Misma fórmula que cv2.PSNR: 20*log10(R / (RMSE + eps)), con R = 255
+    return 20 * np.log10(255.0 / (np.sqrt(mse) + np.finfo(np.float64).eps))
+
+def _mse_desde_lut(hist_original, lut, total):
+    return np.sum(hist_original * (lut.astype(np.float64) - NIVELES) ** 2, axis=-1) / total
+
+def _metricas_desde_histogramas(hist_original, hist_mejorado, total, mse):
+    media_original = _media_desde_histograma(hist_original, total)
+    media_mejorada = _media_desde_histograma(hist_mejorado, total)
+    return {
+        "AMBE": abs(media_mejorada - media_original),
+        "PSNR": _psnr_desde_mse(mse) if mse is not None else np.nan,
+        "Contraste": _contraste_desde_histograma(hist_mejorado, total, media_mejorada),
+        "Entropia": _entropia_desde_histograma(hist_mejorado, total),
+    }
+
+def calcular_metricas_desde_histograma(hist_original, lut=None, hist_mejorado=None):
+    """
+    Calcula AMBE, PSNR, Contraste y Entropía en una sola llamada, en O(256) y sin recorrer
+    los píxeles. Sirve para las técnicas que son un mapeo global de intensidades
+    (HE, DSIHE, BBHE): la imagen mejorada queda determinada por el histograma original
+    y la LUT, por lo que las métricas son exactas.
+
+    Args:
+        hist_original (numpy.ndarray | ContextoImagen): Histograma de 256 niveles de la
+            imagen original, o su contexto.
+        lut (numpy.ndarray): LUT de 256 entradas aplicada a la imagen original.
+        hist_mejorado (numpy.ndarray): Histograma de la imagen mejorada. Se usa solo si no se
+            pasa la LUT; sin ella no se conoce qué nivel va a cuál y el PSNR queda en np.nan.
+
+    Returns:
+        dict: Valores de "AMBE", "PSNR", "Contraste" y "Entropia".
+    """
+    if isinstance(hist_original, ContextoImagen):
+        hist_original = hist_original.hist
+    hist_original = np.asarray(hist_original, dtype=np.float64).ravel()
+    total = int(hist_original.sum())
+    if total == 0:
+        return {"AMBE": 0.0, "PSNR": np.nan, "Contraste": 0.0, "Entropia": 0.0}
+
+    if lut is not None:
+        lut = np.asarray(lut).ravel()
+        # Cada nivel i del original se convierte en lut[i]: el histograma mejorado
+        # acumula las cuentas en los niveles de destino
+        hist_mejorado = np.bincount(lut, weights=hist_original, minlength=256)
+        mse = _mse_desde_lut(hist_original, lut, total)
+    elif hist_mejorado is not None:
+        hist_mejorado = np.asarray(hist_mejorado, dtype=np.float64).ravel()
+        mse = None
+    else:
+        raise ValueError("Se necesita la LUT o el histograma de la imagen mejorada.")
+
+    return _metricas_desde_histogramas(hist_original, hist_mejorado, total, mse)
+
+# --- Métricas estructurales: SSIM e índice de preservación de bordes (EPI) ---
+# A diferencia de las anteriores necesitan los píxeles, pero se calculan en pocas pasadas
+# con filtros separables de OpenCV sobre float32: SSIM con una ventana gaussiana de 11x11
+# (sigma 1.5, la de Wang et al.) o una caja de 7x7 (cv2.boxFilter, costo constante por
+# píxel como una imagen integral), y el EPI como la correlación entre las magnitudes del
+# gradiente de Sobel de la original y de la mejorada (1: los bordes se conservan, aunque
+# cambie su contraste). Lo que depende solo de la original (su media y varianza locales y
+# su gradiente) se prepara una vez por imagen en una `ReferenciaEstructural` y se reutiliza
+# para todas las técnicas. Los arrays intermedios salen de una ArenaBuffers, así que en un
+# lote no se reserva memoria nueva por imagen.
+
+C1_SSIM = (0.01 * 255) ** 2
+C2_SSIM = (0.03 * 255) ** 2
+VENTANAS_SSIM = ("gaussiana", "caja")
+METRICAS_ESTRUCTURALES = ("SSIM", "EPI")
+
+ReferenciaEstructural = namedtuple(
+    "ReferenciaEstructural", ["gris", "media", "media_cuadrado", "varianza", "bordes", "norma_bordes", "ventana"])
+
+
+def _suavizar(origen, destino, ventana):
+    if ventana == "gaussiana":
+        return cv2.GaussianBlur(origen, (11, 11), 1.5, dst=destino, borderType=cv2.BORDER_REFLECT)
+    return cv2.boxFilter(origen, -1, (7, 7), dst=destino, borderType=cv2.BORDER_REFLECT)
+
+
+def _bordes_centrados(imagen_gris, destino, trabajo):
+    # Magnitud del gradiente (Sobel 3x3, separable) menos su media; devuelve también su norma
+    cv2.Sobel(imagen_gris, cv2.CV_32F, 1, 0, dst=destino, ksize=3)
+    cv2.Sobel(imagen_gris, cv2.CV_32F, 0, 1, dst=trabajo, ksize=3)
+    cv2.magnitude(destino, trabajo, magnitude=destino)
+    np.subtract(destino, np.float32(cv2.mean(destino)[0]), out=destino)
+    return destino, cv2.norm(destino, cv2.NORM_L2)
+
+
+def preparar_referencia(imagen_original_gris, ventana="gaussiana", arena=None):
+    """
+    Calculamos lo que SSIM y EPI necesitan de la imagen original, una sola vez por imagen.
+
+    Args:
+        imagen_original_gris (numpy.ndarray | ContextoImagen): Imagen original en gris.
+        ventana (str): "gaussiana" (11x11, sigma 1.5) o "caja" (7x7).
+        arena (ArenaBuffers): Buffers a reutilizar; la referencia vale hasta que se prepare
+            otra con la misma arena.
+
+    Returns:
+        ReferenciaEstructural
+    """
+    if ventana not in VENTANAS_SSIM:
+        raise ValueError(f"Ventana desconocida: {ventana}. Opciones: {', '.join(VENTANAS_SSIM)}.")
+    arena = arena if arena is not None else ArenaBuffers()
+    original = _como_gris(imagen_original_gris)
+    forma = original.shape
+    gris = arena.obtener("ssim_original", forma, np.float32)
+    np.copyto(gris, original)
+    media = _suavizar(gris, arena.obtener("ssim_media", forma, np.float32), ventana)
+    media_cuadrado = np.multiply(media, media, out=arena.obtener("ssim_media_cuadrado", forma, np.float32))
+    varianza = np.multiply(gris, gris, out=arena.obtener("ssim_varianza", forma, np.float32))
+    _suavizar(varianza, varianza, ventana)
+    np.subtract(varianza, media_cuadrado, out=varianza)
+    bordes, norma_bordes = _bordes_centrados(original, arena.obtener("epi_original", forma, np.float32),
+                                             arena.obtener("estructura_0", forma, np.float32))
+    return ReferenciaEstructural(gris, media, media_cuadrado, varianza, bordes, norma_bordes, ventana)
+
+
+def calcular_metricas_estructurales(referencia, imagen_mejorada_gris, arena=None):
+    """
+    SSIM y EPI de una imagen mejorada frente a la original ya preparada.
+
+    Args:
+        referencia (ReferenciaEstructural): Resultado de `preparar_referencia`.
+        imagen_mejorada_gris (numpy.ndarray): Imagen mejorada en gris (uint8), del mismo tamaño.
+        arena (ArenaBuffers): Buffers de trabajo (cinco del tamaño de la imagen, en float32).
+
+    Returns:
+        dict: "SSIM" (media del mapa SSIM) y "EPI" (np.nan si alguna de las dos imágenes
+        no tiene bordes).
+    """
+    arena = arena if arena is not None else ArenaBuffers()
+    mejorada = _como_gris(imagen_mejorada_gris)
+    forma = mejorada.shape
+    if forma != referencia.gris.shape:
+        raise ValueError("Las imágenes deben tener las mismas dimensiones para calcular SSIM y EPI.")
+    t0, t1, t2, t3, t4 = (arena.obtener(f"estructura_{indice}", forma, np.float32) for indice in range(5))
+
+    # EPI: correlación de las magnitudes del gradiente centradas, con normas acumuladas en
+    # double: <a, b> = (|a|^2 + |b|^2 - |a - b|^2) / 2
+    bordes, norma = _bordes_centrados(mejorada, t0, t1)
+    if referencia.norma_bordes > 0 and norma > 0:
+        diferencia = cv2.norm(referencia.bordes, bordes, cv2.NORM_L2SQR)
+        epi = (referencia.norma_bordes ** 2 + norma ** 2 - diferencia) / (2 * referencia.norma_bordes * norma)
+    else:
+        epi = np.nan
+
+    # SSIM: medias, varianzas y covarianza locales con la misma ventana que la referencia
+    y = t0
+    np.copyto(y, mejorada)
+    media = _suavizar(y, t1, referencia.ventana)
+    varianza = np.multiply(y, y, out=t2)
+    _suavizar(varianza, varianza, referencia.ventana)
+    media_cuadrado = np.multiply(media, media, out=t3)
+    np.subtract(varianza, media_cuadrado, out=varianza)
+    covarianza = np.multiply(referencia.gris, y, out=t0)
+    _suavizar(covarianza, covarianza, referencia.ventana)
+    medias_cruzadas = np.multiply(referencia.media, media, out=t4)
+    np.subtract(covarianza, medias_cruzadas, out=covarianza)
+    # Numerador: (2 mu_x mu_y + C1)(2 sigma_xy + C2)
+    numerador = covarianza
+    np.multiply(numerador, 2, out=numerador)
+    np.add(numerador, C2_SSIM, out=numerador)
+    np.multiply(medias_cruzadas, 2, out=medias_cruzadas)
+    np.add(medias_cruzadas, C1_SSIM, out=medias_cruzadas)
+    np.multiply(numerador, medias_cruzadas, out=numerador)
+    # Denominador: (mu_x^2 + mu_y^2 + C1)(sigma_x^2 + sigma_y^2 + C2)
+    denominador = varianza
+    np.add(denominador, referencia.varianza, out=denominador)
+    np.add(denominador, C2_SSIM, out=denominador)
+    np.add(media_cuadrado, referencia.media_cuadrado, out=media_cuadrado)
+    np.add(media_cuadrado, C1_SSIM, out=media_cuadrado)
+    np.multiply(denominador, media_cuadrado, out=denominador)
+    np.divide(numerador, denominador, out=numerador)
+    return {"SSIM": cv2.mean(numerador)[0], "EPI": epi}
+
+
+def calcular_ssim(imagen_original_gris, imagen_mejorada_gris, ventana="gaussiana", arena=None):
+    """
+    Calcula el índice de similitud estructural (SSIM) medio entre la imagen original y la
+    mejorada: compara medias, varianzas y covarianza locales. 1 indica estructura idéntica.
+
+    Args:
+        imagen_original_gris (numpy.ndarray | ContextoImagen): Imagen original en escala de grises.
+        imagen_mejorada_gris (numpy.ndarray): Imagen mejorada en escala de grises.
+        ventana (str): "gaussiana" (11x11, sigma 1.5) o "caja" (7x7).
+
+    Returns:
+        float: El valor de SSIM.
+    """
+    referencia = preparar_referencia(imagen_original_gris, ventana, arena)
+    return calcular_metricas_estructurales(referencia, imagen_mejorada_gris, arena)["SSIM"]
+
+
+def calcular_epi(imagen_original_gris, imagen_mejorada_gris, arena=None):
+    """
+    Calcula el índice de preservación de bordes (EPI): la correlación entre la magnitud del
+    gradiente de la imagen original y la de la mejorada. 1 indica que los bordes están en
+    los mismos lugares y con las mismas proporciones; no penaliza un aumento uniforme del contraste.
+
+    Args:
+        imagen_original_gris (numpy.ndarray | ContextoImagen): Imagen original en escala de grises.
+        imagen_mejorada_gris (numpy.ndarray): Imagen mejorada en escala de grises.
+
+    Returns:
+        float: El valor de EPI (np.nan si alguna imagen no tiene bordes).
+    """
+    referencia = preparar_referencia(imagen_original_gris, arena=arena)
+    return calcular_metricas_estructurales(referencia, imagen_mejorada_gris, arena)["EPI"]
+
+
+def calcular_estructurales_lote(pila, mejoradas, ventana="gaussiana", arena=None):
+    """
+    Versión por lotes: SSIM y EPI de N imágenes del mismo tamaño para varias técnicas.
+    La referencia de cada original se prepara una vez y sirve para todas las técnicas.
+
+    Args:
+        pila (numpy.ndarray): Imágenes originales en gris (N, H, W).
+        mejoradas (dict): técnica -> LUT por imagen (N, 256) o imágenes mejoradas (N, H, W).
+            Las LUT se aplican de a una imagen en un buffer de la arena.
+        ventana (str): Ventana de SSIM.
+        arena (ArenaBuffers): Buffers a reutilizar entre imágenes y entre llamadas.
+
+    Returns:
+        dict: técnica -> {"SSIM": array (N,), "EPI": array (N,)}.
+    """
+    arena = arena if arena is not None else ArenaBuffers()
+    n = len(pila)
+    resultados = {tecnica: {"SSIM": np.empty(n), "EPI": np.empty(n)} for tecnica in mejoradas}
+    for indice in range(n):
+        referencia = preparar_referencia(pila[indice], ventana, arena)
+        for tecnica, producto in mejoradas.items():
+            if producto.shape[1:] == (256,):
+                mejorada = cv2.LUT(pila[indice], np.ascontiguousarray(producto[indice]),
+                                   dst=arena.obtener("lut_aplicada", pila.shape[1:]))
+            else:
+                mejorada = producto[indice]
+            for metrica, valor in calcular_metricas_estructurales(referencia, mejorada, arena).items():
+                resultados[tecnica][metrica][indice] = valor
+    return resultados
+
+def calcular_metricas_fusionadas(imagen_original_gris, imagen_mejorada_gris, estructurales=True, referencia=None,
+                                 arena=None):
+    """
+    Calcula AMBE, PSNR, Contraste y Entropía en una sola llamada a partir del par de imágenes,
+    y también SSIM y EPI. Es la alternativa para técnicas espaciales como CLAHE, donde un
+    mismo nivel de gris puede terminar en niveles distintos y no alcanza con una LUT.
+
+    La pasada calcula el histograma de la imagen mejorada y la suma de las diferencias
+    al cuadrado (cv2.norm); el histograma original se toma del contexto si se recibe uno.
+
+    Args:
+        imagen_original_gris (numpy.ndarray | ContextoImagen): Imagen original en escala de grises.
+        imagen_mejorada_gris (numpy.ndarray): Imagen mejorada en escala de grises.
+        estructurales (bool): Calcular también SSIM y EPI.
+        referencia (ReferenciaEstructural): La original ya preparada con `preparar_referencia`,
+            para no repetirla cuando se evalúan varias imágenes mejoradas de la misma original.
+        arena (ArenaBuffers): Buffers de trabajo de SSIM y EPI.
+
+    Returns:
+        dict: Valores de "AMBE", "PSNR", "Contraste" y "Entropia" (y "SSIM" y "EPI").
+    """
+    original = _como_gris(imagen_original_gris)
+    mejorada = _como_gris(imagen_mejorada_gris)
+    if original.shape != mejorada.shape:
+        raise ValueError("Las imágenes deben tener las mismas dimensiones para calcular las métricas.")
+    total = original.size
+    if total == 0:
+        vacias = {"AMBE": 0.0, "PSNR": np.nan, "Contraste": 0.0, "Entropia": 0.0}
+        return {**vacias, **{metrica: np.nan for metrica in METRICAS_ESTRUCTURALES}} if estructurales else vacias
+
+    if isinstance(imagen_original_gris, ContextoImagen):
+        hist_original = imagen_original_gris.hist.astype(np.float64)
+    else:
+        hist_original = cv2.calcHist([original], [0], None, [256], [0, 256]).ravel().astype(np.float64)
+    hist_mejorado = cv2.calcHist([mejorada], [0], None, [256], [0, 256]).ravel().astype(np.float64)
+    # Con uint8 la suma de cuadrados es entera y cv2.norm la devuelve exacta
+    mse = cv2.norm(original, mejorada, cv2.NORM_L2SQR) / total
+    metricas = _metricas_desde_histogramas(hist_original, hist_mejorado, total, mse)
+    if estructurales:
+        arena = arena if arena is not None else ArenaBuffers()
+        referencia = referencia if referencia is not None else preparar_referencia(original, arena=arena)
+        metricas.update(calcular_metricas_estructurales(referencia, mejorada, arena))
+    return metricas
+
+def calcular_metricas_lote(hists_originales, luts):
+    """
+    Versión por lotes de `calcular_metricas_desde_histograma`: evalúa N imágenes a la vez
+    a partir de sus histogramas y sus LUT, sin bucles de Python por imagen.
+    Los resultados coinciden exactamente con los del cálculo imagen por imagen.
+
+    Args:
+        hists_originales (numpy.ndarray): Histogramas originales, forma (N, 256).
+        luts (numpy.ndarray): LUT aplicada a cada imagen, forma (N, 256).
+
+    Returns:
+        dict: "AMBE", "PSNR", "Contraste" y "Entropia", cada uno un array de forma (N,).
+    """
+    hists_originales = np.asarray(hists_originales, dtype=np.float64).reshape(-1, 256)
+    luts = np.asarray(luts).reshape(-1, 256)
+    n = len(hists_originales)
+    total = hists_originales.sum(axis=1)
+
+    # Histogramas mejorados de todas las imágenes con un solo bincount: cada fila
+    # se desplaza 256 posiciones para que sus niveles no se mezclen con los de otra
+    desplazamientos = (np.arange(n) * 256)[:, None]
+    hists_mejorados = np.bincount((luts + desplazamientos).ravel(), weights=hists_originales.ravel(),
+                                  minlength=n * 256).reshape(n, 256)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mse = _mse_desde_lut(hists_originales, luts, total)
+        metricas = _metricas_desde_histogramas(hists_originales, hists_mejorados, total, mse)
+
+    # Las imágenes vacías reciben los mismos valores que en el cálculo individual
+    vacias = total == 0
+    if np.any(vacias):
+        for metrica, valor in (("AMBE", 0.0), ("PSNR", np.nan), ("Contraste", 0.0), ("Entropia", 0.0)):
+            metricas[metrica] = np.where(vacias, valor, metricas[metrica])
+    return metricas
+
 def mostrar_histograma(imagen_gris, titulo="Histograma"):
     """
     Muestra el histograma de una imagen en escala de grises.
 
     Args:
-        imagen_gris (numpy.ndarray): Imagen en escala de grises.
+        imagen_gris (numpy.ndarray | ContextoImagen): Imagen en escala de grises, su
+            contexto, o directamente su histograma de 256 niveles.
         titulo (str): Título del gráfico del histograma.
     """
+    # matplotlib y los reportes (pandas) se importan solo al graficar: las métricas se
+    # usan en los workers y en el procesamiento por lotes, donde no se dibuja nada
+    import matplotlib.pyplot as plt
+    from reportes import dibujar_histograma
+
+    hist = imagen_gris.hist if isinstance(imagen_gris, ContextoImagen) else histograma_de(imagen_gris)
     plt.figure(figsize=(6, 4))
-    plt.hist(imagen_gris.flatten(), bins=256, range=[0, 256], color='gray', alpha=0.7)
-    plt.title(titulo)
-    plt.xlabel("Nivel de Píxel")
+    dibujar_histograma(plt.gca(), hist, titulo)
     plt.ylabel("Frecuencia")
-    plt.grid(True, linestyle='--', alpha=0.6)
     plt.show()
 
 # Ejemplo de uso (opcional, para probar las funciones de métrica directamente)
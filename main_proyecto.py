@@ -1,228 +1,530 @@
 import cv2
 import os
+import argparse
+import logging
 import matplotlib.pyplot as plt
-import pandas as pd 
-import numpy as np 
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
 
-from funciones_mejora import aplicar_ecualizacion_histograma, aplicar_clahe, aplicar_dsihe, aplicar_bbhe
-from funciones_metrica import calcular_ambe, calcular_psnr, calcular_contraste, calcular_entropia, mostrar_histograma
+from almacen_resultados import FILAS_POR_FRAGMENTO, FORMATOS, SEGUNDOS_POR_FRAGMENTO, AlmacenResultados
+from arena_buffers import arena_del_proceso
+from cache_resultados import CacheResultados, hash_contenido
+from cargador_imagenes import HILOS, CargadorImagenes, decodificar_imagen, informar_errores, modo_lectura
+from contexto_imagen import ContextoImagen, histograma_de
+from manifiesto_dataset import actualizar_manifiesto
+from particiones import asignar_particion, leer_particion, registrar_particion
+import perfilado
+from perfilado import etapa
+from reportes import GeneradorReportes, COLORES, crear_vista, dibujar_histograma, histograma_producto
+from procesamiento_tecnicas import (METRICAS, TECNICAS, aplicar_tecnicas, apilar_en_gris, calcular_filas,
+                                    calcular_metricas_tecnicas, calcular_planes, parametros_tecnica, procesar_pila)
 
-if __name__ == "__main__":
-    print("--- Ejecutando Ejercicios de Procesamiento de Imágenes ---")
+# --- Configuramos la ruta de la base de datos ---
+RUTA_BASE_DATOS = r'C:\Users\tanya\OneDrive\Escritorio\Procesamiento de imagenes\Trabajo Practico 1\bsds_dataset\BSDS300\images\train'
+
+EXTENSIONES_VALIDAS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+
+def listar_imagenes(ruta_base):
+    """
+    Obtenemos la lista completa de imágenes en la base de datos y la ordenamos.
+    """
+    todos_los_archivos = [f for f in os.listdir(ruta_base) if f.lower().endswith(EXTENSIONES_VALIDAS)]
+    return sorted(todos_los_archivos, key=lambda x: int(os.path.splitext(x)[0]))
+
+
+_CACHES = {}
+
+
+def _obtener_cache(directorio_cache):
+    # Una instancia de la caché por proceso y carpeta
+    if directorio_cache not in _CACHES:
+        _CACHES[directorio_cache] = CacheResultados(directorio_cache)
+    return _CACHES[directorio_cache]
+
+
+def procesar_bloque(rutas, parametros_clahe=None, directorio_cache=None, lectura=None, hilos_lectura=HILOS,
+                    reporte=False, estructurales=True):
+    """
+    Tarea de un worker: carga un bloque de imágenes, las agrupa por tamaño y procesa
+    cada grupo como una pila. No muestra gráficos ni pide datos al usuario, por lo que
+    puede ejecutarse en otro proceso. Las imágenes se leen y decodifican por adelantado
+    con un pool de hilos.
+
+    Si se indica una caché, las técnicas ya calculadas para el mismo contenido, parámetros
+    y versión del código se toman de ella; una imagen con todo en caché ni se decodifica.
+
+    Las pilas en gris, los índices del histograma y las imágenes de CLAHE se escriben en
+    los buffers de la arena del proceso, que se reutilizan de un bloque al siguiente.
+
+    Args:
+        lectura (dict): Argumentos de `modo_lectura` (`gris`, `reduccion`).
+        hilos_lectura (int): Hilos de lectura y decodificación.
+        reporte (bool): Preparar también la vista (histogramas y miniaturas) de cada
+            imagen calculada, para el reporte.
+        estructurales (bool): Calcular SSIM y EPI.
+
+    Returns:
+        list: Para cada ruta (en el mismo orden), un par (filas de métricas o, si la imagen
+        no se pudo cargar, el motivo (str); vista para el reporte o None).
+    """
+    parametros_clahe = parametros_clahe or {}
+    lectura = lectura or {}
+    modo = modo_lectura(**lectura)
+    cache = _obtener_cache(directorio_cache) if directorio_cache else None
+    tecnicas_todas = ("Original",) + TECNICAS
+    resultados = [None] * len(rutas)
+    vistas = [None] * len(rutas)
+    guardadas = [{} for _ in rutas]
+    claves = [{} for _ in rutas]
+    imagenes = {}
+    por_decodificar = {}
+    # Con caché solo se leen los bytes: se decodifican después, y solo si falta algo
+    cargador = CargadorImagenes(rutas, hilos=hilos_lectura, modo=modo,
+                                decodificar=cache is None, conservar_contenido=cache is not None)
+    for indice, cargada in enumerate(cargador):
+        if cargada.error is not None:
+            resultados[indice] = cargada.error
+        elif cache is None:
+            imagenes[indice] = cargada.imagen
+        else:
+            with etapa("cache_lectura", os.path.basename(cargada.ruta)):
+                hash_imagen = hash_contenido(cargada.contenido)
+                for tecnica in tecnicas_todas:
+                    parametros = parametros_tecnica(tecnica, parametros_clahe, lectura, estructurales)
+                    claves[indice][tecnica] = cache.clave(hash_imagen, tecnica, parametros)
+                    entrada = cache.obtener(claves[indice][tecnica])
+                    if entrada is not None:
+                        guardadas[indice][tecnica] = entrada["metricas"]
+            if len(guardadas[indice]) == len(tecnicas_todas):
+                resultados[indice] = calcular_filas(os.path.basename(cargada.ruta),
+                                                    {tecnica: guardadas[indice][tecnica] for tecnica in tecnicas_todas})
+            else:
+                por_decodificar[indice] = cargada.contenido
+
+    if por_decodificar:
+        with ThreadPoolExecutor(max_workers=max(1, hilos_lectura)) as ejecutor:
+            decodificadas = ejecutor.map(decodificar_imagen, por_decodificar.values(), repeat(modo),
+                                         (os.path.basename(rutas[indice]) for indice in por_decodificar))
+            for indice, imagen in zip(por_decodificar, decodificadas):
+                if imagen is None:
+                    resultados[indice] = "archivo dañado o en un formato no soportado"
+                else:
+                    imagenes[indice] = imagen
+
+    grupos = {}
+    for indice, imagen in imagenes.items():
+        grupos.setdefault(imagen.shape[:2], []).append(indice)
+
+    arena = arena_del_proceso()
+    for forma, indices in grupos.items():
+        # Cada imagen se convierte a gris directamente en su lugar de la pila
+        nombres = [os.path.basename(rutas[indice]) for indice in indices]
+        pila = apilar_en_gris((imagenes.pop(indice) for indice in indices),
+                              arena.obtener("pila", (len(indices),) + forma), nombres)
+        # Solo se calculan las técnicas que le faltan a alguna imagen del grupo
+        faltantes = tuple(tecnica for tecnica in tecnicas_todas
+                          if any(tecnica not in guardadas[indice] for indice in indices))
+        resultados_pila = procesar_pila(pila, parametros_clahe, faltantes, nombres, arena, estructurales)
+        for posicion, (indice, (metricas, productos)) in enumerate(zip(indices, resultados_pila)):
+            if cache is not None:
+                with etapa("cache_escritura", os.path.basename(rutas[indice])):
+                    for tecnica, valores in metricas.items():
+                        producto = productos[tecnica]
+                        es_lut = producto is not None and producto.shape == (256,)
+                        cache.guardar(claves[indice][tecnica], valores,
+                                      lut=producto if es_lut else None,
+                                      imagen=producto if producto is not None and not es_lut else None)
+            if reporte and len(productos) == len(tecnicas_todas):
+                with etapa("vista_reporte", os.path.basename(rutas[indice])):
+                    vistas[indice] = crear_vista(pila[posicion], productos)
+            metricas = {**guardadas[indice], **metricas}
+            resultados[indice] = calcular_filas(os.path.basename(rutas[indice]),
+                                                {tecnica: metricas[tecnica] for tecnica in tecnicas_todas})
+    return list(zip(resultados, vistas))
+
+
+def _inicializar_worker(perfilar=False, memoria=False, nivel_log=logging.WARNING):
+    # Cada proceso usa un solo hilo de OpenCV para que el paralelismo lo den los procesos
+    # y no haya sobre-suscripción de núcleos.
+    cv2.setNumThreads(1)
+    logging.basicConfig(level=nivel_log)
+    if perfilar:
+        perfilado.activar(memoria)
 
-    # --- Configuramos la ruta de la base de datos ---
-    RUTA_BASE_DATOS = r'C:\Users\tanya\OneDrive\Escritorio\Procesamiento de imagenes\Trabajo Practico 1\bsds_dataset\BSDS300\images\train'
-    
-    # Obtenemos la lista completa de imágenes en la base de datos y la ordenamos
-    todos_los_archivos = [f for f in os.listdir(RUTA_BASE_DATOS) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
-    todos_los_archivos = sorted(todos_los_archivos, key=lambda x: int(os.path.splitext(x)[0]))
-    
-    # --- Solicitamos al usuario el número de imágenes a analizar ---
+
+def procesar_lote(ruta_base, nombres_imagenes, workers=None, tamano_bloque=16,
+                  parametros_clahe=None, directorio_cache=None, lectura=None, hilos_lectura=HILOS,
+                  generador_reportes=None, almacen=None, estructurales=True):
+    """
+    Procesamos un conjunto de imágenes en paralelo con un pool de procesos, sin interacción.
+    Cada worker recibe bloques de `tamano_bloque` imágenes y procesa juntas las del mismo
+    tamaño. El orden de las filas devueltas es el mismo que el de `nombres_imagenes`.
+
+    Args:
+        ruta_base (str): Carpeta donde se encuentran las imágenes.
+        nombres_imagenes (list): Nombres de archivo a procesar.
+        workers (int): Cantidad de procesos. Si es None se usan todos los núcleos.
+        tamano_bloque (int): Cantidad de imágenes por tarea.
+        parametros_clahe (dict): Argumentos de CLAHE (`clip_limit`, `tile_grid_size`).
+        directorio_cache (str): Carpeta de la caché de resultados. Si es None no se usa caché.
+        lectura (dict): Argumentos de `modo_lectura` (`gris`, `reduccion`).
+        hilos_lectura (int): Hilos de lectura y decodificación de cada worker.
+        generador_reportes (GeneradorReportes): Si se indica, cada imagen se agrega al
+            reporte; las páginas se dibujan en sus propios procesos.
+        almacen (AlmacenResultados): Si se indica, las filas se guardan en disco a medida
+            que llegan (y no se devuelven), y se saltean las imágenes que ya estaban
+            guardadas en una ejecución anterior.
+        estructurales (bool): Calcular SSIM y EPI (con False quedan en np.nan).
+
+    Returns:
+        list: Filas de métricas (`resultados_globales`); vacía si se usa un almacén.
+    """
+    if almacen is not None:
+        ya_guardadas = almacen.reanudar(nombres_imagenes)
+        if ya_guardadas:
+            print(f"Se retoma desde el punto de control: {ya_guardadas} imágenes ya estaban guardadas.")
+        nombres_imagenes = nombres_imagenes[ya_guardadas:]
+    rutas = [os.path.join(ruta_base, nombre) for nombre in nombres_imagenes]
+    bloques = [rutas[inicio:inicio + tamano_bloque] for inicio in range(0, len(rutas), tamano_bloque)]
+    workers = workers or os.cpu_count() or 1
+    resultados_globales = []
+    tarea = partial(procesar_bloque, parametros_clahe=parametros_clahe, directorio_cache=directorio_cache,
+                    lectura=lectura, hilos_lectura=hilos_lectura, reporte=generador_reportes is not None,
+                    estructurales=estructurales)
+    perfilar = perfilado.activo()
+    if perfilar:
+        # Cada bloque devuelve también los eventos de perfilado que generó en su worker
+        tarea = partial(perfilado.ejecutar_perfilado, tarea)
+
+    if workers == 1:
+        resultados = map(tarea, bloques)
+        ejecutor = None
+    else:
+        ejecutor = ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker,
+                                       initargs=(perfilar, perfilado.midiendo_memoria(), logging.getLogger().level))
+        resultados = ejecutor.map(tarea, bloques)
+
+    def _resultados_bloques():
+        for resultado_bloque in resultados:
+            if perfilar:
+                resultado_bloque, eventos = resultado_bloque
+                perfilado.agregar_eventos(eventos)
+            yield from resultado_bloque
+
+    try:
+        resultados_por_imagen = _resultados_bloques()
+        for nombre_imagen, (filas, vista) in zip(nombres_imagenes, resultados_por_imagen):
+            if isinstance(filas, str):
+                print(f"Error: No se pudo cargar {nombre_imagen} ({filas}). Saltando...")
+                if almacen is not None:
+                    almacen.agregar(nombre_imagen, [])
+                continue
+            if generador_reportes is not None:
+                generador_reportes.agregar(nombre_imagen, filas, vista)
+            if almacen is not None:
+                almacen.agregar(nombre_imagen, filas)
+            else:
+                resultados_globales.extend(filas)
+    finally:
+        if almacen is not None:
+            # Guardamos las imágenes completas aunque la ejecución se corte, para retomar desde ahí
+            almacen.guardar()
+        if ejecutor is not None:
+            ejecutor.shutdown(cancel_futures=True)
+
+    return resultados_globales
+
+
+# --- Mostramos una comparación visual de imágenes y sus histogramas ---
+def mostrar_comparacion(original, he, clahe, dsihe, bbhe):
+    plt.figure(figsize=(24, 6))
+
+    plt.subplot(1, 5, 1)
+    plt.imshow(cv2.cvtColor(original, cv2.COLOR_BGR2RGB))
+    plt.title('Original')
+    plt.axis('off')
+
+    plt.subplot(1, 5, 2)
+    plt.imshow(he, cmap='gray')
+    plt.title('Ecualizacion Histograma (HE)')
+    plt.axis('off')
+
+    plt.subplot(1, 5, 3)
+    plt.imshow(clahe, cmap='gray')
+    plt.title('CLAHE')
+    plt.axis('off')
+
+    plt.subplot(1, 5, 4)
+    plt.imshow(dsihe, cmap='gray')
+    plt.title('DSIHE')
+    plt.axis('off')
+
+    plt.subplot(1, 5, 5)
+    plt.imshow(bbhe, cmap='gray')
+    plt.title('BBHE')
+    plt.axis('off')
+
+    plt.tight_layout()
+    plt.show()
+
+def mostrar_histogramas_comparativos(original_gris, he_gris, clahe_gris, dsihe_gris, bbhe_gris, nombre_img):
+    # Cada argumento puede ser la imagen en gris o directamente su histograma de 256 niveles
+    plt.figure(figsize=(24, 5))
+
+    for columna, (tecnica, imagen_o_hist) in enumerate(zip(("Original",) + TECNICAS, (original_gris, he_gris, clahe_gris, dsihe_gris, bbhe_gris))):
+        dibujar_histograma(plt.subplot(1, 5, columna + 1), histograma_de(imagen_o_hist),
+                           f'Hist. {tecnica} ({nombre_img})', COLORES[tecnica])
+        if columna == 0:
+            plt.ylabel("Frecuencia")
+
+    plt.tight_layout()
+    plt.show()
+
+
+def procesar_interactivo(ruta_base, nombres_imagenes, lectura=None, hilos_lectura=HILOS, generador_reportes=None,
+                         estructurales=True):
+    """
+    Modo original: procesa una imagen por vez, imprime sus métricas y muestra los gráficos.
+    Mientras se muestran los gráficos de una imagen, las siguientes se cargan por adelantado.
+    Con un generador de reportes, los gráficos se guardan en archivos en segundo plano en
+    lugar de abrir ventanas.
+    """
+    resultados_globales = []
+    cargador = CargadorImagenes([os.path.join(ruta_base, nombre) for nombre in nombres_imagenes],
+                                hilos=hilos_lectura, modo=modo_lectura(**(lectura or {})))
+
+    for nombre_imagen, cargada in zip(nombres_imagenes, cargador):
+        imagen_original_bgr = cargada.imagen
+
+        if imagen_original_bgr is None:
+            print(f"Error: No se pudo cargar {nombre_imagen} ({cargada.error}). Saltando...")
+            continue
+
+        print(f"\nProcesando imagen: {nombre_imagen}")
+        contexto = ContextoImagen(imagen_original_bgr)
+        with etapa("conversion_gris", nombre_imagen):
+            contexto.gris
+
+        # --- Aplicar las cuatro técnicas de Mejora y calculamos las Métricas ---
+        with etapa("planes", nombre_imagen):
+            planes = calcular_planes(contexto)
+        with etapa("aplicar_tecnicas", nombre_imagen):
+            imagenes_mejoradas = aplicar_tecnicas(contexto, planes)
+        with etapa("metricas", nombre_imagen):
+            metricas = calcular_metricas_tecnicas(contexto, planes, imagenes_mejoradas, estructurales)
+        filas = calcular_filas(nombre_imagen, metricas)
+
+        print("\nMétricas:")
+        for fila in filas:
+            print(f"{fila['Técnica']}: { {metrica: fila[metrica] for metrica in METRICAS} }")
+
+        # Los histogramas de las técnicas con LUT salen del histograma original, sin recorrer píxeles
+        productos = {"Original": None, **{tecnica: planes.get(tecnica, imagenes_mejoradas[tecnica])
+                                          for tecnica in TECNICAS}}
+        if generador_reportes is not None:
+            with etapa("vista_reporte", nombre_imagen):
+                vista = crear_vista(contexto.gris, productos, ancho_miniatura=None)
+            vista["miniaturas"]["Original"] = imagen_original_bgr
+            generador_reportes.agregar(nombre_imagen, filas, vista)
+        else:
+            hist_original = contexto.hist.astype(np.float64)
+            if imagen_original_bgr.ndim == 2:
+                imagen_original_bgr = cv2.cvtColor(imagen_original_bgr, cv2.COLOR_GRAY2BGR)
+            mostrar_comparacion(imagen_original_bgr, *imagenes_mejoradas.values())
+            mostrar_histogramas_comparativos(*(histograma_producto(hist_original, producto)
+                                               for producto in productos.values()), nombre_imagen)
+
+        # Guardamos los resultados en la lista para generar un cuadro comparativo
+        resultados_globales.extend(filas)
+
+    informar_errores(cargador.errores)
+    return resultados_globales
+
+
+def solicitar_cantidad(total):
+    """
+    Solicitamos al usuario el número de imágenes a analizar.
+    """
     num_imagenes_a_analizar = None
     while num_imagenes_a_analizar is None:
         try:
-            user_input = input(f"\n¿Cuántas imágenes desea analizar? (Máximo {len(todos_los_archivos)}): ")
+            user_input = input(f"\n¿Cuántas imágenes desea analizar? (Máximo {total}): ")
             if user_input.lower() == 'todas':
-                num_imagenes_a_analizar = len(todos_los_archivos)
+                num_imagenes_a_analizar = total
             else:
                 num_imagenes_a_analizar = int(user_input)
-                if not (0 < num_imagenes_a_analizar <= len(todos_los_archivos)):
-                    print(f"Por favor, ingrese un número entre 1 y {len(todos_los_archivos)} o 'todas'.")
+                if not (0 < num_imagenes_a_analizar <= total):
+                    print(f"Por favor, ingrese un número entre 1 y {total} o 'todas'.")
                     num_imagenes_a_analizar = None
         except ValueError:
             print("Entrada inválida. Por favor, ingrese un número entero o 'todas'.")
             num_imagenes_a_analizar = None
+    return num_imagenes_a_analizar
 
-    # Filtramos la lista de imágenes según la entrada del usuario
-    IMAGENES_A_PROCESAR = todos_los_archivos[:num_imagenes_a_analizar]
-    print(f"Se analizarán {len(IMAGENES_A_PROCESAR)} imágenes.")
 
-    # Listamos para almacenar los resultados de todas las imágenes
-    resultados_globales = []
+def _cantidad(valor):
+    if valor.lower() == 'todas':
+        return valor.lower()
+    try:
+        cantidad = int(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError("debe ser un número entero o 'todas'")
+    if cantidad <= 0:
+        raise argparse.ArgumentTypeError("debe ser mayor que cero")
+    return cantidad
 
-    for nombre_imagen in IMAGENES_A_PROCESAR:
-        ruta_completa = os.path.join(RUTA_BASE_DATOS, nombre_imagen)
-        imagen_original_bgr = cv2.imread(ruta_completa)
 
-        if imagen_original_bgr is None:
-            print(f"Error: No se pudo cargar {nombre_imagen}. Saltando...")
-            continue
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Análisis comparativo de técnicas de mejora de imagen (HE, CLAHE, DSIHE, BBHE).")
+    parser.add_argument("--ruta", default=RUTA_BASE_DATOS,
+                        help="Carpeta con las imágenes de la base de datos.")
+    parser.add_argument("--cantidad", type=_cantidad, default=None,
+                        help="Número de imágenes a analizar o 'todas'. Si se indica, se ejecuta en modo lote sin interacción.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Cantidad de procesos en modo lote (por defecto, todos los núcleos).")
+    parser.add_argument("--bloque", type=int, default=16,
+                        help="Imágenes por tarea en modo lote; las del mismo tamaño se procesan juntas.")
+    parser.add_argument("--clip-limit", type=float, default=2.0,
+                        help="Límite de contraste de CLAHE.")
+    parser.add_argument("--grilla", type=int, nargs=2, default=(8, 8), metavar=("X", "Y"),
+                        help="Grilla de mosaicos de CLAHE.")
+    parser.add_argument("--cache", default=None,
+                        help="Carpeta de la caché de resultados; en una nueva ejecución solo se recalcula lo que cambió.")
+    parser.add_argument("--manifiesto", default=None,
+                        help="Archivo .npz con las estadísticas de cada imagen; se crea o se actualiza (solo se "
+                             "leen los archivos que cambiaron) y las imágenes se eligen con --filtro y --orden.")
+    parser.add_argument("--filtro", default=None,
+                        help="Condición sobre el manifiesto para elegir las imágenes, p. ej. \"media < 80 and desvio < 40\" "
+                             "(columnas: tamano, alto, ancho, media, desvio, entropia).")
+    parser.add_argument("--orden", default=None,
+                        help="Columna del manifiesto por la que ordenar las imágenes.")
+    parser.add_argument("--descendente", action="store_true",
+                        help="Con --orden, ordenar de mayor a menor.")
+    parser.add_argument("--hilos-lectura", type=int, default=HILOS,
+                        help="Hilos que leen y decodifican las imágenes por adelantado.")
+    parser.add_argument("--lectura-gris", action="store_true",
+                        help="Decodificar directamente en gris (más rápido; en JPEG el gris puede diferir en un nivel).")
+    parser.add_argument("--reduccion", type=int, choices=(1, 2, 4, 8), default=1,
+                        help="Decodificar a 1/2, 1/4 o 1/8 de la resolución (vista previa).")
+    parser.add_argument("--sin-estructurales", action="store_true",
+                        help="No calcular SSIM ni EPI (las únicas métricas que recorren los píxeles de las técnicas con LUT).")
+    parser.add_argument("--reporte", default=None,
+                        help="Carpeta donde guardar el reporte (PNG por imagen e index.html) en lugar de abrir ventanas.")
+    parser.add_argument("--workers-reporte", type=int, default=1,
+                        help="Procesos que dibujan el reporte en segundo plano.")
+    parser.add_argument("--resultados", default=None,
+                        help="Carpeta donde guardar las filas de métricas a medida que se calculan (modo lote). "
+                             "Si ya tiene resultados de una ejecución cortada, se retoma desde ahí.")
+    parser.add_argument("--particion", "--shard", type=leer_particion, default=None, metavar="i/N",
+                        help="Procesar solo la partición i de N (modo lote, con --resultados). Cada imagen se "
+                             "asigna por el hash de su contenido con --manifiesto; sin él, por el hash del "
+                             "nombre del archivo (renombrar una imagen la cambia de partición). Las carpetas "
+                             "se juntan con: python particiones.py combinar <salida> <carpetas>.")
+    parser.add_argument("--formato", choices=FORMATOS, default="csv",
+                        help="Formato de los fragmentos de --resultados.")
+    parser.add_argument("--filas-fragmento", type=int, default=FILAS_POR_FRAGMENTO,
+                        help="Filas por fragmento de --resultados.")
+    parser.add_argument("--segundos-fragmento", type=float, default=SEGUNDOS_POR_FRAGMENTO,
+                        help="Segundos máximos entre fragmentos de --resultados: es lo que se puede perder "
+                             "si la ejecución se corta de golpe.")
+    parser.add_argument("--perfil", default=None,
+                        help="Archivo JSON donde guardar la traza de tiempos por etapa (formato de Chrome); "
+                             "además se muestra un resumen.")
+    parser.add_argument("--perfil-memoria", action="store_true",
+                        help="Medir también los bytes asignados por etapa del hilo principal "
+                             "(más lento; aproximados mientras hay hilos de lectura).")
+    parser.add_argument("--log-nivel", default="WARNING", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="Nivel de los mensajes de las técnicas (DEBUG muestra uno por llamada).")
+    return parser
 
-        print(f"\nProcesando imagen: {nombre_imagen}")
-        imagen_original_gris = cv2.cvtColor(imagen_original_bgr, cv2.COLOR_BGR2GRAY)
-
-        # --- Aplicar las cuatro técnicas de Mejora ---
-        imagen_he = aplicar_ecualizacion_histograma(imagen_original_bgr)
-        imagen_clahe = aplicar_clahe(imagen_original_bgr)
-        imagen_dsihe = aplicar_dsihe(imagen_original_bgr)
-        imagen_bbhe = aplicar_bbhe(imagen_original_bgr)
-
-        # --- Calculamos las Métricas para cada técnica ---
-
-        metricas_original = {
-            "AMBE": np.nan,
-            "PSNR": np.nan,
-            "Contraste": calcular_contraste(imagen_original_gris),
-            "Entropia": calcular_entropia(imagen_original_gris)
-        }
-
-        metricas_he = {
-            "AMBE": calcular_ambe(imagen_original_gris, imagen_he),
-            "PSNR": calcular_psnr(imagen_original_gris, imagen_he),
-            "Contraste": calcular_contraste(imagen_he),
-            "Entropia": calcular_entropia(imagen_he)
-        }
-
-        metricas_clahe = {
-            "AMBE": calcular_ambe(imagen_original_gris, imagen_clahe),
-            "PSNR": calcular_psnr(imagen_original_gris, imagen_clahe),
-            "Contraste": calcular_contraste(imagen_clahe),
-            "Entropia": calcular_entropia(imagen_clahe)
-        }
-
-        metricas_dsihe = {
-            "AMBE": calcular_ambe(imagen_original_gris, imagen_dsihe),
-            "PSNR": calcular_psnr(imagen_original_gris, imagen_dsihe),
-            "Contraste": calcular_contraste(imagen_dsihe),
-            "Entropia": calcular_entropia(imagen_dsihe)
-        }
-        
-        metricas_bbhe = {
-            "AMBE": calcular_ambe(imagen_original_gris, imagen_bbhe),
-            "PSNR": calcular_psnr(imagen_original_gris, imagen_bbhe),
-            "Contraste": calcular_contraste(imagen_bbhe),
-            "Entropia": calcular_entropia(imagen_bbhe)
-        }
 
-        print("\nMétricas:")
-        print(f"Original: {metricas_original}")
-        print(f"HE: {metricas_he}")
-        print(f"CLAHE: {metricas_clahe}")
-        print(f"DSIHE: {metricas_dsihe}")
-        print(f"BBHE: {metricas_bbhe}")
-
-        # --- Mostramos una comparación visual de imágenes y sus histogramas ---
-        def mostrar_comparacion(original, he, clahe, dsihe, bbhe):
-            plt.figure(figsize=(24, 6))
-
-            plt.subplot(1, 5, 1)
-            plt.imshow(cv2.cvtColor(original, cv2.COLOR_BGR2RGB))
-            plt.title('Original')
-            plt.axis('off')
-
-            plt.subplot(1, 5, 2)
-            plt.imshow(he, cmap='gray')
-            plt.title('Ecualizacion Histograma (HE)')
-            plt.axis('off')
-
-            plt.subplot(1, 5, 3)
-            plt.imshow(clahe, cmap='gray')
-            plt.title('CLAHE')
-            plt.axis('off')
-            
-            plt.subplot(1, 5, 4)
-            plt.imshow(dsihe, cmap='gray')
-            plt.title('DSIHE')
-            plt.axis('off')
-            
-            plt.subplot(1, 5, 5)
-            plt.imshow(bbhe, cmap='gray')
-            plt.title('BBHE')
-            plt.axis('off')
-
-            plt.tight_layout()
-            plt.show()
-
-        def mostrar_histogramas_comparativos(original_gris, he_gris, clahe_gris, dsihe_gris, bbhe_gris, nombre_img):
-            plt.figure(figsize=(24, 5))
-
-            plt.subplot(1, 5, 1)
-            plt.hist(original_gris.flatten(), bins=256, range=[0, 256], color='blue', alpha=0.7)
-            plt.title(f'Hist. Original ({nombre_img})')
-            plt.xlabel("Nivel de Píxel")
-            plt.ylabel("Frecuencia")
-            plt.grid(True, linestyle='--', alpha=0.6)
-
-            plt.subplot(1, 5, 2)
-            plt.hist(he_gris.flatten(), bins=256, range=[0, 256], color='green', alpha=0.7)
-            plt.title(f'Hist. HE ({nombre_img})')
-            plt.xlabel("Nivel de Píxel")
-            plt.grid(True, linestyle='--', alpha=0.6)
-
-            plt.subplot(1, 5, 3)
-            plt.hist(clahe_gris.flatten(), bins=256, range=[0, 256], color='red', alpha=0.7)
-            plt.title(f'Hist. CLAHE ({nombre_img})')
-            plt.xlabel("Nivel de Píxel")
-            plt.grid(True, linestyle='--', alpha=0.6)
-
-            plt.subplot(1, 5, 4)
-            plt.hist(dsihe_gris.flatten(), bins=256, range=[0, 256], color='purple', alpha=0.7)
-            plt.title(f'Hist. DSIHE ({nombre_img})')
-            plt.xlabel("Nivel de Píxel")
-            plt.grid(True, linestyle='--', alpha=0.6)
-            
-            plt.subplot(1, 5, 5)
-            plt.hist(bbhe_gris.flatten(), bins=256, range=[0, 256], color='orange', alpha=0.7)
-            plt.title(f'Hist. BBHE ({nombre_img})')
-            plt.xlabel("Nivel de Píxel")
-            plt.grid(True, linestyle='--', alpha=0.6)
-
-            plt.tight_layout()
-            plt.show()
-
-        mostrar_comparacion(imagen_original_bgr, imagen_he, imagen_clahe, imagen_dsihe, imagen_bbhe)
-        mostrar_histogramas_comparativos(imagen_original_gris, imagen_he, imagen_clahe, imagen_dsihe, imagen_bbhe, nombre_imagen)
+if __name__ == "__main__":
+    parser = crear_parser()
+    args = parser.parse_args()
+    if (args.filtro or args.orden) and not args.manifiesto:
+        parser.error("--filtro y --orden necesitan --manifiesto")
+    if args.particion and (args.cantidad is None or not args.resultados):
+        parser.error("--particion necesita el modo lote (--cantidad) y --resultados")
+    logging.basicConfig(level=args.log_nivel)
+    if args.perfil:
+        perfilado.activar(args.perfil_memoria)
+    print("--- Ejecutando Ejercicios de Procesamiento de Imágenes ---")
 
-        # Guardamos los resultados en la lista para generar un cuadro comparativo
-        resultados_globales.append({
-            "Imagen": nombre_imagen,
-            "Técnica": "Original",
-            "AMBE": metricas_original["AMBE"],
-            "PSNR": metricas_original["PSNR"],
-            "Contraste": metricas_original["Contraste"],
-            "Entropia": metricas_original["Entropia"]
-        })
-        resultados_globales.append({
-            "Imagen": nombre_imagen,
-            "Técnica": "HE",
-            "AMBE": metricas_he["AMBE"],
-            "PSNR": metricas_he["PSNR"],
-            "Contraste": metricas_he["Contraste"],
-            "Entropia": metricas_he["Entropia"]
-        })
-        resultados_globales.append({
-            "Imagen": nombre_imagen,
-            "Técnica": "CLAHE",
-            "AMBE": metricas_clahe["AMBE"],
-            "PSNR": metricas_clahe["PSNR"],
-            "Contraste": metricas_clahe["Contraste"],
-            "Entropia": metricas_clahe["Entropia"]
-        })
-        resultados_globales.append({
-            "Imagen": nombre_imagen,
-            "Técnica": "DSIHE",
-            "AMBE": metricas_dsihe["AMBE"],
-            "PSNR": metricas_dsihe["PSNR"],
-            "Contraste": metricas_dsihe["Contraste"],
-            "Entropia": metricas_dsihe["Entropia"]
-        })
-        resultados_globales.append({
-            "Imagen": nombre_imagen,
-            "Técnica": "BBHE",
-            "AMBE": metricas_bbhe["AMBE"],
-            "PSNR": metricas_bbhe["PSNR"],
-            "Contraste": metricas_bbhe["Contraste"],
-            "Entropia": metricas_bbhe["Entropia"]
-        })
+    todos_los_archivos = listar_imagenes(args.ruta)
+    if args.manifiesto:
+        manifiesto, resumen = actualizar_manifiesto(args.ruta, todos_los_archivos, args.manifiesto,
+                                                    args.hilos_lectura)
+        print(f"Manifiesto: {resumen['nuevas']} imágenes indexadas, {resumen['sin_cambios'] + resumen['tocadas']} "
+              f"sin cambios, {resumen['quitadas']} quitadas.")
+        todos_los_archivos = manifiesto.seleccionar(args.filtro, args.orden, args.descendente)
+
+    if args.cantidad is None:
+        # Modo interactivo
+        num_imagenes_a_analizar = solicitar_cantidad(len(todos_los_archivos))
+    elif args.cantidad == 'todas':
+        num_imagenes_a_analizar = len(todos_los_archivos)
+    else:
+        num_imagenes_a_analizar = min(args.cantidad, len(todos_los_archivos))
+
+    # Filtramos la lista de imágenes según la entrada del usuario
+    IMAGENES_A_PROCESAR = todos_los_archivos[:num_imagenes_a_analizar]
+    if args.particion:
+        indice_particion, total_particiones = args.particion
+        hashes = list(manifiesto.tabla.loc[IMAGENES_A_PROCESAR, "hash"]) if args.manifiesto else None
+        posiciones, IMAGENES_A_PROCESAR = asignar_particion(IMAGENES_A_PROCESAR, indice_particion,
+                                                            total_particiones, hashes)
+        registrar_particion(args.resultados, indice_particion, total_particiones, IMAGENES_A_PROCESAR, posiciones,
+                            todos_los_archivos[:num_imagenes_a_analizar], por_contenido=bool(args.manifiesto))
+        print(f"Partición {indice_particion}/{total_particiones}: {len(IMAGENES_A_PROCESAR)} de "
+              f"{num_imagenes_a_analizar} imágenes.")
+    print(f"Se analizarán {len(IMAGENES_A_PROCESAR)} imágenes.")
+    lectura = {"gris": args.lectura_gris, "reduccion": args.reduccion}
+    generador_reportes = GeneradorReportes(args.reporte, args.workers_reporte) if args.reporte else None
+
+    if args.cantidad is None:
+        resultados_globales = procesar_interactivo(args.ruta, IMAGENES_A_PROCESAR, lectura, args.hilos_lectura,
+                                                   generador_reportes, not args.sin_estructurales)
+    else:
+        almacen = (AlmacenResultados(args.resultados, args.formato, args.filas_fragmento, args.segundos_fragmento)
+                   if args.resultados else None)
+        resultados_globales = procesar_lote(args.ruta, IMAGENES_A_PROCESAR, args.workers, args.bloque,
+                                            parametros_clahe={"clip_limit": args.clip_limit,
+                                                              "tile_grid_size": tuple(args.grilla)},
+                                            directorio_cache=args.cache, lectura=lectura,
+                                            hilos_lectura=args.hilos_lectura,
+                                            generador_reportes=generador_reportes, almacen=almacen,
+                                            estructurales=not args.sin_estructurales)
+
+    if generador_reportes is not None:
+        print(f"Reporte guardado en {generador_reportes.cerrar()}")
 
     print("\n--- Análisis Completado ---")
 
     # --- Mostramos la tabla comparativa ---
-    if len(IMAGENES_A_PROCESAR) > 0:
+    if args.cantidad is not None and args.resultados:
+        # Las filas quedaron en disco; se muestran los agregados por técnica
+        print(f"\n--- Resumen por Técnica ({almacen.imagenes} imágenes, filas en {args.resultados}) ---")
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(almacen.agregados.tabla())
+    elif len(resultados_globales) > 0:
         print("\n--- Cuadro Comparativo de Métricas (Detallado por Imagen) ---")
         df = pd.DataFrame(resultados_globales)
-        df_pivot = df.pivot_table(index=['Imagen', 'Técnica'], values=['AMBE', 'PSNR', 'Contraste', 'Entropia'])
+        df_pivot = df.pivot_table(index=['Imagen', 'Técnica'], values=list(METRICAS))
         print(df_pivot)
         print("\n")
     else:
         print("\nNo se analizó ninguna imagen.")
+
+    if args.perfil:
+        eventos = perfilado.desactivar()
+        perfilado.exportar_chrome_trace(eventos, args.perfil)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print("\n--- Perfil por etapa ---")
+            print(perfilado.resumir(eventos))
+            print("\n--- Perfil por etapa y worker ---")
+            print(perfilado.resumir(eventos, por=("etapa", "pid")))
+        print(f"Traza guardada en {args.perfil}")
@@ -0,0 +1,204 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from cache_resultados import hash_contenido
+from cargador_imagenes import HILOS, CargadorImagenes, informar_errores
+from contexto_imagen import ContextoImagen
+from funciones_metrica import calcular_metricas_desde_histograma
+
+# Manifiesto de un conjunto de imágenes. Se indexa una vez: por cada imagen se guarda su
+# tamaño, fecha de modificación, hash del contenido, forma, y la media, el desvío y la
+# entropía del gris junto con su histograma de 256 niveles, todo en un único .npz.
+#
+# Al actualizarlo solo se vuelven a leer los archivos cuyo tamaño o fecha cambiaron, y
+# solo se decodifican los que además cambiaron de contenido (hash distinto). Con el
+# manifiesto se eligen subconjuntos por sus estadísticas (por ejemplo, las imágenes
+# oscuras y de poco contraste) sin decodificar ninguna imagen.
+
+ESCALARES = ("tamano", "mtime_ns", "hash", "alto", "ancho", "media", "desvio", "entropia")
+
+
+def _estadisticas(imagen):
+    # Mismo gris e histograma que usa el pipeline (conversión desde BGR con ContextoImagen)
+    contexto = ContextoImagen(imagen)
+    metricas = calcular_metricas_desde_histograma(contexto, hist_mejorado=contexto.hist)
+    return {
+        "alto": contexto.forma[0],
+        "ancho": contexto.forma[1],
+        "media": float(contexto.media),
+        "desvio": float(metricas["Contraste"]),
+        "entropia": float(metricas["Entropia"]),
+    }, contexto.hist.astype(np.uint32)
+
+
+class Manifiesto:
+    """
+    Estadísticas por imagen de un conjunto.
+
+    Attributes:
+        tabla (pandas.DataFrame): Una fila por imagen (índice: nombre del archivo) con las
+            columnas de ESCALARES, en el orden del conjunto.
+        hists (numpy.ndarray): Histogramas (N, 256) en el mismo orden que `tabla`.
+    """
+
+    def __init__(self, tabla=None, hists=None):
+        if tabla is None:
+            tabla = pd.DataFrame({columna: [] for columna in ESCALARES}, index=pd.Index([], name="nombre"))
+        self.tabla = tabla
+        self.hists = hists if hists is not None else np.zeros((0, 256), dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.tabla)
+
+    @property
+    def nombres(self):
+        return list(self.tabla.index)
+
+    @classmethod
+    def cargar(cls, archivo):
+        """Leemos un manifiesto guardado; si el archivo no existe, devolvemos uno vacío."""
+        if not os.path.exists(archivo):
+            return cls()
+        with np.load(archivo, allow_pickle=False) as datos:
+            tabla = pd.DataFrame({columna: datos[columna] for columna in ESCALARES},
+                                 index=pd.Index(datos["nombre"], name="nombre"))
+            return cls(tabla, datos["hists"])
+
+    def guardar(self, archivo):
+        """Guardamos el manifiesto de forma atómica (temporal + os.replace)."""
+        columnas = {columna: self.tabla[columna].to_numpy() for columna in ESCALARES}
+        columnas["hash"] = columnas["hash"].astype(str)
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(archivo)), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as salida:
+                np.savez_compressed(salida, nombre=np.array(self.nombres, dtype=str), hists=self.hists, **columnas)
+            os.replace(temporal, archivo)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def hist(self, nombre):
+        """Histograma de 256 niveles de una imagen del manifiesto."""
+        return self.hists[self.tabla.index.get_loc(nombre)]
+
+    def seleccionar(self, consulta=None, orden=None, descendente=False, cantidad=None):
+        """
+        Elegimos imágenes por sus estadísticas, sin decodificarlas.
+
+        Args:
+            consulta (str): Condición sobre las columnas, con la sintaxis de
+                DataFrame.query (por ejemplo "media < 80 and desvio < 40").
+            orden (str): Columna por la que ordenar. Sin orden se conserva el del conjunto.
+            descendente (bool): Ordenar de mayor a menor.
+            cantidad (int): Máximo de imágenes a devolver.
+
+        Returns:
+            list: Nombres de las imágenes elegidas.
+        """
+        tabla = self.tabla if consulta is None else self.tabla.query(consulta)
+        if orden is not None:
+            tabla = tabla.sort_values(orden, ascending=not descendente, kind="stable")
+        return list(tabla.index[:cantidad])
+
+
+def actualizar_manifiesto(ruta_base, nombres, archivo=None, hilos=HILOS):
+    """
+    Creamos o actualizamos el manifiesto de `nombres` (archivos de `ruta_base`).
+
+    Las imágenes con el mismo tamaño y fecha que en el manifiesto no se leen. Las demás se
+    leen y se calcula su hash; si coincide con el guardado solo se actualiza la fecha, y
+    si no se decodifican para recalcular sus estadísticas. Las que ya no están en
+    `nombres` se quitan, y las que no se pueden leer quedan fuera (se reintentan la próxima vez).
+
+    Args:
+        ruta_base (str): Carpeta de las imágenes.
+        nombres (list): Archivos a indexar, en el orden que tendrá el manifiesto.
+        archivo (str): Archivo .npz del manifiesto. Si existe se actualiza; si es None no se guarda.
+        hilos (int): Hilos de lectura y decodificación.
+
+    Returns:
+        tuple: (Manifiesto, resumen) con resumen = {"sin_cambios", "tocadas", "nuevas", "quitadas"}.
+    """
+    anterior = Manifiesto.cargar(archivo) if archivo is not None else Manifiesto()
+    # Con diccionarios la comparación cuesta lo mismo que un os.stat por archivo
+    anteriores = dict(zip(anterior.nombres, anterior.tabla.to_dict("records")))
+    posiciones = {nombre: posicion for posicion, nombre in enumerate(anterior.nombres)}
+    filas, hists = {}, {}
+    por_revisar = []
+    for nombre in nombres:
+        try:
+            estado = os.stat(os.path.join(ruta_base, nombre))
+        except OSError:
+            continue
+        fila = anteriores.get(nombre)
+        if fila is not None and fila["tamano"] == estado.st_size and fila["mtime_ns"] == estado.st_mtime_ns:
+            filas[nombre] = fila
+            hists[nombre] = anterior.hists[posiciones[nombre]]
+            continue
+        por_revisar.append((nombre, estado))
+
+    resumen = {"sin_cambios": len(filas), "tocadas": 0, "nuevas": 0,
+               "quitadas": len(set(anterior.nombres) - set(nombres))}
+    # Primero solo se leen los bytes: si el hash no cambió, no hace falta decodificar
+    cargador = CargadorImagenes([os.path.join(ruta_base, nombre) for nombre, _ in por_revisar], hilos,
+                                decodificar=False, conservar_contenido=True)
+    a_decodificar = []
+    for (nombre, estado), cargada in zip(por_revisar, cargador):
+        if cargada.error is not None:
+            continue
+        hash_imagen = hash_contenido(cargada.contenido)
+        fila = {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns, "hash": hash_imagen}
+        if nombre in anteriores and anteriores[nombre]["hash"] == hash_imagen:
+            filas[nombre] = {**anteriores[nombre], **fila}
+            hists[nombre] = anterior.hists[posiciones[nombre]]
+            resumen["tocadas"] += 1
+        else:
+            filas[nombre] = fila
+            a_decodificar.append(nombre)
+
+    cargador_imagenes = CargadorImagenes([os.path.join(ruta_base, nombre) for nombre in a_decodificar], hilos)
+    for nombre, cargada in zip(a_decodificar, cargador_imagenes):
+        if cargada.imagen is None:
+            del filas[nombre]
+            continue
+        estadisticas, hists[nombre] = _estadisticas(cargada.imagen)
+        filas[nombre].update(estadisticas)
+        resumen["nuevas"] += 1
+    informar_errores(cargador.errores + cargador_imagenes.errores)
+
+    orden = [nombre for nombre in nombres if nombre in filas]
+    tabla = pd.DataFrame([filas[nombre] for nombre in orden], columns=list(ESCALARES),
+                         index=pd.Index(orden, name="nombre"))
+    tabla = tabla.astype({"tamano": np.int64, "mtime_ns": np.int64, "hash": str, "alto": np.int64,
+                          "ancho": np.int64, "media": np.float64, "desvio": np.float64, "entropia": np.float64})
+    manifiesto = Manifiesto(tabla, np.array([hists[nombre] for nombre in orden], dtype=np.uint32).reshape(-1, 256))
+    if archivo is not None:
+        manifiesto.guardar(archivo)
+    return manifiesto, resumen
+
+
+if __name__ == "__main__":
+    from main_proyecto import RUTA_BASE_DATOS, listar_imagenes
+
+    parser = argparse.ArgumentParser(description="Crea o actualiza el manifiesto de un conjunto de imágenes.")
+    parser.add_argument("manifiesto", help="Archivo .npz del manifiesto.")
+    parser.add_argument("--ruta", default=RUTA_BASE_DATOS, help="Carpeta con las imágenes.")
+    parser.add_argument("--hilos", type=int, default=HILOS, help="Hilos de lectura y decodificación.")
+    parser.add_argument("--filtro", default=None, help="Condición para elegir imágenes, p. ej. \"media < 80 and desvio < 40\".")
+    parser.add_argument("--orden", default=None, help="Columna por la que ordenar la selección.")
+    parser.add_argument("--descendente", action="store_true", help="Ordenar de mayor a menor.")
+    args = parser.parse_args()
+
+    manifiesto, resumen = actualizar_manifiesto(args.ruta, listar_imagenes(args.ruta), args.manifiesto, args.hilos)
+    print(f"{len(manifiesto)} imágenes en el manifiesto: {resumen['sin_cambios']} sin cambios, "
+          f"{resumen['tocadas']} con fecha nueva, {resumen['nuevas']} nuevas o modificadas, "
+          f"{resumen['quitadas']} quitadas.")
+    if args.filtro or args.orden:
+        elegidas = manifiesto.seleccionar(args.filtro, args.orden, args.descendente)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(manifiesto.tabla.loc[elegidas].drop(columns=["hash", "mtime_ns"]))
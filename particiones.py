@@ -0,0 +1,188 @@
+import argparse
+import hashlib
+import heapq
+import json
+import os
+
+import pandas as pd
+
+from almacen_resultados import FILAS_POR_FRAGMENTO, AlmacenResultados, iterar_fragmentos, leer_estado
+
+# Reparto de un conjunto de imágenes entre varias máquinas (o varios procesos en la misma).
+# Cada imagen va a la partición hash % N, donde el hash es el del contenido si se tiene
+# el manifiesto y, si no, el del nombre del archivo: la asignación no depende de la
+# máquina ni del orden en que se listen los archivos. Cada partición guarda sus filas en
+# su propia carpeta de resultados, junto con particion.json (qué imágenes le tocaron, su
+# posición en la lista completa, la huella de esa lista y cómo se asignaron). Sin el
+# manifiesto la asignación es por nombre: renombrar un archivo lo cambia de partición.
+# `combinar` rechaza particiones de listas, cantidades o asignaciones distintas.
+#
+# `combinar` junta las carpetas (compartidas o copiadas) intercalando las imágenes por su
+# posición original, sin cargar todo en memoria, y escribe una carpeta de resultados con
+# las mismas filas y agregados que una ejecución en una sola máquina:
+#   python particiones.py combinar final resultados_0 resultados_1 resultados_2
+
+ARCHIVO_PARTICION = "particion.json"
+
+
+def leer_particion(valor):
+    """Convertimos "i/N" en (i, N), con 0 <= i < N."""
+    try:
+        indice, total = (int(parte) for parte in valor.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("la partición debe tener la forma i/N, por ejemplo 0/4")
+    if not 0 <= indice < total:
+        raise argparse.ArgumentTypeError("la partición i/N necesita 0 <= i < N")
+    return indice, total
+
+
+def particion_de(nombre, total, hash_imagen=None):
+    """
+    Partición (0..total-1) de una imagen: desde el hash de su contenido (hexadecimal,
+    como el del manifiesto) o, si no se tiene, desde el hash de su nombre.
+    """
+    if hash_imagen is None:
+        hash_imagen = hashlib.sha256(nombre.encode('utf-8')).hexdigest()
+    return int(hash_imagen[:16], 16) % total
+
+
+def asignar_particion(nombres, indice, total, hashes=None):
+    """
+    Imágenes de `nombres` que le tocan a la partición `indice` de `total`.
+
+    Args:
+        nombres (list): Lista completa de imágenes, en el orden de una ejecución única.
+        indice (int): Partición propia.
+        total (int): Cantidad de particiones.
+        hashes (list): Hash del contenido de cada imagen (por ejemplo, del manifiesto).
+
+    Returns:
+        tuple: (posiciones en `nombres`, nombres) de las imágenes de la partición, en orden.
+    """
+    hashes = hashes if hashes is not None else [None] * len(nombres)
+    posiciones = [posicion for posicion, (nombre, hash_imagen) in enumerate(zip(nombres, hashes))
+                  if particion_de(nombre, total, hash_imagen) == indice]
+    return posiciones, [nombres[posicion] for posicion in posiciones]
+
+
+def huella_lista(nombres):
+    """Hash de la lista completa de imágenes, en orden: identifica el reparto."""
+    return hashlib.sha256("\n".join(nombres).encode('utf-8')).hexdigest()
+
+
+def registrar_particion(directorio, indice, total, nombres, posiciones, lista_completa, por_contenido=False):
+    """
+    Guardamos en la carpeta de resultados qué imágenes tiene la partición, junto con lo
+    que identifica al reparto: el largo y la huella de la lista completa, la cantidad de
+    particiones y si se asignó por el hash del contenido o del nombre. Si la carpeta ya
+    tenía una partición (una ejecución cortada que se retoma), debe ser la misma.
+    """
+    particion = {"particion": indice, "total": total, "cantidad": len(lista_completa),
+                 "lista": huella_lista(lista_completa), "asignacion": "contenido" if por_contenido else "nombre",
+                 "imagenes": list(nombres), "posiciones": list(posiciones)}
+    ruta = os.path.join(directorio, ARCHIVO_PARTICION)
+    if os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as archivo:
+            if json.load(archivo) != particion:
+                raise ValueError(f"La carpeta {directorio} ya tiene resultados de otra partición o de otra lista de imágenes.")
+        return
+    os.makedirs(directorio, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(particion, archivo)
+
+
+def _leer_particiones(directorios):
+    particiones = []
+    for directorio in directorios:
+        try:
+            with open(os.path.join(directorio, ARCHIVO_PARTICION), encoding='utf-8') as archivo:
+                particion = json.load(archivo)
+        except FileNotFoundError:
+            raise ValueError(f"{directorio} no es la carpeta de resultados de una partición.")
+        estado = leer_estado(directorio)
+        guardadas = estado["imagenes"] if estado is not None else 0
+        if guardadas != len(particion["imagenes"]):
+            raise ValueError(f"La partición {particion['particion']}/{particion['total']} ({directorio}) está "
+                             f"incompleta: {guardadas} de {len(particion['imagenes'])} imágenes.")
+        particiones.append((directorio, particion, estado))
+
+    repartos = {(particion["total"], particion["cantidad"], particion.get("lista"), particion.get("asignacion"))
+                for _, particion, _ in particiones}
+    if len(repartos) != 1 or None in repartos.pop()[2:]:
+        raise ValueError("Las carpetas son de repartos distintos (otra cantidad de particiones, otra lista de "
+                         "imágenes u otra forma de asignarlas) o no tienen la huella de la lista.")
+    total = particiones[0][1]["total"]
+    indices = sorted(particion["particion"] for _, particion, _ in particiones)
+    if indices != list(range(total)):
+        faltantes = sorted(set(range(total)) - set(indices))
+        raise ValueError(f"Faltan o se repiten particiones de {total}: presentes {indices}, faltan {faltantes}.")
+    return particiones
+
+
+def _imagenes_particion(directorio, particion):
+    # (posición, nombre, filas) de cada imagen de la partición, en orden. Las filas de una
+    # imagen son consecutivas en los fragmentos; una imagen sin filas no se pudo procesar.
+    filas = (fila for fragmento in iterar_fragmentos(directorio) for fila in fragmento.to_dict("records"))
+    siguiente = next(filas, None)
+    for posicion, nombre in zip(particion["posiciones"], particion["imagenes"]):
+        filas_imagen = []
+        while siguiente is not None and siguiente["Imagen"] == nombre:
+            filas_imagen.append(siguiente)
+            siguiente = next(filas, None)
+        yield posicion, nombre, filas_imagen
+    if siguiente is not None:
+        raise ValueError(f"{directorio} tiene filas de {siguiente['Imagen']}, que no está en su {ARCHIVO_PARTICION}.")
+
+
+def combinar_particiones(directorios, salida, formato=None, filas_por_fragmento=FILAS_POR_FRAGMENTO):
+    """
+    Juntamos los resultados de todas las particiones en una carpeta de resultados.
+
+    Las imágenes se agregan en el orden de la lista completa, así que las filas y los
+    agregados (incluidos los percentiles, que dependen del orden) son los mismos que los
+    de una ejecución en una sola máquina. Los fragmentos se cortan solo por cantidad de
+    filas; son los mismos que los de esa ejecución si en ella tampoco hubo cortes por tiempo.
+
+    Args:
+        directorios (list): Carpetas de resultados de las particiones, una por partición.
+        salida (str): Carpeta nueva (o vacía) para el resultado combinado.
+        formato (str): Formato de los fragmentos; por defecto, el de las particiones.
+        filas_por_fragmento (int): Igual que en `AlmacenResultados`.
+
+    Returns:
+        AlmacenResultados: El almacén combinado, ya cerrado.
+    """
+    particiones = _leer_particiones(directorios)
+    formato = formato or next((estado["formato"] for _, _, estado in particiones if estado is not None), "csv")
+    cantidad = particiones[0][1]["cantidad"]
+    if leer_estado(salida) is not None:
+        raise ValueError(f"La carpeta {salida} ya tiene resultados.")
+
+    almacen = AlmacenResultados(salida, formato, filas_por_fragmento, segundos_por_fragmento=None)
+    esperada = 0
+    imagenes = heapq.merge(*(_imagenes_particion(directorio, particion) for directorio, particion, _ in particiones),
+                           key=lambda imagen: imagen[0])
+    for posicion, nombre, filas in imagenes:
+        if posicion != esperada:
+            raise ValueError(f"Las particiones no cubren la lista completa: falta la posición {esperada}.")
+        almacen.agregar(nombre, filas)
+        esperada += 1
+    if esperada != cantidad:
+        raise ValueError(f"Las particiones no cubren la lista completa: {esperada} de {cantidad} imágenes.")
+    almacen.cerrar()
+    return almacen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reparto de un conjunto de imágenes en particiones.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    parser_combinar = subparsers.add_parser("combinar", aliases=["merge"], help="Junta los resultados de todas las particiones.")
+    parser_combinar.add_argument("salida", help="Carpeta donde guardar los resultados combinados.")
+    parser_combinar.add_argument("particiones", nargs="+", help="Carpetas de resultados de cada partición.")
+    parser_combinar.add_argument("--formato", default=None, help="Formato de los fragmentos combinados.")
+    args = parser.parse_args()
+
+    almacen = combinar_particiones(args.particiones, args.salida, args.formato)
+    print(f"{almacen.imagenes} imágenes combinadas de {len(args.particiones)} particiones en {args.salida}.")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(almacen.agregados.tabla())
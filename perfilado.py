@@ -0,0 +1,207 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Perfilado de las etapas del pipeline (lectura, decodificación, conversión a gris, cada
+# técnica y cada métrica). Las etapas se marcan con `with etapa("nombre", imagen):`.
+#
+# Desactivado (lo normal), `etapa` devuelve siempre el mismo contexto vacío: no mide nada
+# ni guarda nada. Activado, cada etapa registra su tiempo de reloj, su tiempo de CPU (del
+# hilo), los bytes asignados (pico de memoria de Python/NumPy durante la etapa, opcional
+# porque tracemalloc sí tiene costo), el proceso y el hilo. Los eventos se exportan en
+# el formato JSON de Chrome (chrome://tracing, Perfetto) y se resumen en una tabla.
+#
+# El pico de tracemalloc es uno solo por proceso: si cada hilo lo reiniciara al empezar
+# sus etapas, los hilos de lectura borrarían el pico de las etapas del hilo principal.
+# Por eso la memoria se mide solo en las etapas del hilo principal (en las de los demás
+# hilos queda vacía). Mientras hay hilos de lectura trabajando, el pico de una etapa del
+# hilo principal incluye también lo que ellos asignan en ese momento: es aproximado.
+
+_NULO = contextlib.nullcontext()
+_perfilador = None
+
+
+class Perfilador:
+    """
+    Acumula los eventos de las etapas del proceso actual.
+
+    Args:
+        memoria (bool): Medir también los bytes asignados en cada etapa del hilo principal
+            (con tracemalloc).
+    """
+
+    def __init__(self, memoria=False):
+        self.memoria = memoria
+        self.eventos = []
+        self._bloqueo = threading.Lock()
+        self._local = threading.local()
+        if memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def medir(self, nombre, imagen=None):
+        pila = getattr(self._local, "pila", None)
+        if pila is None:
+            pila = self._local.pila = []
+        memoria = self.memoria and threading.current_thread() is threading.main_thread()
+        if memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            if pila:
+                # El pico que llevaba la etapa que contiene a esta no debe perderse al reiniciarlo
+                pila[-1] = max(pila[-1], pico)
+            tracemalloc.reset_peak()
+            pila.append(actual)
+            inicio_memoria = actual
+        inicio = time.perf_counter_ns()
+        inicio_cpu = time.thread_time_ns()
+        try:
+            yield
+        finally:
+            fin_cpu = time.thread_time_ns()
+            fin = time.perf_counter_ns()
+            asignados = None
+            if memoria:
+                pico = max(pila.pop(), tracemalloc.get_traced_memory()[1])
+                asignados = max(0, pico - inicio_memoria)
+                if pila:
+                    pila[-1] = max(pila[-1], pico)
+            evento = {
+                "etapa": nombre,
+                "imagen": imagen,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "inicio_ns": inicio,
+                "duracion_ns": fin - inicio,
+                "cpu_ns": fin_cpu - inicio_cpu,
+                "bytes": asignados,
+            }
+            with self._bloqueo:
+                self.eventos.append(evento)
+
+    def agregar(self, eventos):
+        with self._bloqueo:
+            self.eventos.extend(eventos)
+
+    def extraer_eventos(self):
+        """Devuelve los eventos acumulados y los quita del perfilador."""
+        with self._bloqueo:
+            eventos, self.eventos = self.eventos, []
+        return eventos
+
+
+def activar(memoria=False):
+    """Activamos el perfilado en este proceso."""
+    global _perfilador
+    _perfilador = Perfilador(memoria)
+    return _perfilador
+
+
+def desactivar():
+    """Desactivamos el perfilado y devolvemos los eventos que quedaban."""
+    global _perfilador
+    eventos = _perfilador.extraer_eventos() if _perfilador is not None else []
+    _perfilador = None
+    return eventos
+
+
+def activo():
+    return _perfilador is not None
+
+
+def midiendo_memoria():
+    return _perfilador is not None and _perfilador.memoria
+
+
+def etapa(nombre, imagen=None):
+    """
+    Contexto que mide una etapa. Si el perfilado está desactivado no hace nada.
+
+    Args:
+        nombre (str): Nombre de la etapa ("decodificacion", "HE", "metricas", ...).
+        imagen (str): Imagen a la que corresponde, si es una sola.
+    """
+    if _perfilador is None:
+        return _NULO
+    return _perfilador.medir(nombre, imagen)
+
+
+def extraer_eventos():
+    """Eventos acumulados en este proceso (vacío si el perfilado está desactivado)."""
+    return _perfilador.extraer_eventos() if _perfilador is not None else []
+
+
+def agregar_eventos(eventos):
+    """Sumamos eventos recibidos de otro proceso (por ejemplo, de un worker)."""
+    if _perfilador is not None and eventos:
+        _perfilador.agregar(eventos)
+
+
+def ejecutar_perfilado(funcion, *args, **kwargs):
+    """
+    Ejecutamos una tarea (normalmente en un worker) y devolvemos su resultado junto con los
+    eventos que generó, para reunirlos en el proceso principal.
+
+    Returns:
+        tuple: (resultado, eventos)
+    """
+    resultado = funcion(*args, **kwargs)
+    return resultado, extraer_eventos()
+
+
+def exportar_chrome_trace(eventos, ruta):
+    """
+    Guardamos los eventos en el formato de Chrome (chrome://tracing o ui.perfetto.dev):
+    una fila por proceso e hilo, con la imagen, el tiempo de CPU y los bytes como argumentos.
+    """
+    origen = min((evento["inicio_ns"] for evento in eventos), default=0)
+    traza = []
+    for evento in eventos:
+        argumentos = {"cpu_ms": evento["cpu_ns"] / 1e6}
+        if evento["imagen"] is not None:
+            argumentos["imagen"] = evento["imagen"]
+        if evento["bytes"] is not None:
+            argumentos["bytes"] = evento["bytes"]
+        traza.append({
+            "name": evento["etapa"],
+            "cat": "etapa",
+            "ph": "X",
+            "ts": (evento["inicio_ns"] - origen) / 1e3,
+            "dur": evento["duracion_ns"] / 1e3,
+            "pid": evento["pid"],
+            "tid": evento["tid"],
+            "args": argumentos,
+        })
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump({"traceEvents": traza, "displayTimeUnit": "ms"}, archivo)
+
+
+def resumir(eventos, por=("etapa",)):
+    """
+    Tabla resumen de los eventos agrupados por etapa (o por etapa y worker con
+    por=("etapa", "pid"), o por imagen con por=("imagen", "etapa")).
+
+    Returns:
+        pandas.DataFrame: llamadas, tiempo total y medio de reloj y de CPU (ms), y bytes
+        asignados (medio y máximo) si se midieron.
+    """
+    if not eventos:
+        return pd.DataFrame()
+    df = pd.DataFrame(eventos)
+    df["reloj_ms"] = df["duracion_ns"] / 1e6
+    df["cpu_ms"] = df["cpu_ns"] / 1e6
+    agregados = {
+        "llamadas": ("reloj_ms", "size"),
+        "reloj_total_ms": ("reloj_ms", "sum"),
+        "reloj_medio_ms": ("reloj_ms", "mean"),
+        "cpu_total_ms": ("cpu_ms", "sum"),
+    }
+    if df["bytes"].notna().any():
+        agregados["bytes_medio"] = ("bytes", "mean")
+        agregados["bytes_max"] = ("bytes", "max")
+    tabla = df.groupby(list(por), dropna=False).agg(**agregados)
+    return tabla.sort_values("reloj_total_ms", ascending=False)
@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+
+from contexto_imagen import ContextoImagen
+from funciones_mejora import PLANES
+from clahe_mosaicos import (geometria_mosaicos, filas_reflejadas, acumular_histogramas_mosaicos,
+                            calcular_luts_mosaicos, interpolar_mosaicos)
+
+# Procesamiento de imágenes que no entran en memoria (satelitales, microscopía).
+# La imagen se lee por franjas de filas desde un np.memmap: una primera pasada acumula
+# el histograma y una segunda escribe las franjas mejoradas en un memmap de salida.
+# La memoria usada depende del alto de la franja, no del tamaño de la imagen.
+
+ALTO_FRANJA = 1024
+
+
+def abrir_imagen_memmap(ruta, forma=None, modo='r'):
+    """
+    Abrimos una imagen de 8 bits sin cargarla en memoria.
+
+    Args:
+        ruta (str): Archivo .npy, o archivo crudo (raw) con los píxeles uint8 seguidos.
+        forma (tuple): (alto, ancho) o (alto, ancho, 3). Obligatoria para archivos crudos.
+        modo (str): Modo de apertura de np.memmap ('r', 'r+', 'c').
+
+    Returns:
+        numpy.memmap: La imagen mapeada en memoria.
+    """
+    if ruta.lower().endswith('.npy'):
+        return np.load(ruta, mmap_mode=modo)
+    if forma is None:
+        raise ValueError("Para una imagen cruda (raw) hay que indicar su forma.")
+    return np.memmap(ruta, dtype=np.uint8, mode=modo, shape=tuple(forma))
+
+
+def crear_salida_memmap(ruta, forma):
+    """
+    Creamos un archivo .npy mapeado en memoria donde escribir la imagen mejorada.
+    """
+    return np.lib.format.open_memmap(ruta, mode='w+', dtype=np.uint8, shape=tuple(int(lado) for lado in forma))
+
+
+def _franja_gris(imagen, inicio, fin):
+    # Leemos solo las filas de la franja y, si es a color, las pasamos a gris
+    franja = np.ascontiguousarray(imagen[inicio:fin])
+    if franja.ndim == 3:
+        franja = cv2.cvtColor(franja, cv2.COLOR_BGR2GRAY)
+    return franja
+
+
+def _rangos_franjas(alto, alto_franja):
+    for inicio in range(0, alto, alto_franja):
+        yield inicio, min(inicio + alto_franja, alto)
+
+
+def acumular_histograma_por_franjas(imagen, alto_franja=ALTO_FRANJA):
+    """
+    Primera pasada: acumulamos el histograma de 256 niveles recorriendo la imagen por franjas.
+
+    Returns:
+        ContextoImagen: Contexto creado desde el histograma (con su media), sin píxeles.
+    """
+    hist = np.zeros(256, dtype=np.int64)
+    for inicio, fin in _rangos_franjas(imagen.shape[0], alto_franja):
+        hist += np.bincount(_franja_gris(imagen, inicio, fin).ravel(), minlength=256)
+    return ContextoImagen.desde_histograma(hist, imagen.shape)
+
+
+def ecualizar_por_franjas(imagen, salida, metodo="HE", alto_franja=ALTO_FRANJA):
+    """
+    Aplicamos HE, DSIHE o BBHE a una imagen que no entra en memoria.
+    Como son mapeos globales, alcanza con el histograma de toda la imagen (primera
+    pasada) y luego con aplicar la LUT franja por franja (segunda pasada).
+
+    Args:
+        imagen (numpy.ndarray): Imagen uint8 (normalmente un np.memmap), en gris o BGR.
+        salida (numpy.ndarray): Array (alto, ancho) uint8 donde se escribe el resultado,
+            por ejemplo creado con `crear_salida_memmap`.
+        metodo (str): "HE", "DSIHE" o "BBHE".
+        alto_franja (int): Filas que se leen por vez.
+
+    Returns:
+        numpy.ndarray: La LUT aplicada.
+    """
+    if metodo not in PLANES:
+        raise ValueError(f"Método desconocido: {metodo}. Opciones: {', '.join(PLANES)}.")
+    contexto = acumular_histograma_por_franjas(imagen, alto_franja)
+    lut = PLANES[metodo](contexto)
+    for inicio, fin in _rangos_franjas(imagen.shape[0], alto_franja):
+        salida[inicio:fin] = cv2.LUT(_franja_gris(imagen, inicio, fin), lut)
+    if hasattr(salida, 'flush'):
+        salida.flush()
+    return lut
+
+
+def clahe_por_franjas(imagen, salida, clip_limit=2.0, tile_grid_size=(8, 8), alto_franja=ALTO_FRANJA):
+    """
+    Aplicamos CLAHE a una imagen que no entra en memoria, con el mismo resultado que
+    `aplicar_clahe`. En la primera pasada se acumulan los histogramas de cada mosaico
+    (incluido el borde reflejado que agrega OpenCV); en la segunda, cada franja se
+    interpola con las LUT de los mosaicos vecinos.
+
+    Args:
+        imagen (numpy.ndarray): Imagen uint8 (normalmente un np.memmap), en gris o BGR.
+        salida (numpy.ndarray): Array (alto, ancho) uint8 donde se escribe el resultado.
+        clip_limit (float): Límite de contraste.
+        tile_grid_size (tuple): Grilla de mosaicos (x, y).
+        alto_franja (int): Filas que se leen por vez.
+
+    Returns:
+        numpy.ndarray: LUT de los mosaicos (mosaicos_y, mosaicos_x, 256).
+    """
+    alto, ancho = imagen.shape[:2]
+    alto_mosaico, ancho_mosaico, relleno_y, relleno_x = geometria_mosaicos(alto, ancho, tile_grid_size)
+
+    hists = np.zeros((tile_grid_size[1], tile_grid_size[0], 256), dtype=np.int64)
+    for inicio, fin in _rangos_franjas(alto + relleno_y, alto_franja):
+        partes = []
+        if inicio < alto:
+            partes.append(_franja_gris(imagen, inicio, min(fin, alto)))
+        if fin > alto:
+            # Las filas del relleno inferior son filas reales reflejadas. Son como mucho
+            # tantas como mosaicos en y, pero si la imagen es baja el reflejo da la vuelta
+            # y no forman un bloque contiguo: se leen por índice
+            filas = filas_reflejadas(max(inicio, alto), fin, alto)
+            partes.append(_franja_gris(imagen[filas], 0, len(filas)))
+        franja = np.ascontiguousarray(np.concatenate(partes) if len(partes) > 1 else partes[0])
+        if relleno_x:
+            franja = cv2.copyMakeBorder(franja, 0, 0, 0, relleno_x, cv2.BORDER_REFLECT_101)
+        acumular_histogramas_mosaicos(hists, franja, inicio, alto_mosaico, ancho_mosaico)
+
+    luts = calcular_luts_mosaicos(hists, clip_limit, alto_mosaico * ancho_mosaico)
+    for inicio, fin in _rangos_franjas(alto, alto_franja):
+        salida[inicio:fin] = interpolar_mosaicos(_franja_gris(imagen, inicio, fin), luts,
+                                                 alto_mosaico, ancho_mosaico, fila_inicial=inicio)
+    if hasattr(salida, 'flush'):
+        salida.flush()
+    return luts
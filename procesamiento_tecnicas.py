@@ -0,0 +1,215 @@
+import cv2
+import numpy as np
+
+from arena_buffers import arena_del_proceso
+from cargador_imagenes import LECTURA_POR_DEFECTO
+from perfilado import etapa
+from funciones_mejora import (aplicar_clahe, aplicar_lut, calcular_lut_he, calcular_lut_dsihe, calcular_lut_bbhe,
+                              calcular_histogramas_lote, calcular_luts_he_lote, calcular_luts_dsihe_lote,
+                              calcular_luts_bbhe_lote, aplicar_clahe_lote)
+from funciones_metrica import (METRICAS_ESTRUCTURALES, calcular_contraste, calcular_entropia,
+                               calcular_estructurales_lote, calcular_metricas_desde_histograma,
+                               calcular_metricas_estructurales, calcular_metricas_fusionadas, calcular_metricas_lote,
+                               preparar_referencia)
+
+# Cálculo de las técnicas y de las filas de métricas de cada imagen, imagen por imagen
+# (modo interactivo) o por pilas del mismo tamaño (modo por lotes). Todo lo que decide
+# los valores que se guardan en la caché está aquí y en los módulos de algoritmos, que
+# forman parte de su versión; main_proyecto.py solo orquesta la lectura, los workers,
+# la caché y los reportes.
+
+TECNICAS = ("HE", "CLAHE", "DSIHE", "BBHE")
+METRICAS = ('AMBE', 'PSNR', 'Contraste', 'Entropia') + METRICAS_ESTRUCTURALES
+SIN_ESTRUCTURALES = {metrica: np.nan for metrica in METRICAS_ESTRUCTURALES}
+
+
+def calcular_planes(contexto):
+    """
+    Calculamos las LUT (planes de transformación) de las técnicas que son un mapeo
+    global de intensidades. Con ellas las métricas se obtienen desde el histograma.
+    """
+    return {
+        "HE": calcular_lut_he(contexto),
+        "DSIHE": calcular_lut_dsihe(contexto),
+        "BBHE": calcular_lut_bbhe(contexto),
+    }
+
+
+def aplicar_tecnicas(contexto, planes=None):
+    """
+    Aplicamos las cuatro técnicas de mejora sobre el mismo contexto de la imagen
+    (gris e histograma calculados una sola vez) y devolvemos un diccionario técnica -> imagen.
+    """
+    planes = planes if planes is not None else calcular_planes(contexto)
+    return {
+        "HE": aplicar_lut(contexto, planes["HE"]),
+        "CLAHE": aplicar_clahe(contexto),
+        "DSIHE": aplicar_lut(contexto, planes["DSIHE"]),
+        "BBHE": aplicar_lut(contexto, planes["BBHE"]),
+    }
+
+
+def calcular_metricas_tecnicas(contexto, planes, imagenes_mejoradas, estructurales=True):
+    """
+    Calculamos las métricas de la imagen original y de cada técnica.
+    Las técnicas con LUT se evalúan en el dominio del histograma (O(256)); las espaciales
+    (CLAHE) con una única pasada fusionada sobre el par original/mejorada. SSIM y EPI
+    necesitan los píxeles de todas: la original se prepara una vez para las cuatro.
+
+    Returns:
+        dict: técnica -> diccionario de métricas, en el orden de TECNICAS.
+    """
+    metricas = {"Original": {
+        "AMBE": np.nan,
+        "PSNR": np.nan,
+        "Contraste": calcular_contraste(contexto),
+        "Entropia": calcular_entropia(contexto),
+        **SIN_ESTRUCTURALES,
+    }}
+    arena = arena_del_proceso()
+    referencia = preparar_referencia(contexto, arena=arena) if estructurales else None
+    for tecnica in TECNICAS:
+        if tecnica in planes:
+            metricas[tecnica] = calcular_metricas_desde_histograma(contexto, lut=planes[tecnica])
+        else:
+            metricas[tecnica] = calcular_metricas_fusionadas(contexto, imagenes_mejoradas[tecnica], estructurales=False)
+        if estructurales:
+            metricas[tecnica].update(calcular_metricas_estructurales(referencia, imagenes_mejoradas[tecnica], arena))
+        else:
+            metricas[tecnica].update(SIN_ESTRUCTURALES)
+    return metricas
+
+
+def calcular_filas(nombre_imagen, metricas_por_tecnica):
+    """
+    Convertimos las métricas de una imagen en filas (una por técnica) para el cuadro comparativo.
+    """
+    return [{"Imagen": nombre_imagen, "Técnica": tecnica, **metricas}
+            for tecnica, metricas in metricas_por_tecnica.items()]
+
+
+def procesar_pila(pila, parametros_clahe=None, tecnicas=("Original",) + TECNICAS, nombres=None, arena=None,
+                  estructurales=True):
+    """
+    Procesamos N imágenes en gris del mismo tamaño apiladas en un array (N, H, W).
+    Los histogramas, las LUT y las métricas de HE, DSIHE y BBHE se calculan para todas
+    a la vez; solo CLAHE, que es espacial, se aplica imagen por imagen.
+    Los valores coinciden exactamente con los del cálculo imagen por imagen.
+
+    Args:
+        pila (numpy.ndarray): Imágenes en gris (N, H, W).
+        parametros_clahe (dict): Argumentos de CLAHE (`clip_limit`, `tile_grid_size`).
+        tecnicas (tuple): Técnicas a calcular ("Original" incluida); el resto se omite.
+        nombres (list): Nombres de las imágenes, solo para el perfilado.
+        arena (ArenaBuffers): Si se indica, los índices del histograma, las imágenes de
+            CLAHE y los intermedios de SSIM y EPI usan sus buffers en lugar de arrays nuevos.
+        estructurales (bool): Calcular SSIM y EPI (con False quedan en np.nan).
+
+    Returns:
+        list: Para cada imagen, un par (métricas por técnica, productos por técnica), donde
+        el producto es la LUT o, para CLAHE, la imagen mejorada (con arena, un buffer que
+        se sobrescribe en la siguiente pila del mismo tamaño).
+    """
+    parametros_clahe = parametros_clahe or {}
+    nombres = nombres or [None] * len(pila)
+    trabajo = salida_clahe = None
+    if arena is not None:
+        n, alto, ancho = pila.shape
+        trabajo = arena.obtener("indices_histograma", (min(n, 64), alto * ancho), np.intp)
+        salida_clahe = arena.obtener("clahe", pila.shape)
+    with etapa("histogramas"):
+        hists = calcular_histogramas_lote(pila, trabajo=trabajo)
+    constructores = {
+        "HE": calcular_luts_he_lote,
+        "DSIHE": calcular_luts_dsihe_lote,
+        "BBHE": calcular_luts_bbhe_lote,
+    }
+    planes, metricas_lote = {}, {}
+    for tecnica, constructor in constructores.items():
+        if tecnica in tecnicas:
+            with etapa(tecnica):
+                planes[tecnica] = constructor(hists)
+            with etapa(f"metricas_{tecnica}"):
+                metricas_lote[tecnica] = calcular_metricas_lote(hists, planes[tecnica])
+    if "Original" in tecnicas:
+        # La LUT identidad da el contraste y la entropía de la imagen original
+        with etapa("metricas_Original"):
+            identidad = np.broadcast_to(np.arange(256, dtype=np.uint8), hists.shape)
+            metricas_original = calcular_metricas_lote(hists, identidad)
+    imagenes_clahe = None
+    if "CLAHE" in tecnicas:
+        with etapa("CLAHE"):
+            imagenes_clahe = aplicar_clahe_lote(pila, **parametros_clahe, salida=salida_clahe)
+    metricas_estructurales = {}
+    if estructurales:
+        # Las LUT se aplican de a una imagen en un buffer; la original se prepara una vez
+        mejoradas = {**planes, **({"CLAHE": imagenes_clahe} if imagenes_clahe is not None else {})}
+        with etapa("metricas_estructurales"):
+            metricas_estructurales = calcular_estructurales_lote(pila, mejoradas, arena=arena)
+
+    resultados = []
+    for indice in range(len(pila)):
+        metricas, productos = {}, {}
+        if "Original" in tecnicas:
+            metricas["Original"] = {
+                "AMBE": np.nan,
+                "PSNR": np.nan,
+                "Contraste": metricas_original["Contraste"][indice],
+                "Entropia": metricas_original["Entropia"][indice],
+                **SIN_ESTRUCTURALES,
+            }
+            productos["Original"] = None
+        for tecnica in TECNICAS:
+            if tecnica not in tecnicas:
+                continue
+            if tecnica in planes:
+                metricas[tecnica] = {metrica: valores[indice] for metrica, valores in metricas_lote[tecnica].items()}
+                productos[tecnica] = planes[tecnica][indice]
+            else:
+                with etapa(f"metricas_{tecnica}", nombres[indice]):
+                    metricas[tecnica] = calcular_metricas_fusionadas(pila[indice], imagenes_clahe[indice],
+                                                                     estructurales=False)
+                productos[tecnica] = imagenes_clahe[indice]
+            if estructurales:
+                metricas[tecnica].update({metrica: valores[indice]
+                                          for metrica, valores in metricas_estructurales[tecnica].items()})
+            else:
+                metricas[tecnica].update(SIN_ESTRUCTURALES)
+        resultados.append((metricas, productos))
+    return resultados
+
+
+def apilar_en_gris(imagenes, pila, nombres=None):
+    """
+    Convertimos cada imagen a gris directamente en su lugar de la pila (N, H, W).
+    `imagenes` puede ser un generador, para soltar cada imagen apenas se copia.
+    """
+    nombres = nombres or [None] * len(pila)
+    for posicion, imagen in enumerate(imagenes):
+        with etapa("conversion_gris", nombres[posicion]):
+            if imagen.ndim == 3:
+                cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY, dst=pila[posicion])
+            else:
+                pila[posicion] = imagen
+    return pila
+
+
+def parametros_tecnica(tecnica, parametros_clahe, lectura=None, estructurales=True):
+    """
+    Parámetros que forman parte de la clave de caché de cada técnica. La forma de lectura
+    y la omisión de SSIM y EPI solo se agregan si no son las de siempre, para no
+    invalidar entradas anteriores.
+    """
+    parametros = {}
+    if tecnica == "CLAHE":
+        parametros = {
+            "clip_limit": parametros_clahe.get("clip_limit", 2.0),
+            "tile_grid_size": list(parametros_clahe.get("tile_grid_size", (8, 8))),
+        }
+    lectura = {clave: valor for clave, valor in (lectura or {}).items()
+               if valor != LECTURA_POR_DEFECTO.get(clave)}
+    if lectura:
+        parametros["lectura"] = lectura
+    if not estructurales and tecnica != "Original":
+        parametros["estructurales"] = False
+    return parametros
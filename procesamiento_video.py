@@ -0,0 +1,179 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from contexto_imagen import ContextoImagen
+from funciones_mejora import PLANES
+
+# Mejora de video o de cualquier secuencia de frames. A diferencia de las funciones de
+# funciones_mejora.py, el estado se conserva entre frames: el objeto CLAHE, los buffers de
+# gris y de salida, y la LUT de las técnicas globales (HE, DSIHE, BBHE, RMSHE, RSIHE), que solo se recalcula cuando el histograma
+# cambia lo suficiente. Opcionalmente el histograma se suaviza en el tiempo para que la
+# salida no parpadee.
+
+METODOS = ("CLAHE",) + tuple(PLANES)
+
+
+def _distancia_histogramas(hist_a, hist_b):
+    # Distancia L1 entre histogramas normalizados (0 = iguales, 2 = disjuntos)
+    return float(np.abs(hist_a / max(hist_a.sum(), 1) - hist_b / max(hist_b.sum(), 1)).sum())
+
+
+def _cuentas_enteras(hist, total):
+    # Lleva un histograma suavizado (cuentas fraccionarias) a cuentas enteras que suman
+    # exactamente `total`, como el de un frame real: se escala, se trunca y los píxeles que
+    # faltan van a los niveles con mayor parte fraccionaria. Redondear nivel por nivel puede
+    # dejar una suma distinta del total, y la media y las CDF del contexto no cerrarían.
+    cuentas = hist.astype(np.float64) * (total / max(float(hist.sum()), 1.0))
+    enteras = np.floor(cuentas)
+    faltan = int(total - enteras.sum())
+    if faltan > 0:
+        enteras[np.argsort(enteras - cuentas, kind="stable")[:faltan]] += 1
+    return enteras
+
+
+class MejoradorVideo:
+    """
+    Aplica una técnica de mejora a frames sucesivos reutilizando estado y buffers.
+
+    Args:
+        metodo (str): Uno de METODOS: "CLAHE", "HE", "DSIHE", "BBHE", "RMSHE" o "RSIHE".
+        clip_limit (float): Límite de contraste de CLAHE.
+        tile_grid_size (tuple): Grilla de mosaicos de CLAHE.
+        suavizado (float): Peso del histograma acumulado en la media móvil exponencial
+            (0 = sin suavizado, cerca de 1 = cambios muy lentos). Para todos menos CLAHE.
+        umbral_cambio (float): Distancia L1 (entre 0 y 2) que debe alcanzar el histograma,
+            respecto del usado para la LUT actual, para recalcular la LUT. Con 0 se recalcula
+            en cada frame.
+    """
+
+    def __init__(self, metodo="CLAHE", clip_limit=2.0, tile_grid_size=(8, 8), suavizado=0.0, umbral_cambio=0.0):
+        if metodo not in METODOS:
+            raise ValueError(f"Método desconocido: {metodo}. Opciones: {', '.join(METODOS)}.")
+        self.metodo = metodo
+        self.suavizado = suavizado
+        self.umbral_cambio = umbral_cambio
+        self._clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size) if metodo == "CLAHE" else None
+        self._gris = None
+        self._salida = None
+        self._hist_suavizado = None
+        self._hist_lut = None
+        self.lut = None
+        self.frames = 0
+        self.luts_calculadas = 0
+
+    def _preparar_buffers(self, forma):
+        if self._salida is None or self._salida.shape != forma:
+            self._gris = np.empty(forma, dtype=np.uint8)
+            self._salida = np.empty(forma, dtype=np.uint8)
+
+    def procesar(self, frame):
+        """
+        Mejoramos un frame (BGR o gris).
+
+        Returns:
+            numpy.ndarray: Frame mejorado en gris. El buffer se reutiliza en el frame
+            siguiente; hay que copiarlo si se quiere conservar.
+        """
+        self._preparar_buffers(frame.shape[:2])
+        if frame.ndim == 3:
+            gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gris)
+        else:
+            gris = frame
+
+        if self._clahe is not None:
+            self._clahe.apply(gris, dst=self._salida)
+        else:
+            hist = cv2.calcHist([gris], [0], None, [256], [0, 256]).ravel()
+            if self.suavizado > 0 and self._hist_suavizado is not None:
+                hist = self.suavizado * self._hist_suavizado + (1 - self.suavizado) * hist
+            self._hist_suavizado = hist
+
+            if self.lut is None or _distancia_histogramas(hist, self._hist_lut) > self.umbral_cambio:
+                contexto = ContextoImagen.desde_histograma(_cuentas_enteras(hist, gris.size), gris.shape)
+                self.lut = PLANES[self.metodo](contexto)
+                self._hist_lut = hist
+                self.luts_calculadas += 1
+            cv2.LUT(gris, self.lut, dst=self._salida)
+
+        self.frames += 1
+        return self._salida
+
+
+def leer_frames(fuente):
+    """
+    Generamos los frames de un archivo de video, de una cámara (índice entero) o de
+    cualquier iterable de imágenes.
+    """
+    if isinstance(fuente, (str, int)):
+        captura = cv2.VideoCapture(fuente)
+        if not captura.isOpened():
+            raise ValueError(f"No se pudo abrir el video: {fuente}")
+        try:
+            while True:
+                leido, frame = captura.read()
+                if not leido:
+                    break
+                yield frame
+        finally:
+            captura.release()
+    else:
+        yield from fuente
+
+
+def procesar_video(fuente, mejorador, ruta_salida=None, fps_salida=30.0):
+    """
+    Procesamos todos los frames de la fuente y medimos la velocidad alcanzada.
+
+    Args:
+        fuente (str | int | iterable): Video, cámara o iterable de frames.
+        mejorador (MejoradorVideo): Técnica a aplicar, con su estado.
+        ruta_salida (str): Archivo de video donde escribir los frames mejorados (opcional).
+        fps_salida (float): FPS del video de salida.
+
+    Returns:
+        dict: "frames", "segundos", "fps" y "luts_calculadas".
+    """
+    escritor = None
+    inicio = time.perf_counter()
+    try:
+        for frame in leer_frames(fuente):
+            mejorado = mejorador.procesar(frame)
+            if ruta_salida is not None:
+                if escritor is None:
+                    alto, ancho = mejorado.shape
+                    escritor = cv2.VideoWriter(ruta_salida, cv2.VideoWriter_fourcc(*'mp4v'), fps_salida,
+                                               (ancho, alto), isColor=False)
+                escritor.write(mejorado)
+    finally:
+        if escritor is not None:
+            escritor.release()
+    segundos = time.perf_counter() - inicio
+    return {
+        "frames": mejorador.frames,
+        "segundos": segundos,
+        "fps": mejorador.frames / segundos if segundos > 0 else 0.0,
+        "luts_calculadas": mejorador.luts_calculadas,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mejora de video frame a frame.")
+    parser.add_argument("video", help="Archivo de video, o índice de cámara.")
+    parser.add_argument("--metodo", choices=METODOS, default="CLAHE")
+    parser.add_argument("--salida", default=None, help="Archivo de video de salida.")
+    parser.add_argument("--clip-limit", type=float, default=2.0)
+    parser.add_argument("--grilla", type=int, nargs=2, default=(8, 8), metavar=("X", "Y"))
+    parser.add_argument("--suavizado", type=float, default=0.0,
+                        help="Peso de la media móvil del histograma (HE/DSIHE/BBHE).")
+    parser.add_argument("--umbral-cambio", type=float, default=0.0,
+                        help="Distancia L1 del histograma a partir de la cual se recalcula la LUT.")
+    args = parser.parse_args()
+
+    fuente = int(args.video) if args.video.isdigit() else args.video
+    mejorador = MejoradorVideo(args.metodo, args.clip_limit, tuple(args.grilla), args.suavizado, args.umbral_cambio)
+    estadisticas = procesar_video(fuente, mejorador, args.salida)
+    print(f"{estadisticas['frames']} frames en {estadisticas['segundos']:.2f} s "
+          f"({estadisticas['fps']:.1f} FPS), LUT calculadas: {estadisticas['luts_calculadas']}")
@@ -0,0 +1,181 @@
+import html
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from contexto_imagen import histograma_de
+
+# Reportes en archivos. Los gráficos se dibujan desde los histogramas de 256 niveles que
+# ya se tienen (sin volver a recorrer los píxeles como plt.hist) y se guardan como PNG
+# con matplotlib.figure.Figure, que usa el backend Agg sin pasar por pyplot ni abrir
+# ventanas. El dibujo se hace en un pool de procesos aparte, de modo que no compite con
+# el procesamiento; al cerrar se escribe un index.html con las páginas y las métricas.
+
+COLORES = {"Original": "blue", "HE": "green", "CLAHE": "red", "DSIHE": "purple", "BBHE": "orange"}
+TITULOS = {"Original": "Original", "HE": "Ecualizacion Histograma (HE)", "CLAHE": "CLAHE",
+           "DSIHE": "DSIHE", "BBHE": "BBHE"}
+ANCHO_MINIATURA = 480
+BORDES = np.arange(257)
+
+
+def dibujar_histograma(ax, hist, titulo, color='gray'):
+    """
+    Dibujamos un histograma de 256 niveles como barras contiguas (un único polígono,
+    el mismo aspecto que plt.hist con 256 bins).
+    """
+    ax.stairs(hist, BORDES, fill=True, color=color, alpha=0.7)
+    ax.set_xlim(0, 256)
+    ax.set_title(titulo)
+    ax.set_xlabel("Nivel de Píxel")
+    ax.grid(True, linestyle='--', alpha=0.6)
+
+
+def histograma_producto(hist_original, producto):
+    """
+    Histograma de la imagen mejorada a partir de lo que produce una técnica: con una LUT
+    sale del histograma original (cada nivel i se acumula en lut[i]), sin recorrer píxeles;
+    con la imagen mejorada se calcula; con None es el propio original.
+    """
+    if producto is None:
+        return hist_original
+    if producto.shape == (256,):
+        return np.bincount(producto, weights=hist_original, minlength=256)
+    return histograma_de(producto)
+
+
+def crear_vista(gris, productos, ancho_miniatura=ANCHO_MINIATURA):
+    """
+    Reunimos lo necesario para dibujar la página de una imagen: su histograma y el de cada
+    técnica, y una miniatura de cada imagen.
+
+    Args:
+        gris (numpy.ndarray): Imagen original en gris.
+        productos (dict): técnica -> LUT (256,), imagen mejorada, o None para "Original".
+        ancho_miniatura (int): Ancho máximo de las miniaturas. Con None no se reducen.
+
+    Returns:
+        dict: {"hists": técnica -> histograma, "miniaturas": técnica -> imagen}.
+    """
+    hist_original = histograma_de(gris).astype(np.float64)
+    alto, ancho = gris.shape
+    if ancho_miniatura is not None and ancho > ancho_miniatura:
+        forma = (ancho_miniatura, max(1, round(alto * ancho_miniatura / ancho)))
+        miniatura = cv2.resize(gris, forma, interpolation=cv2.INTER_AREA)
+    else:
+        # Copia: la imagen puede ser un buffer que se reutiliza antes de dibujar la página
+        forma, miniatura = None, gris.copy()
+
+    hists, miniaturas = {}, {}
+    for tecnica, producto in productos.items():
+        hists[tecnica] = histograma_producto(hist_original, producto)
+        if producto is None:
+            miniaturas[tecnica] = miniatura
+        elif producto.shape == (256,):
+            # Mapeo global: la miniatura es la LUT aplicada a la miniatura original
+            miniaturas[tecnica] = cv2.LUT(miniatura, producto)
+        else:
+            miniaturas[tecnica] = (producto.copy() if forma is None
+                                   else cv2.resize(producto, forma, interpolation=cv2.INTER_AREA))
+    return {"hists": hists, "miniaturas": miniaturas}
+
+
+def renderizar_pagina(ruta_png, nombre_imagen, vista):
+    """
+    Dibujamos la comparación de una imagen (fila de imágenes y fila de histogramas) en un PNG.
+    """
+    tecnicas = list(vista["hists"])
+    figura = Figure(figsize=(4.8 * len(tecnicas), 9))
+    ejes = figura.subplots(2, len(tecnicas), squeeze=False)
+    for columna, tecnica in enumerate(tecnicas):
+        miniatura = vista["miniaturas"].get(tecnica)
+        if miniatura is not None:
+            if miniatura.ndim == 3:
+                ejes[0, columna].imshow(cv2.cvtColor(miniatura, cv2.COLOR_BGR2RGB))
+            else:
+                ejes[0, columna].imshow(miniatura, cmap='gray', vmin=0, vmax=255)
+        ejes[0, columna].set_title(TITULOS.get(tecnica, tecnica))
+        ejes[0, columna].axis('off')
+        dibujar_histograma(ejes[1, columna], vista["hists"][tecnica], f'Hist. {tecnica} ({nombre_imagen})',
+                           COLORES.get(tecnica, 'gray'))
+    ejes[1, 0].set_ylabel("Frecuencia")
+    figura.tight_layout()
+    figura.savefig(ruta_png, dpi=72)
+    return ruta_png
+
+
+class GeneradorReportes:
+    """
+    Genera las páginas del reporte en segundo plano.
+
+    Args:
+        directorio (str): Carpeta del reporte (PNG por imagen e index.html).
+        workers (int): Procesos dedicados a dibujar.
+        max_pendientes (int): Páginas encoladas como máximo; si el dibujo se atrasa, se
+            espera a que termine la más antigua para que la memoria no crezca sin límite.
+    """
+
+    def __init__(self, directorio, workers=1, max_pendientes=64):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.max_pendientes = max_pendientes
+        self._ejecutor = ProcessPoolExecutor(max_workers=max(1, workers))
+        self._pendientes = deque()
+        self._paginas = []
+        self.errores = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def agregar(self, nombre_imagen, filas, vista=None):
+        """
+        Encolamos la página de una imagen. Sin `vista` solo se incluyen sus métricas.
+        """
+        archivo_png = None
+        if vista is not None:
+            archivo_png = os.path.splitext(nombre_imagen)[0] + '.png'
+            futuro = self._ejecutor.submit(renderizar_pagina, os.path.join(self.directorio, archivo_png),
+                                           nombre_imagen, vista)
+            self._pendientes.append((nombre_imagen, futuro))
+            while len(self._pendientes) > self.max_pendientes:
+                self._esperar(*self._pendientes.popleft())
+        self._paginas.append((nombre_imagen, filas, archivo_png))
+
+    def _esperar(self, nombre_imagen, futuro):
+        try:
+            futuro.result()
+        except Exception as error:
+            self.errores.append((nombre_imagen, str(error)))
+
+    def cerrar(self):
+        """
+        Esperamos las páginas pendientes y escribimos el index.html.
+
+        Returns:
+            str: Ruta del index.html.
+        """
+        while self._pendientes:
+            self._esperar(*self._pendientes.popleft())
+        self._ejecutor.shutdown()
+        for nombre_imagen, mensaje in self.errores:
+            print(f"Error: No se pudo dibujar el reporte de {nombre_imagen}: {mensaje}")
+
+        secciones = []
+        for nombre_imagen, filas, archivo_png in self._paginas:
+            tabla = pd.DataFrame(filas).drop(columns="Imagen", errors="ignore").to_html(
+                index=False, float_format=lambda valor: f"{valor:.4f}", na_rep="-")
+            imagen = f'<img src="{html.escape(archivo_png)}" style="max-width:100%">' if archivo_png else ""
+            secciones.append(f"<h2>{html.escape(nombre_imagen)}</h2>\n{tabla}\n{imagen}")
+        ruta_indice = os.path.join(self.directorio, 'index.html')
+        with open(ruta_indice, 'w', encoding='utf-8') as archivo:
+            archivo.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+                          "<title>Comparación de técnicas de mejora</title></head><body>\n"
+                          "<h1>Comparación de técnicas de mejora</h1>\n" + "\n".join(secciones) + "\n</body></html>\n")
+        return ruta_indice
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from almacen_resultados import (AgregadosEnLinea, AlmacenResultados, CuantilP2, EstadisticaEnLinea, leer_agregados,
+                                leer_estado, leer_resultados)
+
+# Los agregados en línea deben coincidir con NumPy sobre los valores completos, y una
+# ejecución cortada y retomada debe dejar las mismas filas (sin repetidas) y los mismos
+# agregados que una sin cortes.
+
+TECNICAS = ("Original", "HE")
+
+
+def _filas(nombre, indice):
+    # Dos filas por imagen, con valores que dependen solo de la imagen
+    rng = np.random.default_rng(indice)
+    return [{"Imagen": nombre, "Técnica": tecnica,
+             **{metrica: rng.normal(10, 3) for metrica in ("AMBE", "PSNR", "Contraste", "Entropia", "SSIM", "EPI")}}
+            for tecnica in TECNICAS]
+
+
+def test_welford_igual_a_numpy():
+    valores = np.random.default_rng(0).normal(1e6, 25, 5000)
+    estadistica = EstadisticaEnLinea()
+    for valor in valores:
+        estadistica.agregar(valor)
+    for valor in (np.nan, np.inf, -np.inf):
+        estadistica.agregar(valor)
+
+    resumen = estadistica.resumen()
+    assert resumen["cantidad"] == len(valores)
+    assert estadistica.no_finitos == 3
+    np.testing.assert_allclose(resumen["media"], np.mean(valores), rtol=1e-12)
+    np.testing.assert_allclose(resumen["desvio"], np.std(valores, ddof=1), rtol=1e-9)
+    assert resumen["minimo"] == valores.min() and resumen["maximo"] == valores.max()
+
+    # Desde el punto de control se sigue igual que sin cortar
+    retomada = EstadisticaEnLinea.desde_estado(estadistica.estado())
+    for valor in valores[:100]:
+        estadistica.agregar(valor)
+        retomada.agregar(valor)
+    assert retomada.resumen() == estadistica.resumen()
+
+
+@pytest.mark.parametrize("distribucion", ["normal", "uniform", "exponential", "lognormal"])
+def test_p2_cerca_de_np_quantile(distribucion):
+    valores = getattr(np.random.default_rng(1), distribucion)(size=10000)
+    rango = np.quantile(valores, 0.99) - np.quantile(valores, 0.01)
+    for p in (0.5, 0.9, 0.99):
+        cuantil = CuantilP2(p)
+        for valor in valores:
+            cuantil.agregar(valor)
+        assert abs(cuantil.valor() - np.quantile(valores, p)) < 0.02 * rango, p
+
+
+def test_p2_con_pocos_valores_es_exacto():
+    cuantil = CuantilP2(0.9)
+    for valor in (3.0, 1.0, 2.0):
+        cuantil.agregar(valor)
+    assert cuantil.valor() == np.percentile([1.0, 2.0, 3.0], 90)
+
+
+def _ejecucion_completa(directorio, nombres):
+    with AlmacenResultados(directorio, filas_por_fragmento=4, segundos_por_fragmento=None) as almacen:
+        for indice, nombre in enumerate(nombres):
+            almacen.agregar(nombre, _filas(nombre, indice))
+
+
+@pytest.mark.parametrize("formato", ["csv", "npz"])
+def test_retomar_no_repite_filas(tmp_path, formato):
+    nombres = [f"{indice}.png" for indice in range(11)]
+    _ejecucion_completa(str(tmp_path / "referencia"), nombres)
+
+    directorio = str(tmp_path / "cortada")
+    almacen = AlmacenResultados(directorio, formato, filas_por_fragmento=4, segundos_por_fragmento=None)
+    for indice, nombre in enumerate(nombres[:7]):
+        almacen.agregar(nombre, _filas(nombre, indice))
+    # Corte abrupto: la imagen 7 quedó pendiente sin escribir, un fragmento llegó al disco
+    # sin actualizar estado.json y quedó un temporal a medio escribir
+    assert leer_estado(directorio)["imagenes"] == 6
+    pd.DataFrame(_filas("6.png", 6)).to_csv(os.path.join(directorio, f"fragmento_000003.{formato}"))
+    open(os.path.join(directorio, "fragmento_000004.csv.tmp"), "w").close()
+    del almacen
+
+    almacen = AlmacenResultados(directorio, formato, filas_por_fragmento=4, segundos_por_fragmento=None)
+    hechas = almacen.reanudar(nombres)
+    assert hechas == 6
+    assert not any(nombre.endswith(".tmp") for nombre in os.listdir(directorio))
+    for indice, nombre in enumerate(nombres[hechas:], start=hechas):
+        almacen.agregar(nombre, _filas(nombre, indice))
+    almacen.cerrar()
+
+    resultados = leer_resultados(directorio)
+    assert not resultados.duplicated(["Imagen", "Técnica"]).any()
+    pd.testing.assert_frame_equal(resultados, leer_resultados(str(tmp_path / "referencia")))
+    pd.testing.assert_frame_equal(leer_agregados(directorio), leer_agregados(str(tmp_path / "referencia")))
+
+
+def test_reanudar_rechaza_otra_lista(tmp_path):
+    nombres = [f"{indice}.png" for indice in range(4)]
+    _ejecucion_completa(str(tmp_path), nombres)
+    with pytest.raises(ValueError):
+        AlmacenResultados(str(tmp_path)).reanudar(nombres[:-1] + ["otra.png"])
+
+
+def test_agregados_por_tecnica():
+    agregados = AgregadosEnLinea()
+    filas = [fila for indice in range(50) for fila in _filas(str(indice), indice)]
+    agregados.agregar(filas)
+    tabla = agregados.tabla()
+    for tecnica in TECNICAS:
+        valores = [fila["PSNR"] for fila in filas if fila["Técnica"] == tecnica]
+        np.testing.assert_allclose(tabla.loc[(tecnica, "PSNR"), "media"], np.mean(valores), rtol=1e-12)
@@ -0,0 +1,96 @@
+import os
+
+import cv2
+import numpy as np
+import pandas as pd
+
+import main_proyecto
+from cache_resultados import FRACCION_REVISION, CacheResultados, hash_contenido
+
+# La caché debe acertar solo cuando coinciden el contenido, la técnica y sus parámetros,
+# y mantenerse cerca de su tamaño máximo desalojando las entradas menos usadas.
+
+
+def _escribir_imagenes(directorio, cantidad=3):
+    rng = np.random.default_rng(4)
+    nombres = []
+    for indice in range(cantidad):
+        nombre = f"{indice + 1}.png"
+        cv2.imwrite(os.path.join(directorio, nombre), rng.integers(0, 256, (24, 32, 3), dtype=np.uint8))
+        nombres.append(nombre)
+    return nombres
+
+
+def _contar_calculos(monkeypatch):
+    # Cuenta, por técnica, cuántas imágenes se calcularon de verdad (sin caché)
+    calculadas = {}
+    procesar_pila = main_proyecto.procesar_pila
+
+    def contar(pila, parametros_clahe, tecnicas, *args, **kwargs):
+        for tecnica in tecnicas:
+            calculadas[tecnica] = calculadas.get(tecnica, 0) + len(pila)
+        return procesar_pila(pila, parametros_clahe, tecnicas, *args, **kwargs)
+
+    monkeypatch.setattr(main_proyecto, "procesar_pila", contar)
+    return calculadas
+
+
+def test_clave_cambia_con_contenido_y_parametros(tmp_path):
+    cache = CacheResultados(str(tmp_path))
+    hash_imagen = hash_contenido(b"imagen")
+    clave = cache.clave(hash_imagen, "CLAHE", {"clip_limit": 2.0})
+    cache.guardar(clave, {"AMBE": 1.5})
+
+    assert cache.obtener(cache.clave(hash_imagen, "CLAHE", {"clip_limit": 2.0}))["metricas"] == {"AMBE": 1.5}
+    assert cache.obtener(cache.clave(hash_imagen, "CLAHE", {"clip_limit": 3.0})) is None
+    assert cache.obtener(cache.clave(hash_imagen, "HE", {"clip_limit": 2.0})) is None
+    assert cache.obtener(cache.clave(hash_contenido(b"otra"), "CLAHE", {"clip_limit": 2.0})) is None
+
+
+def test_procesar_lote_reutiliza_solo_lo_que_no_cambio(tmp_path, monkeypatch):
+    imagenes, directorio_cache = tmp_path / "imagenes", str(tmp_path / "cache")
+    imagenes.mkdir()
+    nombres = _escribir_imagenes(str(imagenes))
+    calculadas = _contar_calculos(monkeypatch)
+
+    def ejecutar(clip_limit=2.0):
+        calculadas.clear()
+        return main_proyecto.procesar_lote(str(imagenes), nombres, workers=1, directorio_cache=directorio_cache,
+                                           parametros_clahe={"clip_limit": clip_limit})
+
+    primera = ejecutar()
+    assert calculadas == {tecnica: len(nombres) for tecnica in ("Original",) + main_proyecto.TECNICAS}
+
+    # Sin cambios: todo sale de la caché, con los mismos valores
+    segunda = ejecutar()
+    assert calculadas == {}
+    pd.testing.assert_frame_equal(pd.DataFrame(segunda), pd.DataFrame(primera), check_dtype=False)
+
+    # Otro clip_limit: solo se recalcula CLAHE
+    ejecutar(clip_limit=3.0)
+    assert calculadas == {"CLAHE": len(nombres)}
+
+    # Otro contenido con el mismo nombre: se recalcula esa imagen entera
+    cv2.imwrite(str(imagenes / nombres[0]), np.full((24, 32, 3), 90, dtype=np.uint8))
+    ejecutar()
+    assert calculadas == {tecnica: 1 for tecnica in ("Original",) + main_proyecto.TECNICAS}
+
+
+def test_desalojo_mantiene_el_limite(tmp_path):
+    tamano_maximo = 200_000
+    cache = CacheResultados(str(tmp_path), tamano_maximo=tamano_maximo)
+    rng = np.random.default_rng(0)
+    claves = []
+    for indice in range(60):
+        clave = cache.clave(str(indice), "CLAHE")
+        # Ruido: no se comprime, cada entrada ocupa unos 10 KB
+        cache.guardar(clave, {"AMBE": indice}, imagen=rng.integers(0, 256, (100, 100), dtype=np.uint8))
+        claves.append(clave)
+        # Entre una medición y la siguiente se escribe como mucho una fracción del límite
+        assert cache.tamano_total() <= tamano_maximo * (1 + FRACCION_REVISION) + 11_000
+
+    cache.desalojar()
+    assert cache.tamano_total() <= tamano_maximo
+    # Se desalojan primero las entradas más viejas
+    assert cache.obtener(claves[-1]) is not None
+    assert cache.obtener(claves[0]) is None
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+import pytest
+from scipy import ndimage
+
+import funciones_metrica
+from funciones_metrica import C1_SSIM, C2_SSIM, calcular_epi, calcular_estructurales_lote, calcular_ssim
+
+# SSIM y EPI deben coincidir con una implementación directa en float64 con scipy.ndimage
+# (la de Wang et al.: ventana gaussiana de 11x11 y sigma 1.5, o caja de 7x7), y la versión
+# por lotes debe dar exactamente lo mismo que imagen por imagen.
+
+
+def _ventana(imagen, ventana):
+    # BORDER_REFLECT de OpenCV es el modo "reflect" de scipy (repite el borde)
+    if ventana == "gaussiana":
+        return ndimage.gaussian_filter(imagen, sigma=1.5, truncate=5 / 1.5, mode="reflect")
+    return ndimage.uniform_filter(imagen, size=7, mode="reflect")
+
+
+def ssim_referencia(original, mejorada, ventana="gaussiana"):
+    x, y = original.astype(np.float64), mejorada.astype(np.float64)
+    mu_x, mu_y = _ventana(x, ventana), _ventana(y, ventana)
+    sigma_x = _ventana(x * x, ventana) - mu_x ** 2
+    sigma_y = _ventana(y * y, ventana) - mu_y ** 2
+    sigma_xy = _ventana(x * y, ventana) - mu_x * mu_y
+    mapa = ((2 * mu_x * mu_y + C1_SSIM) * (2 * sigma_xy + C2_SSIM)) / \
+           ((mu_x ** 2 + mu_y ** 2 + C1_SSIM) * (sigma_x + sigma_y + C2_SSIM))
+    return mapa.mean()
+
+
+def epi_referencia(original, mejorada):
+    # Sobel 3x3 con el borde de OpenCV por defecto (REFLECT_101, "mirror" en scipy)
+    def magnitud(imagen):
+        imagen = imagen.astype(np.float64)
+        return np.hypot(ndimage.sobel(imagen, axis=1, mode="mirror"), ndimage.sobel(imagen, axis=0, mode="mirror"))
+    return np.corrcoef(magnitud(original).ravel(), magnitud(mejorada).ravel())[0, 1]
+
+
+def _pares(semilla):
+    rng = np.random.default_rng(semilla)
+    for forma in ((64, 48), (37, 211), (120, 90)):
+        original = cv2.GaussianBlur(rng.integers(0, 256, forma, dtype=np.uint8), (5, 5), 0)
+        yield original, cv2.equalizeHist(original)
+        yield original, cv2.createCLAHE(clipLimit=3.0, tileGridSize=(4, 4)).apply(original)
+        yield original, rng.integers(0, 256, forma, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("ventana", funciones_metrica.VENTANAS_SSIM)
+def test_ssim_igual_a_referencia(ventana):
+    for original, mejorada in _pares(1):
+        np.testing.assert_allclose(calcular_ssim(original, mejorada, ventana), ssim_referencia(original, mejorada, ventana),
+                                   atol=1e-6)
+        assert calcular_ssim(original, original, ventana) == pytest.approx(1.0, abs=1e-6)
+
+
+def test_epi_igual_a_referencia():
+    for original, mejorada in _pares(2):
+        np.testing.assert_allclose(calcular_epi(original, mejorada), epi_referencia(original, mejorada), atol=1e-7)
+
+
+def test_epi_sin_bordes_es_nan():
+    constante = np.full((30, 40), 120, dtype=np.uint8)
+    imagen = np.random.default_rng(3).integers(0, 256, (30, 40), dtype=np.uint8)
+    assert np.isnan(calcular_epi(constante, imagen))
+    assert np.isnan(calcular_epi(imagen, constante))
+    assert np.isnan(calcular_epi(constante, constante))
+
+
+def test_lote_igual_a_por_imagen():
+    rng = np.random.default_rng(4)
+    pila = np.stack([cv2.GaussianBlur(rng.integers(0, 256, (50, 70), dtype=np.uint8), (3, 3), 0) for _ in range(5)])
+    pila[0] = 77
+    luts = np.stack([rng.permutation(256).astype(np.uint8) for _ in range(len(pila))])
+    clahe = np.stack([cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(imagen) for imagen in pila])
+    resultados = calcular_estructurales_lote(pila, {"LUT": luts, "CLAHE": clahe})
+    for indice, original in enumerate(pila):
+        for tecnica, mejorada in (("LUT", cv2.LUT(original, luts[indice])), ("CLAHE", clahe[indice])):
+            assert resultados[tecnica]["SSIM"][indice] == calcular_ssim(original, mejorada)
+            epi = calcular_epi(original, mejorada)
+            assert resultados[tecnica]["EPI"][indice] == epi or np.isnan(epi) and np.isnan(
+                resultados[tecnica]["EPI"][indice])
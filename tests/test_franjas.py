@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+import pytest
+
+import funciones_mejora
+from clahe_mosaicos import filas_reflejadas
+from contexto_imagen import ContextoImagen
+from procesamiento_franjas import ALTO_FRANJA, clahe_por_franjas, ecualizar_por_franjas
+
+# El procesamiento por franjas debe dar exactamente lo mismo que OpenCV sobre la imagen
+# completa, incluidas las imágenes más bajas que el relleno inferior de CLAHE.
+
+
+@pytest.mark.parametrize("forma,grilla,alto_franja", [
+    ((100, 80), (8, 8), 16),
+    ((101, 77), (8, 8), 7),
+    ((37, 211), (5, 3), 10),
+    ((64, 64), (16, 16), 1000),
+    ((7, 100), (16, 16), 4),
+    ((5, 40), (3, 5), ALTO_FRANJA),
+    ((2, 9), (8, 8), 1),
+    ((1, 30), (4, 4), 3),
+    ((3, 3), (16, 16), 2),
+])
+def test_clahe_por_franjas_igual_a_opencv(forma, grilla, alto_franja):
+    rng = np.random.default_rng(forma[0] * forma[1])
+    imagen = cv2.GaussianBlur(rng.integers(0, 256, forma, dtype=np.uint8), (5, 5), 0)
+    for clip_limit in (0.5, 2.0, 40.0):
+        salida = np.empty(forma, dtype=np.uint8)
+        clahe_por_franjas(imagen, salida, clip_limit, grilla, alto_franja)
+        esperada = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=grilla).apply(imagen)
+        np.testing.assert_array_equal(salida, esperada)
+
+
+@pytest.mark.parametrize("forma", [(90, 70, 3), (5, 40, 3)])
+def test_clahe_por_franjas_desde_color(forma):
+    imagen = np.random.default_rng(9).integers(0, 256, forma, dtype=np.uint8)
+    salida = np.empty(forma[:2], dtype=np.uint8)
+    clahe_por_franjas(imagen, salida, alto_franja=13)
+    np.testing.assert_array_equal(salida, funciones_mejora.aplicar_clahe(imagen))
+
+
+@pytest.mark.parametrize("alto", [1, 2, 3, 7])
+def test_filas_reflejadas_como_border_reflect_101(alto):
+    fin = alto + 40
+    esperadas = [cv2.borderInterpolate(fila, alto, cv2.BORDER_REFLECT_101) for fila in range(fin)]
+    np.testing.assert_array_equal(filas_reflejadas(0, fin, alto), esperadas)
+
+
+@pytest.mark.parametrize("metodo", ["HE", "DSIHE", "BBHE"])
+def test_ecualizar_por_franjas_igual_a_imagen_completa(metodo):
+    imagen = np.random.default_rng(11).integers(20, 200, (83, 61), dtype=np.uint8)
+    salida = np.empty_like(imagen)
+    lut = ecualizar_por_franjas(imagen, salida, metodo, alto_franja=9)
+    np.testing.assert_array_equal(lut, funciones_mejora.PLANES[metodo](ContextoImagen(imagen)))
+    np.testing.assert_array_equal(salida, funciones_mejora.aplicar_lut(imagen, lut))
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import funciones_mejora
+import funciones_metrica
+from contexto_imagen import ContextoImagen
+
+# Los caminos por lotes deben dar exactamente lo mismo que el
+# cálculo imagen por imagen con OpenCV.
+
+LUTS = [
+    (funciones_mejora.calcular_luts_he_lote, funciones_mejora.calcular_lut_he),
+    (funciones_mejora.calcular_luts_dsihe_lote, funciones_mejora.calcular_lut_dsihe),
+    (funciones_mejora.calcular_luts_bbhe_lote, funciones_mejora.calcular_lut_bbhe),
+]
+
+
+def _pila(rng, cantidad, alto, ancho):
+    # Imágenes de rangos distintos, más una constante clara y una oscura (histogramas degenerados)
+    imagenes = []
+    for _ in range(cantidad):
+        bajo = rng.integers(0, 256)
+        alto_nivel = rng.integers(bajo, 256)
+        imagenes.append(rng.integers(bajo, alto_nivel + 1, (alto, ancho), dtype=np.uint8))
+    imagenes[0][:] = 255
+    imagenes[1][:] = 0
+    return np.stack(imagenes)
+
+
+def _iguales(a, b):
+    return a == b or (np.isnan(a) and np.isnan(b))
+
+
+@pytest.mark.parametrize("forma", [(1, 1), (7, 13), (64, 48), (121, 81)])
+def test_luts_y_metricas_lote_iguales_a_por_imagen(forma):
+    rng = np.random.default_rng(sum(forma))
+    pila = _pila(rng, 9, *forma)
+    hists = funciones_mejora.calcular_histogramas_lote(pila, bloque=4)
+    for calcular_lote, calcular in LUTS:
+        luts = calcular_lote(hists)
+        mejoradas = funciones_mejora.aplicar_luts_lote(pila, luts)
+        metricas = funciones_metrica.calcular_metricas_lote(hists, luts)
+        for indice, imagen in enumerate(pila):
+            contexto = ContextoImagen(imagen)
+            lut = calcular(contexto)
+            np.testing.assert_array_equal(hists[indice], contexto.hist)
+            np.testing.assert_array_equal(luts[indice], lut)
+            np.testing.assert_array_equal(mejoradas[indice], funciones_mejora.aplicar_lut(contexto, lut))
+            esperadas = funciones_metrica.calcular_metricas_desde_histograma(contexto, lut=lut)
+            for metrica, valor in esperadas.items():
+                assert _iguales(metricas[metrica][indice], valor), (calcular.__name__, metrica, indice)
+
+
+def test_clahe_lote_igual_a_por_imagen():
+    pila = _pila(np.random.default_rng(3), 5, 50, 70)
+    salida = np.empty_like(pila)
+    resultado = funciones_mejora.aplicar_clahe_lote(pila, clip_limit=3.0, tile_grid_size=(4, 4), salida=salida)
+    for indice, imagen in enumerate(pila):
+        np.testing.assert_array_equal(resultado[indice], funciones_mejora.aplicar_clahe(imagen, 3.0, (4, 4)))
@@ -0,0 +1,121 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import manifiesto_dataset
+from contexto_imagen import ContextoImagen
+from manifiesto_dataset import Manifiesto, actualizar_manifiesto
+
+# Al actualizar el manifiesto solo se leen los archivos que cambiaron de tamaño o fecha, y
+# solo se decodifican los que cambiaron de contenido.
+
+
+@pytest.fixture
+def conjunto(tmp_path):
+    imagenes = tmp_path / "imagenes"
+    imagenes.mkdir()
+    nombres = []
+    for indice, brillo in enumerate((30, 80, 140, 200)):
+        nombre = f"{indice + 1}.png"
+        imagen = np.random.default_rng(indice).integers(brillo - 25, brillo + 25, (20, 30, 3), dtype=np.uint8)
+        cv2.imwrite(str(imagenes / nombre), imagen)
+        nombres.append(nombre)
+    return str(imagenes), nombres, str(tmp_path / "manifiesto.npz")
+
+
+@pytest.fixture
+def contadores(monkeypatch):
+    # Cuántas veces se calcula un hash y cuántas imágenes se decodifican para sus estadísticas
+    contadores = {"hash": 0, "estadisticas": 0}
+    hash_contenido, estadisticas = manifiesto_dataset.hash_contenido, manifiesto_dataset._estadisticas
+
+    def contar_hash(contenido):
+        contadores["hash"] += 1
+        return hash_contenido(contenido)
+
+    def contar_estadisticas(imagen):
+        contadores["estadisticas"] += 1
+        return estadisticas(imagen)
+
+    monkeypatch.setattr(manifiesto_dataset, "hash_contenido", contar_hash)
+    monkeypatch.setattr(manifiesto_dataset, "_estadisticas", contar_estadisticas)
+    return contadores
+
+
+def _tocar(ruta):
+    estado = os.stat(ruta)
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10 ** 9))
+
+
+def test_estadisticas_como_el_pipeline(conjunto):
+    ruta_base, nombres, archivo = conjunto
+    manifiesto, resumen = actualizar_manifiesto(ruta_base, nombres, archivo)
+    assert resumen == {"sin_cambios": 0, "tocadas": 0, "nuevas": 4, "quitadas": 0}
+    for nombre in nombres:
+        contexto = ContextoImagen(cv2.imread(os.path.join(ruta_base, nombre)))
+        np.testing.assert_array_equal(manifiesto.hist(nombre), contexto.hist)
+        assert manifiesto.tabla.loc[nombre, "media"] == contexto.media
+
+    cargado = Manifiesto.cargar(archivo)
+    assert cargado.nombres == nombres
+    np.testing.assert_array_equal(cargado.hists, manifiesto.hists)
+
+
+def test_sin_cambios_no_se_lee_nada(conjunto, contadores):
+    ruta_base, nombres, archivo = conjunto
+    actualizar_manifiesto(ruta_base, nombres, archivo)
+    contadores.update(hash=0, estadisticas=0)
+
+    _, resumen = actualizar_manifiesto(ruta_base, nombres, archivo)
+    assert resumen == {"sin_cambios": 4, "tocadas": 0, "nuevas": 0, "quitadas": 0}
+    assert contadores == {"hash": 0, "estadisticas": 0}
+
+
+def test_tocada_se_vuelve_a_hashear_sin_decodificar(conjunto, contadores):
+    ruta_base, nombres, archivo = conjunto
+    anterior, _ = actualizar_manifiesto(ruta_base, nombres, archivo)
+    contadores.update(hash=0, estadisticas=0)
+
+    _tocar(os.path.join(ruta_base, nombres[1]))
+    manifiesto, resumen = actualizar_manifiesto(ruta_base, nombres, archivo)
+    assert resumen == {"sin_cambios": 3, "tocadas": 1, "nuevas": 0, "quitadas": 0}
+    assert contadores == {"hash": 1, "estadisticas": 0}
+    assert manifiesto.tabla.loc[nombres[1], "mtime_ns"] != anterior.tabla.loc[nombres[1], "mtime_ns"]
+    np.testing.assert_array_equal(manifiesto.hists, anterior.hists)
+
+
+def test_contenido_nuevo_se_decodifica(conjunto, contadores):
+    ruta_base, nombres, archivo = conjunto
+    actualizar_manifiesto(ruta_base, nombres, archivo)
+    contadores.update(hash=0, estadisticas=0)
+
+    cv2.imwrite(os.path.join(ruta_base, nombres[2]), np.full((20, 30, 3), 7, dtype=np.uint8))
+    _tocar(os.path.join(ruta_base, nombres[2]))
+    manifiesto, resumen = actualizar_manifiesto(ruta_base, nombres, archivo)
+    assert resumen == {"sin_cambios": 3, "tocadas": 0, "nuevas": 1, "quitadas": 0}
+    assert contadores == {"hash": 1, "estadisticas": 1}
+    assert manifiesto.tabla.loc[nombres[2], "media"] == 7
+
+
+def test_borradas_se_quitan(conjunto):
+    ruta_base, nombres, archivo = conjunto
+    actualizar_manifiesto(ruta_base, nombres, archivo)
+
+    # Una sale de la lista y otra se borra del disco
+    os.remove(os.path.join(ruta_base, nombres[3]))
+    manifiesto, resumen = actualizar_manifiesto(ruta_base, nombres[1:], archivo)
+    assert resumen["quitadas"] == 1
+    assert manifiesto.nombres == nombres[1:3]
+    assert Manifiesto.cargar(archivo).nombres == nombres[1:3]
+    assert manifiesto.hists.shape == (2, 256)
+
+
+def test_seleccionar(conjunto):
+    ruta_base, nombres, archivo = conjunto
+    manifiesto, _ = actualizar_manifiesto(ruta_base, nombres, archivo)
+    assert manifiesto.seleccionar("media < 100") == nombres[:2]
+    assert manifiesto.seleccionar("media > 50", orden="media", descendente=True) == nombres[:0:-1]
+    assert manifiesto.seleccionar(orden="media", cantidad=2) == nombres[:2]
+    assert manifiesto.seleccionar("media > 1000") == []
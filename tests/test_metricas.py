@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+import pytest
+
+import funciones_mejora
+import funciones_metrica
+from contexto_imagen import ContextoImagen
+
+# Las métricas calculadas en el dominio del histograma (O(256), sin recorrer los píxeles)
+# deben coincidir con las definiciones originales sobre los píxeles de la imagen mejorada.
+
+
+def ambe_referencia(original, mejorada):
+    return abs(np.mean(mejorada) - np.mean(original))
+
+
+def psnr_referencia(original, mejorada):
+    return cv2.PSNR(original, mejorada)
+
+
+def contraste_referencia(imagen):
+    return np.std(imagen)
+
+
+def entropia_referencia(imagen):
+    hist = cv2.calcHist([imagen], [0], None, [256], [0, 256]).flatten()
+    hist_normalized = hist / imagen.size
+    return -np.sum(hist_normalized * np.log2(hist_normalized + 1e-8))
+
+
+def _referencias(original, mejorada):
+    return {
+        "AMBE": ambe_referencia(original, mejorada),
+        "PSNR": psnr_referencia(original, mejorada),
+        "Contraste": contraste_referencia(mejorada),
+        "Entropia": entropia_referencia(mejorada),
+    }
+
+
+def _pila(semilla):
+    rng = np.random.default_rng(semilla)
+    imagenes = [np.full((40, 30), 255, dtype=np.uint8), np.zeros((40, 30), dtype=np.uint8)]
+    for bajo, alto in [(0, 256), (90, 130), (0, 30), (180, 256), (0, 2), (10, 240)]:
+        imagenes.append(rng.integers(bajo, alto, (40, 30), dtype=np.uint8))
+    return np.stack(imagenes)
+
+
+@pytest.mark.parametrize("tecnica", ["HE", "DSIHE", "BBHE", "RMSHE", "RSIHE"])
+def test_metricas_desde_histograma_iguales_a_referencia(tecnica):
+    for imagen in _pila(7):
+        contexto = ContextoImagen(imagen)
+        lut = funciones_mejora.PLANES[tecnica](contexto)
+        mejorada = funciones_mejora.aplicar_lut(contexto, lut)
+        esperadas = _referencias(imagen, mejorada)
+
+        metricas = funciones_metrica.calcular_metricas_desde_histograma(contexto, lut=lut)
+        for metrica, valor in metricas.items():
+            np.testing.assert_allclose(valor, esperadas[metrica], rtol=1e-9, atol=1e-9,
+                                       err_msg=f"{tecnica} {metrica}")
+
+        # Solo con el histograma mejorado no se sabe qué nivel va a cuál: todo menos el PSNR
+        metricas = funciones_metrica.calcular_metricas_desde_histograma(
+            contexto, hist_mejorado=ContextoImagen(mejorada).hist)
+        assert np.isnan(metricas.pop("PSNR"))
+        for metrica, valor in metricas.items():
+            np.testing.assert_allclose(valor, esperadas[metrica], rtol=1e-9, atol=1e-9,
+                                       err_msg=f"{tecnica} {metrica}")
+
+
+def test_metricas_lote_iguales_a_referencia():
+    pila = _pila(8)
+    hists = funciones_mejora.calcular_histogramas_lote(pila)
+    luts = funciones_mejora.calcular_luts_bbhe_lote(hists)
+    metricas = funciones_metrica.calcular_metricas_lote(hists, luts)
+    for indice, imagen in enumerate(pila):
+        esperadas = _referencias(imagen, cv2.LUT(imagen, luts[indice]))
+        for metrica, valor in esperadas.items():
+            np.testing.assert_allclose(metricas[metrica][indice], valor, rtol=1e-9, atol=1e-9,
+                                       err_msg=metrica)
@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+
+from almacen_resultados import AlmacenResultados, leer_agregados, leer_resultados
+from main_proyecto import procesar_lote
+from particiones import (ARCHIVO_PARTICION, asignar_particion, combinar_particiones, huella_lista,
+                         registrar_particion)
+
+# Procesar el conjunto en N particiones y combinarlas debe dar las mismas filas y los
+# mismos agregados que una sola ejecución; las carpetas que no forman un reparto completo
+# y coherente se rechazan.
+
+PARTICIONES = 3
+FILAS_POR_FRAGMENTO = 7
+
+
+@pytest.fixture(scope="module")
+def conjunto(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp("imagenes")
+    rng = np.random.default_rng(6)
+    nombres = []
+    for indice in range(14):
+        nombre = f"{indice + 1}.png"
+        forma = (24, 32, 3) if indice % 3 else (40, 20, 3)
+        cv2.imwrite(str(directorio / nombre), rng.integers(0, 256, forma, dtype=np.uint8))
+        nombres.append(nombre)
+    # Un archivo dañado: cuenta como hecho, sin filas
+    (directorio / "15.png").write_bytes(b"no es una imagen")
+    nombres.append("15.png")
+    return str(directorio), nombres
+
+
+def _procesar_particion(ruta_base, nombres, indice, directorio, cantidad=None):
+    posiciones, propias = asignar_particion(nombres, indice, PARTICIONES)
+    registrar_particion(directorio, indice, PARTICIONES, propias, posiciones, nombres)
+    almacen = AlmacenResultados(directorio, filas_por_fragmento=FILAS_POR_FRAGMENTO, segundos_por_fragmento=None)
+    procesar_lote(ruta_base, propias[:cantidad], workers=1, almacen=almacen)
+    return propias
+
+
+@pytest.fixture(scope="module")
+def particiones(conjunto, tmp_path_factory):
+    ruta_base, nombres = conjunto
+    raiz = tmp_path_factory.mktemp("particiones")
+    directorios = []
+    for indice in range(PARTICIONES):
+        directorio = str(raiz / f"resultados_{indice}")
+        assert _procesar_particion(ruta_base, nombres, indice, directorio)
+        directorios.append(directorio)
+    return directorios
+
+
+def test_combinar_igual_a_una_ejecucion(conjunto, particiones, tmp_path):
+    ruta_base, nombres = conjunto
+    unica = AlmacenResultados(str(tmp_path / "unica"), filas_por_fragmento=FILAS_POR_FRAGMENTO,
+                              segundos_por_fragmento=None)
+    procesar_lote(ruta_base, nombres, workers=1, almacen=unica)
+
+    combinado = combinar_particiones(particiones, str(tmp_path / "combinada"), filas_por_fragmento=FILAS_POR_FRAGMENTO)
+    assert combinado.imagenes == unica.imagenes == len(nombres)
+    pd.testing.assert_frame_equal(leer_resultados(str(tmp_path / "combinada")), leer_resultados(str(tmp_path / "unica")))
+    pd.testing.assert_frame_equal(combinado.agregados.tabla(), unica.agregados.tabla())
+    pd.testing.assert_frame_equal(leer_agregados(str(tmp_path / "combinada")), leer_agregados(str(tmp_path / "unica")))
+    # Con los mismos cortes por cantidad, los fragmentos son los mismos archivos
+    assert combinado.fragmentos == unica.fragmentos
+    for nombre in combinado.fragmentos:
+        with open(tmp_path / "combinada" / nombre, "rb") as a, open(tmp_path / "unica" / nombre, "rb") as b:
+            assert a.read() == b.read()
+
+
+def test_rechaza_particion_faltante(particiones, tmp_path):
+    with pytest.raises(ValueError, match="Faltan"):
+        combinar_particiones(particiones[:-1], str(tmp_path / "combinada"))
+
+
+def test_rechaza_otra_lista(particiones, tmp_path):
+    # Misma cantidad de imágenes, pero otra lista: la huella no coincide
+    otra = str(tmp_path / "otra")
+    shutil.copytree(particiones[-1], otra)
+    ruta = os.path.join(otra, ARCHIVO_PARTICION)
+    with open(ruta, encoding="utf-8") as archivo:
+        particion = json.load(archivo)
+    particion["lista"] = huella_lista([f"otra_{indice}.png" for indice in range(particion["cantidad"])])
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump(particion, archivo)
+    with pytest.raises(ValueError, match="repartos distintos"):
+        combinar_particiones(particiones[:-1] + [otra], str(tmp_path / "combinada"))
+
+
+def test_rechaza_particion_incompleta(conjunto, particiones, tmp_path):
+    ruta_base, nombres = conjunto
+    incompleta = str(tmp_path / "incompleta")
+    _procesar_particion(ruta_base, nombres, PARTICIONES - 1, incompleta, cantidad=1)
+    with pytest.raises(ValueError, match="incompleta"):
+        combinar_particiones(particiones[:-1] + [incompleta], str(tmp_path / "combinada"))
+
+
+def test_rechaza_retomar_otra_particion(conjunto, particiones):
+    ruta_base, nombres = conjunto
+    _, propias = asignar_particion(nombres, 1, PARTICIONES)
+    with pytest.raises(ValueError):
+        registrar_particion(particiones[0], 1, PARTICIONES, propias, [], nombres)
+
+
+def test_rechaza_salida_con_resultados(particiones, tmp_path):
+    salida = str(tmp_path / "combinada")
+    combinar_particiones(particiones, salida)
+    with pytest.raises(ValueError, match="ya tiene resultados"):
+        combinar_particiones(particiones, salida)
@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+import pytest
+
+import funciones_mejora
+from contexto_imagen import ContextoImagen
+
+# Las LUT de DSIHE y BBHE (y su versión por lotes) deben reproducir, píxel a píxel, la
+# implementación original con máscaras, que se conserva aquí como referencia.
+
+
+def dsihe_referencia(imagen_bgr):
+    imagen_gris = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2GRAY)
+    hist = cv2.calcHist([imagen_gris], [0], None, [256], [0, 256])
+    media_intensidad = np.mean(imagen_gris)
+
+    hist_izq = hist[0:int(media_intensidad) + 1]
+    hist_der = hist[int(media_intensidad) + 1:256]
+    cdf_izq = np.cumsum(hist_izq)
+    cdf_der = np.cumsum(hist_der)
+
+    cdf_izq_max = cdf_izq.max()
+    cdf_der_max = cdf_der.max()
+    cdf_izq_norm = cdf_izq / cdf_izq_max if cdf_izq_max > 0 else np.zeros_like(cdf_izq)
+    cdf_der_norm = cdf_der / cdf_der_max if cdf_der_max > 0 else np.zeros_like(cdf_der)
+
+    transform_izq = np.round(media_intensidad * cdf_izq_norm).astype('uint8')
+    transform_der = np.round(255 - media_intensidad + (media_intensidad * cdf_der_norm)).astype('uint8')
+    transform_der += int(media_intensidad)
+
+    imagen_dsihe = np.zeros_like(imagen_gris)
+    imagen_dsihe[imagen_gris <= media_intensidad] = transform_izq[imagen_gris[imagen_gris <= media_intensidad]]
+    imagen_dsihe[imagen_gris > media_intensidad] = transform_der[imagen_gris[imagen_gris > media_intensidad] - int(media_intensidad) - 1]
+    return imagen_dsihe
+
+
+def bbhe_referencia(imagen_bgr):
+    imagen_gris = cv2.cvtColor(imagen_bgr, cv2.COLOR_BGR2GRAY)
+    media_intensidad = np.mean(imagen_gris)
+    p_oscuro = imagen_gris < media_intensidad
+    p_brillante = imagen_gris >= media_intensidad
+
+    imagen_oscura = np.copy(imagen_gris)
+    imagen_oscura[p_brillante] = 0
+    imagen_brillante = np.copy(imagen_gris)
+    imagen_brillante[p_oscuro] = 0
+
+    hist_oscuro, _ = np.histogram(imagen_oscura[p_oscuro], 256, [0, 256])
+    cdf_oscuro = hist_oscuro.cumsum()
+    cdf_oscuro_max = cdf_oscuro.max()
+    cdf_oscuro_norm = cdf_oscuro / cdf_oscuro_max if cdf_oscuro_max > 0 else np.zeros_like(cdf_oscuro)
+    transform_oscuro = np.round(media_intensidad * cdf_oscuro_norm).astype('uint8')
+
+    hist_brillante, _ = np.histogram(imagen_brillante[p_brillante], 256, [0, 256])
+    cdf_brillante = hist_brillante.cumsum()
+    cdf_brillante_max = cdf_brillante.max()
+    cdf_brillante_norm = cdf_brillante / cdf_brillante_max if cdf_brillante_max > 0 else np.zeros_like(cdf_brillante)
+    transform_brillante = np.round((255 - media_intensidad) * cdf_brillante_norm).astype('uint8')
+    transform_brillante += int(media_intensidad)
+
+    imagen_bbhe = np.zeros_like(imagen_gris)
+    imagen_bbhe[p_oscuro] = transform_oscuro[imagen_gris[p_oscuro]]
+    imagen_bbhe[p_brillante] = transform_brillante[imagen_gris[p_brillante] - int(media_intensidad)]
+    return imagen_bbhe
+
+
+def _imagenes(semilla):
+    # Rangos de niveles distintos (estrechos, desplazados, completos) y una imagen negra;
+    # la blanca se deja fuera porque la referencia de DSIHE falla con el lado derecho vacío
+    rng = np.random.default_rng(semilla)
+    imagenes = [np.zeros((9, 11, 3), dtype=np.uint8)]
+    for forma, (bajo, alto) in [((1, 1, 3), (0, 256)), ((31, 17, 3), (0, 256)),
+                                ((64, 48, 3), (100, 140)), ((120, 90, 3), (0, 40)),
+                                ((77, 203, 3), (200, 256)), ((50, 50, 3), (0, 2))]:
+        imagenes.append(rng.integers(bajo, alto, forma, dtype=np.uint8))
+    return imagenes
+
+
+@pytest.mark.parametrize("referencia,aplicar,calcular_lut,calcular_luts_lote", [
+    (dsihe_referencia, funciones_mejora.aplicar_dsihe, funciones_mejora.calcular_lut_dsihe,
+     funciones_mejora.calcular_luts_dsihe_lote),
+    (bbhe_referencia, funciones_mejora.aplicar_bbhe, funciones_mejora.calcular_lut_bbhe,
+     funciones_mejora.calcular_luts_bbhe_lote),
+])
+def test_luts_iguales_a_referencia(referencia, aplicar, calcular_lut, calcular_luts_lote):
+    for imagen in _imagenes(5):
+        esperada = referencia(imagen)
+        np.testing.assert_array_equal(aplicar(imagen), esperada)
+
+        contexto = ContextoImagen(imagen)
+        lut = calcular_lut(contexto)
+        np.testing.assert_array_equal(funciones_mejora.aplicar_lut(contexto, lut), esperada)
+        lote = calcular_luts_lote(contexto.hist[np.newaxis])
+        np.testing.assert_array_equal(lote[0], lut)
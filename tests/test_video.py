@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+
+from contexto_imagen import ContextoImagen
+from funciones_mejora import PLANES
+from procesamiento_video import METODOS, MejoradorVideo, _cuentas_enteras
+
+# Sin suavizado el video debe dar lo mismo que la técnica frame a frame; con suavizado,
+# el histograma con el que se calcula la LUT debe seguir sumando la cantidad de píxeles.
+
+
+def _frames():
+    rng = np.random.default_rng(2)
+    return [rng.integers(inicio, inicio + 90, (37, 53, 3), dtype=np.uint8) for inicio in range(0, 160, 20)]
+
+
+@pytest.mark.parametrize("metodo", METODOS)
+def test_sin_suavizado_igual_a_frame_por_frame(metodo):
+    mejorador = MejoradorVideo(metodo)
+    for frame in _frames():
+        gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if metodo == "CLAHE":
+            esperada = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gris)
+        else:
+            esperada = cv2.LUT(gris, PLANES[metodo](ContextoImagen(frame)))
+        np.testing.assert_array_equal(mejorador.procesar(frame), esperada)
+
+
+def test_cuentas_enteras_suman_el_total():
+    rng = np.random.default_rng(3)
+    for total in (1, 255, 1961, 10 ** 7):
+        hist = rng.random(256) * rng.integers(0, 2, 256)
+        cuentas = _cuentas_enteras(hist, total)
+        assert cuentas.sum() == total
+        assert np.all(cuentas == np.round(cuentas))
+        assert np.abs(cuentas - hist * total / hist.sum()).max() < 1
+    # Cuentas que ya son enteras y suman el total quedan igual
+    hist = np.bincount(rng.integers(0, 256, 999), minlength=256).astype(np.float32)
+    np.testing.assert_array_equal(_cuentas_enteras(hist, 999), hist)
@@ -0,0 +1,262 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from cargador_imagenes import HILOS, REDUCCIONES
+from main_proyecto import METRICAS, TECNICAS, procesar_lote
+
+# Triaje multi-resolución de un conjunto grande de imágenes. Una primera pasada calcula
+# las cuatro técnicas y todas las métricas sobre una versión reducida de cada imagen
+# (1/4 u 1/8 por lado; el JPEG se decodifica directamente a esa escala, así que ni la
+# decodificación ni el cálculo tocan la resolución completa). Las métricas que salen son
+# estimaciones de las de resolución completa.
+#
+# El error de esas estimaciones se mide en el mismo conjunto: una muestra de calibración
+# (imágenes repartidas a lo largo de la lista) se procesa a las dos escalas. Algunas
+# métricas tienen un sesgo sistemático con la escala (SSIM y EPI miden estructura a otro
+# tamaño), así que a cada técnica y métrica se le suma la mediana de la diferencia
+# observada, y la cota es el cuantil `cobertura` del error absoluto que queda. Con los
+# umbrales de decisión (por ejemplo PSNR=20 o CLAHE.SSIM=0.8) solo se vuelven a procesar
+# a resolución completa las imágenes cuya estimación queda a menos de la cota de algún
+# umbral, es decir, aquellas en las que la escala reducida podría cambiar la decisión.
+# Esas imágenes, que no se usaron para calibrar, sirven además para comprobar qué
+# fracción de las estimaciones quedó de verdad dentro de la cota:
+#   python triaje.py --ruta <carpeta_imagenes> --reduccion 8 --umbral PSNR=20 --umbral CLAHE.SSIM=0.8
+
+
+def leer_umbral(valor):
+    """Convertimos "METRICA=valor" o "TECNICA.METRICA=valor" en (técnicas, métrica, valor)."""
+    try:
+        clave, numero = valor.split("=")
+        numero = float(numero)
+    except ValueError:
+        raise argparse.ArgumentTypeError("el umbral debe tener la forma METRICA=valor o TECNICA.METRICA=valor")
+    tecnica, _, metrica = clave.rpartition(".")
+    if metrica not in METRICAS:
+        raise argparse.ArgumentTypeError(f"métrica desconocida: {metrica}. Opciones: {', '.join(METRICAS)}.")
+    if tecnica and tecnica not in ("Original",) + TECNICAS:
+        raise argparse.ArgumentTypeError(f"técnica desconocida: {tecnica}.")
+    # Sin técnica, el umbral vale para las cuatro (en la original AMBE, PSNR, SSIM y EPI no existen)
+    return (tecnica,) if tecnica else TECNICAS, metrica, numero
+
+
+def muestra_calibracion(nombres, cantidad):
+    """Nombres de `cantidad` imágenes repartidas de forma pareja a lo largo de `nombres`."""
+    if cantidad >= len(nombres):
+        return list(nombres)
+    posiciones = np.unique(np.linspace(0, len(nombres) - 1, cantidad).round().astype(int))
+    return [nombres[posicion] for posicion in posiciones]
+
+
+def calibrar(filas_reducidas, filas_completas, cobertura=0.95):
+    """
+    Corrección y cota empírica del error de las métricas calculadas a escala reducida.
+
+    Args:
+        filas_reducidas (list): Filas de métricas de la muestra a escala reducida.
+        filas_completas (list): Filas de las mismas imágenes a resolución completa.
+        cobertura (float): Fracción de los errores observados que debe quedar dentro de la cota.
+
+    Returns:
+        tuple: (sesgos, cotas), dos pandas.DataFrame por técnica (filas) y métrica
+            (columnas). El sesgo es la mediana de completa - reducida y la cota se mide
+            después de sumarlo. Sin ningún par comparable (por ejemplo, la métrica no
+            existe para la técnica) el sesgo es 0 y la cota np.inf.
+    """
+    if not filas_reducidas or not filas_completas:
+        vacia = pd.DataFrame(columns=list(METRICAS), dtype=float)
+        return vacia, vacia.copy()
+    claves = ["Imagen", "Técnica"]
+    pares = pd.merge(pd.DataFrame(filas_reducidas), pd.DataFrame(filas_completas), on=claves,
+                     suffixes=("_reducida", "_completa"))
+    sesgos, cotas = {}, {}
+    for tecnica, grupo in pares.groupby("Técnica", sort=False):
+        sesgos[tecnica], cotas[tecnica] = {}, {}
+        for metrica in METRICAS:
+            diferencias = (grupo[f"{metrica}_completa"] - grupo[f"{metrica}_reducida"]).dropna()
+            if not len(diferencias):
+                sesgos[tecnica][metrica], cotas[tecnica][metrica] = 0.0, np.inf
+                continue
+            sesgo = float(np.median(diferencias))
+            # "higher": la cota es siempre uno de los errores observados, no una interpolación
+            sesgos[tecnica][metrica] = sesgo
+            cotas[tecnica][metrica] = float(np.quantile((diferencias - sesgo).abs(), cobertura, method="higher"))
+    return tuple(pd.DataFrame.from_dict(tabla, orient="index").reindex(columns=list(METRICAS))
+                 for tabla in (sesgos, cotas))
+
+
+def cobertura_observada(filas_estimadas, filas_completas, cotas):
+    """
+    Fracción de las estimaciones (técnica y métrica con cota finita) que quedaron a menos
+    de su cota del valor a resolución completa. np.nan si no hay nada que comparar.
+    """
+    if not filas_estimadas or not filas_completas:
+        return np.nan
+    pares = pd.merge(pd.DataFrame(filas_estimadas), pd.DataFrame(filas_completas), on=["Imagen", "Técnica"],
+                     suffixes=("_estimada", "_completa"))
+    dentro, total = 0, 0
+    for metrica in METRICAS:
+        cota = cotas[metrica].reindex(pares["Técnica"]).to_numpy()
+        error = (pares[f"{metrica}_estimada"] - pares[f"{metrica}_completa"]).abs().to_numpy()
+        comparables = np.isfinite(cota) & np.isfinite(error)
+        dentro += int(np.count_nonzero(error[comparables] <= cota[comparables]))
+        total += int(np.count_nonzero(comparables))
+    return dentro / total if total else np.nan
+
+
+def corregir(filas_reducidas, sesgos):
+    """Estimaciones de resolución completa: las filas reducidas más el sesgo de su técnica."""
+    return [{**fila, **{metrica: fila[metrica] + sesgos.at[fila["Técnica"], metrica] for metrica in METRICAS}}
+            if fila["Técnica"] in sesgos.index else fila
+            for fila in filas_reducidas]
+
+
+def imagenes_cerca_de_umbral(filas_estimadas, cotas, umbrales):
+    """
+    Imágenes con alguna estimación a menos de su cota de un umbral (o sin estimación
+    comparable): en ellas la decisión puede cambiar a resolución completa.
+
+    Args:
+        filas_estimadas (list): Filas de métricas a escala reducida, ya corregidas.
+        cotas (pandas.DataFrame): Cotas de `calibrar`.
+        umbrales (list): Tuplas (técnicas, métrica, valor) de `leer_umbral`.
+
+    Returns:
+        set: Nombres de las imágenes a escalar.
+    """
+    cerca = set()
+    for fila in filas_estimadas:
+        for tecnicas, metrica, valor in umbrales:
+            if fila["Técnica"] not in tecnicas:
+                continue
+            cota = cotas.at[fila["Técnica"], metrica] if fila["Técnica"] in cotas.index else np.inf
+            estimacion = fila[metrica]
+            if np.isnan(estimacion) or abs(estimacion - valor) <= cota:
+                cerca.add(fila["Imagen"])
+                break
+    return cerca
+
+
+def triar(ruta_base, nombres_imagenes, umbrales=(), reduccion=8, calibracion=32, cobertura=0.95, workers=None,
+          tamano_bloque=16, parametros_clahe=None, directorio_cache=None, lectura_gris=False, hilos_lectura=HILOS,
+          estructurales=True):
+    """
+    Triaje multi-resolución: métricas estimadas a escala reducida para todas las imágenes
+    y exactas para la muestra de calibración y las que quedan cerca de un umbral.
+
+    Args:
+        ruta_base (str): Carpeta donde se encuentran las imágenes.
+        nombres_imagenes (list): Nombres de archivo a procesar.
+        umbrales (list): Tuplas (técnicas, métrica, valor) de `leer_umbral`. Sin umbrales
+            no se escala ninguna imagen fuera de la muestra.
+        reduccion (int): Escala de la primera pasada (2, 4 u 8).
+        calibracion (int): Imágenes de la muestra con la que se miden las cotas (su costo
+            es fijo: en un conjunto grande es una fracción pequeña del total).
+        cobertura (float): Cuantil del error observado que se toma como cota.
+        workers, tamano_bloque, parametros_clahe, directorio_cache, hilos_lectura,
+            estructurales: Igual que en `procesar_lote`.
+        lectura_gris (bool): Decodificar directamente en gris (en las dos escalas).
+
+    Returns:
+        tuple: (filas, cotas, resumen). Las filas siguen el orden de `nombres_imagenes` y
+            tienen la columna "Reduccion" (1 si los valores son exactos; si no, son
+            estimaciones ya corregidas por el sesgo); `cotas` es la de `calibrar` y
+            `resumen` tiene la cantidad de imágenes, la cobertura observada en las
+            escaladas y el tiempo de cada pasada.
+    """
+    if reduccion not in REDUCCIONES[1:]:
+        raise ValueError(f"Reducción no soportada para el triaje: {reduccion}. "
+                         f"Opciones: {', '.join(map(str, REDUCCIONES[1:]))}.")
+
+    def _pasada(nombres, escala):
+        inicio = time.perf_counter()
+        filas = procesar_lote(ruta_base, nombres, workers, tamano_bloque, parametros_clahe, directorio_cache,
+                              lectura={"gris": lectura_gris, "reduccion": escala}, hilos_lectura=hilos_lectura,
+                              estructurales=estructurales)
+        return [{**fila, "Reduccion": escala} for fila in filas], time.perf_counter() - inicio
+
+    estimadas, tiempo_reducida = _pasada(nombres_imagenes, reduccion)
+    muestra = muestra_calibracion(nombres_imagenes, calibracion)
+    exactas, tiempo_calibracion = _pasada(muestra, 1)
+    en_muestra = set(muestra)
+    sesgos, cotas = calibrar([fila for fila in estimadas if fila["Imagen"] in en_muestra], exactas, cobertura)
+    estimadas = corregir(estimadas, sesgos)
+
+    cerca = imagenes_cerca_de_umbral(estimadas, cotas, umbrales) - en_muestra
+    a_escalar = [nombre for nombre in nombres_imagenes if nombre in cerca]
+    escaladas, tiempo_escalado = _pasada(a_escalar, 1)
+    validacion = cobertura_observada([fila for fila in estimadas if fila["Imagen"] in cerca], escaladas, cotas)
+    exactas += escaladas
+
+    # Las filas exactas reemplazan a las estimadas de la misma imagen, sin cambiar el orden
+    por_imagen = {}
+    for fila in estimadas:
+        por_imagen.setdefault(fila["Imagen"], []).append(fila)
+    for nombre in set(fila["Imagen"] for fila in exactas):
+        por_imagen[nombre] = []
+    for fila in exactas:
+        por_imagen[fila["Imagen"]].append(fila)
+    filas = [fila for nombre in nombres_imagenes for fila in por_imagen.get(nombre, [])]
+
+    resumen = {
+        "imagenes": len(por_imagen),
+        "calibracion": len(en_muestra & set(por_imagen)),
+        "escaladas": len(set(fila["Imagen"] for fila in escaladas)),
+        "cobertura_observada": validacion,
+        "tiempo_reducida": tiempo_reducida,
+        "tiempo_calibracion": tiempo_calibracion,
+        "tiempo_escalado": tiempo_escalado,
+    }
+    return filas, cotas, resumen
+
+
+if __name__ == "__main__":
+    from main_proyecto import RUTA_BASE_DATOS, listar_imagenes
+
+    parser = argparse.ArgumentParser(description="Triaje multi-resolución: métricas estimadas a escala reducida "
+                                                 "y exactas solo cerca de los umbrales de decisión.")
+    parser.add_argument("--ruta", default=RUTA_BASE_DATOS, help="Carpeta con las imágenes.")
+    parser.add_argument("--cantidad", type=int, default=None, help="Cantidad de imágenes (por defecto, todas).")
+    parser.add_argument("--reduccion", type=int, choices=REDUCCIONES[1:], default=8,
+                        help="Escala de la primera pasada (1/2, 1/4 o 1/8 por lado).")
+    parser.add_argument("--umbral", type=leer_umbral, action="append", default=[],
+                        help="Umbral de decisión METRICA=valor (para las cuatro técnicas) o TECNICA.METRICA=valor. "
+                             "Se puede repetir.")
+    parser.add_argument("--calibracion", type=int, default=32,
+                        help="Imágenes procesadas a las dos escalas para medir la cota de error.")
+    parser.add_argument("--cobertura", type=float, default=0.95,
+                        help="Cuantil del error observado que se toma como cota.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=None, help="Carpeta de la caché de resultados.")
+    parser.add_argument("--lectura-gris", action="store_true", help="Decodificar directamente en gris.")
+    parser.add_argument("--sin-estructurales", action="store_true", help="No calcular SSIM ni EPI.")
+    parser.add_argument("--salida", default=None, help="Archivo CSV con todas las filas (columna Reduccion).")
+    args = parser.parse_args()
+    if not 0 < args.cobertura <= 1:
+        parser.error("--cobertura debe estar entre 0 y 1")
+
+    nombres = listar_imagenes(args.ruta)[:args.cantidad]
+    filas, cotas, resumen = triar(args.ruta, nombres, args.umbral, args.reduccion, args.calibracion,
+                                  args.cobertura, args.workers, directorio_cache=args.cache,
+                                  lectura_gris=args.lectura_gris, estructurales=not args.sin_estructurales)
+    df = pd.DataFrame(filas)
+    if args.salida:
+        df.to_csv(args.salida, index=False)
+
+    print(f"\n--- Cota del error a 1/{args.reduccion} (cuantil {args.cobertura:g} sobre "
+          f"{resumen['calibracion']} imágenes) ---")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(cotas)
+    print(f"\n{resumen['imagenes']} imágenes: {resumen['imagenes'] - resumen['calibracion'] - resumen['escaladas']} "
+          f"estimadas a 1/{args.reduccion}, {resumen['calibracion']} de calibración y {resumen['escaladas']} "
+          f"escaladas a resolución completa por quedar cerca de un umbral.")
+    if not np.isnan(resumen["cobertura_observada"]):
+        print(f"Estimaciones de las escaladas dentro de la cota: {resumen['cobertura_observada']:.1%} "
+              f"(esperado: {args.cobertura:.0%}).")
+    print(f"Tiempo: {resumen['tiempo_reducida']:.2f} s a 1/{args.reduccion}, "
+          f"{resumen['tiempo_calibracion']:.2f} s de calibración y {resumen['tiempo_escalado']:.2f} s de escalado.")
+    if len(df):
+        print("\n--- Media por técnica (estimadas y exactas) ---")
+        print(df.groupby("Técnica", sort=False)[list(METRICAS)].mean())